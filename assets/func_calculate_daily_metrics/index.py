@@ -19,12 +19,27 @@
 # Author: Borja Pérez Guasch <bpguasch@amazon.com>
 # Summary: calculates the Flexibility Score using 4 components: Scaling Score, Launch Template Score, Scaling Policy Score and Instance Diversification Score. This index handler retrieves data that the modules need to calculate the scores.
 
+import functools
 import json
 
 from datetime import datetime, timedelta
 from scores import *
 from libs_finder import *
 
+def generate_day_time_window(target_day: datetime) -> TimeWindow:
+    """
+    Generates a time window that spans a whole day
+
+    :param target_day: any point in time of the day
+
+    :return: TimeWindow object with a start time and end time
+    """
+
+    start_time = datetime(target_day.year, target_day.month, target_day.day, 0, 0, 0, tzinfo=date_helpers.get_timezone())
+    end_time = datetime(target_day.year, target_day.month, target_day.day, 23, 59, 59, tzinfo=date_helpers.get_timezone())
+
+    return TimeWindow(start_time, end_time)
+
 
 def generate_time_window_for_fetching_data(beforehand_days: int = 1) -> TimeWindow:
     """
@@ -34,21 +49,71 @@ def generate_time_window_for_fetching_data(beforehand_days: int = 1) -> TimeWind
     :return: TimeWindow object with a start time and end time
     """
 
-    target_day = datetime.now() - timedelta(beforehand_days)
+    return generate_day_time_window(datetime.now() - timedelta(beforehand_days))
 
-    start_time = datetime(target_day.year, target_day.month, target_day.day, 0, 0, 0, tzinfo=date_helpers.get_timezone())
-    end_time = datetime(target_day.year, target_day.month, target_day.day, 23, 59, 59, tzinfo=date_helpers.get_timezone())
 
-    return TimeWindow(start_time, end_time)
+def generate_daily_time_windows(start_day: datetime, end_day: datetime) -> [TimeWindow]:
+    """
+    Generates a time window for every day between two days
+
+    :param start_day: first day, included
+    :param end_day: last day, included
+
+    :return: list of TimeWindow objects sorted by start time
+    """
+
+    return [generate_day_time_window(start_day + timedelta(days)) for days in range((end_day - start_day).days + 1)]
+
+
+def get_publication_time(tw: TimeWindow) -> datetime:
+    # The metrics of a day are calculated and published the following day
+    return tw.end_time + timedelta(seconds=1)
+
+
+def find_missing_days(days: [TimeWindow]) -> [TimeWindow]:
+    """
+    Finds the days whose metrics haven't been calculated, as there are no metrics uploaded to S3 the following day
+
+    :param days: time windows of the days to check
+
+    :return: list of time windows of the days without metrics
+    """
+
+    bucket = os.environ['BUCKET']
+
+    return [
+        day for day in days
+        if not s3_helpers.prefix_exists(bucket, date_helpers.datetime_to_str(get_publication_time(day), '%Y/%m/%d/'))
+    ]
 
 
-def publish_metrics_in_cloudwatch(metrics_by_account: dict) -> None:
-    metric_data = [
+def get_hourly_metrics_key(tw: TimeWindow) -> str:
+    # The hourly metrics of a day are uploaded once, to a file with a fixed name in the folder of the publication day
+    return date_helpers.datetime_to_str(get_publication_time(tw), '%Y/%m/%d/hourly.json')
+
+
+def hourly_metrics_exist(tw: TimeWindow) -> bool:
+    """
+    Determines if the hourly metrics of a day have been published, as they have been uploaded to S3 after publishing
+    them in CloudWatch
+
+    :param tw: time window of the day to check
+
+    :return: True if the hourly metrics of the day have been published, False otherwise
+    """
+
+    return s3_helpers.prefix_exists(os.environ['BUCKET'], get_hourly_metrics_key(tw))
+
+
+def build_metric_data(metrics_by_account: dict, timestamp: datetime = None) -> [dict]:
+    timestamp = datetime.now() if timestamp is None else timestamp
+
+    return [
         {
             'MetricName': name,
             'Value': value,
             'Unit': 'None',
-            'Timestamp': datetime.now(),
+            'Timestamp': timestamp,
             'Dimensions': [
                 {
                     'Name': CW_DIMENSION_NAME_ACCOUNT_ID,
@@ -59,43 +124,120 @@ def publish_metrics_in_cloudwatch(metrics_by_account: dict) -> None:
         for account_id, metrics in metrics_by_account.items() for name, value in metrics.items()
     ]
 
+
+def build_hourly_metric_data(hourly_metrics_by_account: dict) -> [dict]:
+    return [
+        {
+            'MetricName': name,
+            'Value': value,
+            'Unit': 'None',
+            'Timestamp': datetime.fromisoformat(hour),
+            'Dimensions': [
+                {
+                    'Name': CW_DIMENSION_NAME_ACCOUNT_ID,
+                    'Value': account_id
+                },
+                {
+                    'Name': CW_DIMENSION_NAME_RESOLUTION,
+                    'Value': CW_DIMENSION_VALUE_HOURLY
+                },
+            ],
+        }
+        for account_id, hourly_metrics in hourly_metrics_by_account.items()
+        for hour, metrics in hourly_metrics.items() for name, value in metrics.items()
+    ]
+
+
+def publish_metric_data(metric_data: [dict]) -> None:
+    """
+    Publishes metric data in CloudWatch, in as many requests as needed, sent at the same time
+
+    :param metric_data: list of metric data
+    """
+
+    workers = env_helpers.get('PUBLISH_WORKERS')
+
     print('Publishing metrics to CloudWatch...', end=' ')
 
-    cloudwatch_helpers.put_metric_data(CW_NAMESPACE, metric_data)
+    results = cloudwatch_helpers.put_metric_data_in_batches(CW_NAMESPACE, metric_data, workers)
+    errors = [result['error'] for result in results if 'error' in result]
 
-    print('done!')
+    print('done!' if not errors else f'{len(errors)} of {len(results)} requests failed!')
 
+    for i, result in enumerate(results):
+        print(f'Batch {i + 1}/{len(results)}:', {key: value for key, value in result.items() if key != 'error'})
 
-def upload_metrics_to_s3(metrics_by_account: dict) -> None:
-    folder = date_helpers.datetime_to_str(datetime_format='%Y/%m/%d')
-    file_name = date_helpers.datetime_to_str(datetime_format='%H%M%S')
-    bucket = os.environ['BUCKET']
+    if errors:
+        raise errors[0]
+
+
+def upload_metrics_to_s3(metrics_by_account: dict, date_time: datetime = None) -> None:
+    date_time = datetime.now() if date_time is None else date_time
+    folder = date_helpers.datetime_to_str(date_time, '%Y/%m/%d')
+    file_name = date_helpers.datetime_to_str(date_time, '%H%M%S')
 
     print('Uploading metrics to S3...', end=' ')
+    s3_helpers.upload_file_contents(os.environ['BUCKET'], f'{folder}/{file_name}.json', json.dumps(metrics_by_account))
+    print('done!')
 
-    s3_helpers.upload_file_contents(bucket, f'{folder}/{file_name}.json', json.dumps(metrics_by_account))
 
+def upload_hourly_metrics_to_s3(tw: TimeWindow, hourly_metrics_by_account: dict) -> None:
+    print('Uploading hourly metrics to S3...', end=' ')
+    s3_helpers.upload_file_contents(os.environ['BUCKET'], get_hourly_metrics_key(tw),
+                                    json.dumps(hourly_metrics_by_account))
     print('done!')
 
 
-def calculate_daily_metrics() -> dict:
+def calculate_account_metrics(tw: TimeWindow, account) -> dict:
+    """
+    Calculates the vCPU hours and the scores of an account during a day
+
+    :param tw: time window of the day for which to calculate metrics
+    :param account: account for which to calculate metrics
+
+    :return: dictionary containing the metrics, by name
+    """
+
+    return {
+        CW_METRIC_NAME_VCPU_H: account.interval_index.vcpu_h(tw),
+        SCORE_LT: launch_template_score.calculate(account.instances, account.instance_table),
+        SCORE_POLICY: policy_score.calculate(account.instances, account.asg, account.instance_table),
+        SCORE_DIVERSIFICATION: instance_diversification_score.calculate(account.asg, account.lt),
+        SCORE_SCALING: scaling_score.calculate(account.instances, account.interval_index.concurrency(tw))
+    }
+
+
+def calculate_daily_metrics(tw: TimeWindow, excluded_account_ids=(), accounts: dict = None) -> dict:
     """
     Calculates daily account and organization metrics
 
+    :param tw: time window of the day for which to calculate metrics
+    :param excluded_account_ids: ids of the accounts for which not to calculate metrics
+    :param accounts: accounts for which to calculate metrics, by id. If not specified, the accounts of the organization
+
     :return: dictionary containing the metrics
     """
 
-    metrics = {
-        a_id: {
-            CW_METRIC_NAME_VCPU_H: account.vcpu_h,
-            SCORE_LT: launch_template_score.calculate(account.instances),
-            SCORE_POLICY: policy_score.calculate(account.instances, account.asg),
-            SCORE_DIVERSIFICATION: instance_diversification_score.calculate(account.asg, account.lt),
-            SCORE_SCALING: scaling_score.calculate(account.instances)
-        }
+    accounts = account_manager.accounts if accounts is None else accounts
+    accounts = {a_id: account for a_id, account in accounts.items() if a_id not in excluded_account_ids}
+    processes = env_helpers.get('SCORE_PROCESSES')
 
-        for a_id, account in account_manager.accounts.items()
-    }
+    forked = processes > 1 and len(accounts) > 1
+
+    # Forking is only safe without other threads, which are joined once resources are fetched unless one was left alive
+    if forked and not process_helpers.can_fork():
+        print('Other threads are running, calculating the metrics of the accounts in this process')
+        forked = False
+
+    if forked:
+        # The metrics of every account are calculated in child processes, forked with the accounts in their memory
+        results = process_helpers.map_in_processes(
+            functools.partial(calculate_account_metrics, tw), list(accounts.values()), processes,
+            env_helpers.get('SCORE_PROCESS_TIMEOUT')
+        )
+        metrics = dict(zip(accounts, results))
+    else:
+        metrics = {a_id: calculate_account_metrics(tw, account) for a_id, account in accounts.items()}
 
     metrics.update({
         CW_DIMENSION_VALUE_ORG: org_manager.calculate_scores(metrics)
@@ -104,22 +246,130 @@ def calculate_daily_metrics() -> dict:
     return metrics
 
 
+def calculate_hourly_metrics(tw: TimeWindow, excluded_account_ids=(), accounts: dict = None) -> dict:
+    """
+    Calculates the concurrency and vCPU hours of every account during every hour of a day
+
+    :param tw: time window of the day for which to calculate metrics
+    :param excluded_account_ids: ids of the accounts for which not to calculate metrics
+    :param accounts: accounts for which to calculate metrics, by id. If not specified, the accounts of the organization
+
+    :return: dictionary containing the metrics of every hour by its start time in ISO format, by account id
+    """
+
+    accounts = account_manager.accounts if accounts is None else accounts
+
+    return {
+        a_id: {
+            hour.isoformat(): {
+                CW_METRIC_NAME_VCPU_H: vcpu_h,
+                CW_METRIC_NAME_MIN_INSTANCES: min_i,
+                CW_METRIC_NAME_MAX_INSTANCES: max_i
+            }
+
+            for hour, min_i, max_i, vcpu_h in account.interval_index.buckets(tw, HOURLY_METRICS_PERIOD)
+        }
+
+        for a_id, account in accounts.items() if a_id not in excluded_account_ids
+    }
+
+
+def backfill(start_day: datetime, end_day: datetime, only_missing: bool = True) -> None:
+    """
+    Calculates and publishes the metrics of every day in a range, fetching the resources of all the days at once
+
+    :param start_day: first day for which to calculate metrics
+    :param end_day: last day for which to calculate metrics
+    :param only_missing: whether to calculate metrics only for the days without metrics
+    """
+
+    days = generate_daily_time_windows(start_day, end_day)
+
+    # Resources can't be evaluated before the period in which CloudTrail events can be looked up
+    horizon = datetime.now(tz=date_helpers.get_timezone()) - timedelta(MAX_CT_RELATIVE_DAYS_SEARCH)
+    days = [day for day in days if day.start_time >= horizon]
+
+    if only_missing:
+        days = find_missing_days(days)
+
+    if not days:
+        print('There are no days to backfill')
+        return
+
+    print('Backfilling', ', '.join(date_helpers.datetime_to_str(day.start_time) for day in days))
+
+    # Fetch the resources of all the days at once, then evaluate them in every day
+    errors = account_manager.fetch_resources(TimeWindow(days[0].start_time, days[-1].end_time))
+
+    for a_id, account_errors in errors.items():
+        print(f'({a_id}) could not fetch resources, the account is excluded from the metrics: {account_errors}')
+
+    metric_data = []
+    calculated = []
+
+    for day in days:
+        accounts = {a_id: account.at(day) for a_id, account in account_manager.accounts.items() if a_id not in errors}
+        metrics = calculate_daily_metrics(day, accounts=accounts)
+        published_at = get_publication_time(day)
+
+        # Hourly metrics are only published once per day, in case the day is backfilled again
+        hourly_metrics = {} if hourly_metrics_exist(day) else calculate_hourly_metrics(day, accounts=accounts)
+
+        print(f'Calculated metrics of {date_helpers.datetime_to_str(day.start_time)}', metrics)
+
+        # CloudWatch doesn't accept data points too far in the past
+        if published_at >= datetime.now(tz=date_helpers.get_timezone()) - timedelta(CW_MAX_PAST_DAYS):
+            metric_data += build_metric_data(metrics, published_at) + build_hourly_metric_data(hourly_metrics)
+
+        calculated.append((day, metrics, hourly_metrics))
+
+    # The metrics of all the days are published at once, before uploading them to S3, as the files in S3 mark the
+    # days whose metrics have been published
+    if metric_data:
+        publish_metric_data(metric_data)
+
+    for day, metrics, hourly_metrics in calculated:
+        upload_metrics_to_s3(metrics, get_publication_time(day))
+
+        if hourly_metrics:
+            upload_hourly_metrics_to_s3(day, hourly_metrics)
+
+
 def handler(event, context):
+    # Fail before fetching any resource if a setting is invalid, instead of when it's used
+    env_helpers.validate()
+
+    # Backfill the metrics of a range of days, e.g. {"backfill": {"start": "2024-01-01", "end": "2024-01-07"}}
+    if 'backfill' in event:
+        backfill(datetime.strptime(event['backfill']['start'], '%Y-%m-%d'),
+                 datetime.strptime(event['backfill']['end'], '%Y-%m-%d'),
+                 event['backfill'].get('onlyMissing', True))
+        return
+
     # Build a time window (yesterday throughout the day) for calculating metrics
     tw = generate_time_window_for_fetching_data()
 
     # Fetch the organization's accounts and their resources
-    account_manager.fetch_resources(tw)
+    errors = account_manager.fetch_resources(tw)
+
+    for a_id, account_errors in errors.items():
+        print(f'({a_id}) could not fetch resources, the account is excluded from the metrics: {account_errors}')
 
     # Calculate account metrics
-    metrics = calculate_daily_metrics()
+    metrics = calculate_daily_metrics(tw, errors.keys())
+
+    # The function runs several times a day, but the hourly metrics of the day are only published by the first run
+    hourly_metrics = {} if hourly_metrics_exist(tw) else calculate_hourly_metrics(tw, errors.keys())
 
     print('Calculated metrics', metrics)
 
-    # Publish metrics in CloudWatch and upload them to S3
-    publish_metrics_in_cloudwatch(metrics)
+    # Publish metrics in CloudWatch and upload them to S3, where the hourly metrics mark that they have been published
+    publish_metric_data(build_metric_data(metrics) + build_hourly_metric_data(hourly_metrics))
     upload_metrics_to_s3(metrics)
 
+    if hourly_metrics:
+        upload_hourly_metrics_to_s3(tw, hourly_metrics)
+
 
 if __name__ == '__main__':
     """
@@ -20,24 +20,29 @@
 # Summary: this module is calculated as the ratio of normalized instance hours (NIH) driven by Launch Templates to NIH driven through Launch Configuration based Autoscaling groups.
 
 
-def calculate(instances: dict):
+def calculate(instances: dict, instance_table=None):
     """
     Calculates the Launch Template score.
 
     :param instances: structure with fetched information about Instances
+    :param instance_table: columnar copy of the Instances. If specified, the vCPU hours are aggregated from it
 
     :return: numeric value of the Launch Template Score
     """
 
-    lt_vcpu_h = 0
-    lc_vcpu_h = 0
-
-    for _, instance in instances.items():
-        # Launched in an ASG driven by a Launch Template
-        if instance.asg_name is not None and instance.lt is not None:
-            lt_vcpu_h += instance.vcpu_h
-        # Launched in an ASG driven by a Launch Configuration
-        elif instance.asg_name is not None and instance.lt_name is None:
-            lc_vcpu_h += instance.vcpu_h
+    if instance_table is not None:
+        lt_vcpu_h = instance_table.lt_vcpu_h()
+        lc_vcpu_h = instance_table.lc_vcpu_h()
+    else:
+        lt_vcpu_h = 0
+        lc_vcpu_h = 0
+
+        for _, instance in instances.items():
+            # Launched in an ASG driven by a Launch Template
+            if instance.asg_name is not None and instance.lt is not None:
+                lt_vcpu_h += instance.vcpu_h
+            # Launched in an ASG driven by a Launch Configuration
+            elif instance.asg_name is not None and instance.lt is None:
+                lc_vcpu_h += instance.vcpu_h
 
     return 0 if lt_vcpu_h == lc_vcpu_h == 0 else (lt_vcpu_h / (lt_vcpu_h + lc_vcpu_h)) * 10
@@ -26,12 +26,24 @@ SP_TYPE_SIMPLE = 'SimpleScaling'
 SP_TYPE_STEP = 'StepScaling'
 
 
-def calculate(instance_data: dict, asg_data: dict):
+def _get_policy_points(sp_type: str) -> int:
+    if sp_type == SP_TYPE_PREDICTIVE:
+        return 3
+    elif sp_type == SP_TYPE_TARGET_TRACKING:
+        return 2
+    elif sp_type == SP_TYPE_SIMPLE or sp_type == SP_TYPE_STEP:
+        return 1
+
+    return 0
+
+
+def calculate(instance_data: dict, asg_data: dict, instance_table=None):
     """
     Calculates the Scaling Policy score.
 
     :param instance_data: structure with fetched information about Instances in the time window being evaluated
     :param asg_data: structure with fetched information about ASGs in the time window being evaluated
+    :param instance_table: columnar copy of the Instances. If specified, the launches are counted from it
 
     :return: numeric value of the Scaling Policy Score
     """
@@ -39,20 +51,18 @@ def calculate(instance_data: dict, asg_data: dict):
     asg_driven_launches = 0
     score = 0
 
-    for _, instance in instance_data.items():
-        # The Instance was launched in an ASG
-        if instance.asg_name is not None:
-            # Check if we could fetch the Instance's ASG data from CloudTrail
-            if instance.asg_name in asg_data and asg_data[instance.asg_name].sp is not None:
-                asg_driven_launches += 1
-                asg = asg_data[instance.asg_name]
-
-                if asg.sp == SP_TYPE_PREDICTIVE:
-                    score += 3
-                elif asg.sp == SP_TYPE_TARGET_TRACKING:
-                    score += 2
-                elif asg.sp == SP_TYPE_SIMPLE or asg.sp == SP_TYPE_STEP:
-                    score += 1
+    if instance_table is not None:
+        for sp_type, launches in instance_table.count_by_policy_type().items():
+            asg_driven_launches += launches
+            score += launches * _get_policy_points(sp_type)
+    else:
+        for _, instance in instance_data.items():
+            # The Instance was launched in an ASG
+            if instance.asg_name is not None:
+                # Check if we could fetch the Instance's ASG data from CloudTrail
+                if instance.asg_name in asg_data and asg_data[instance.asg_name].sp is not None:
+                    asg_driven_launches += 1
+                    score += _get_policy_points(asg_data[instance.asg_name].sp)
 
     # Average the score across all Instances launched in ASGs
     score /= max(1, asg_driven_launches)
@@ -20,17 +20,14 @@
 # Summary: this module is calculated as the ratio of Max Running Instances to the Minimum running instances on any day.
 
 
-def calculate(instances: dict):
+def _sweep(instances: dict) -> (int, int):
     """
-    Calculates the scaling score.
-
-    To identify overlapping running instances, generates a sorted list with all start times and end times.
-    Then the list is traversed and a counter is increased when finding a start time,
-    and decreased when finding an end time.
+    Traverses the sorted start and end times of the running windows of the Instances, increasing a counter when finding
+    a start time and decreasing it when finding an end time.
 
     :param instances: structure with fetched information about Instances
 
-    :return: numeric value of the Scaling Score
+    :return: tuple with the minimum and maximum concurrent running Instances
     """
 
     min_i = None                # Minimum concurrent running Instances
@@ -57,6 +54,25 @@ def calculate(instances: dict):
         max_i = max(max_i, count)
         min_i = count if min_i is None else min(count, min_i)
 
+    return min_i, max_i
+
+
+def calculate(instances: dict, concurrency: tuple = None):
+    """
+    Calculates the scaling score.
+
+    To identify overlapping running instances, generates a sorted list with all start times and end times.
+    Then the list is traversed and a counter is increased when finding a start time,
+    and decreased when finding an end time.
+
+    :param instances: structure with fetched information about Instances
+    :param concurrency: minimum and maximum concurrent running Instances, if already calculated from an interval index
+
+    :return: numeric value of the Scaling Score
+    """
+
+    min_i, max_i = _sweep(instances) if concurrency is None else concurrency
+
     if min_i is None:
         min_i = 0
 
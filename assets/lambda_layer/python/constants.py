@@ -1,5 +1,21 @@
 MAX_CT_RELATIVE_DAYS_SEARCH = 90
 
+# Time CloudTrail may take to make an event available after it occurs
+MAX_CT_EVENT_DELIVERY_MINUTES = 15
+
+# Expected number of CloudTrail events fetched by each shard when a lookup is split into time ranges
+EVENTS_PER_LOOKUP_SHARD = 500
+
+# Days of CloudTrail events fetched by each shard of a lookup whose events haven't been fetched before, as their number
+# can't be estimated
+DAYS_PER_COLD_LOOKUP_SHARD = 7
+
+# Maximum number of referenced resources fetched with one lookup each, instead of fetching all the resources of its type
+MAX_TARGETED_LOOKUPS = 5
+
+# Days after which all the regions of an account are scanned, even if no resources were found in some of them
+REGION_FULL_SCAN_DAYS = 7
+
 DEFAULT = '$Default'
 EMPTY_VALUE = '--'
 
@@ -9,6 +25,10 @@ RESOURCE_TYPE_LT = 'AWS::EC2::LaunchTemplate'
 RESOURCE_TYPE_ASG = 'AWS::AutoScaling::AutoScalingGroup'
 RESOURCE_TYPE_SP = 'AWS::AutoScaling::ScalingPolicy'
 
+# CloudTrail event sources
+EVENT_SOURCE_EC2 = 'ec2.amazonaws.com'
+EVENT_SOURCE_AUTOSCALING = 'autoscaling.amazonaws.com'
+
 # EC2 Instance Lifecycle event CloudTrail codes
 EVENT_CODE_RUNNING = 16
 EVENT_CODE_PENDING = 0
@@ -84,6 +104,16 @@ CW_DIMENSION_NAME_ACCOUNT_ID = 'accountId'
 CW_DIMENSION_VALUE_ORG = 'ORG'
 CW_METRIC_NAME_VCPU_H = 'vcpuh'
 CW_METRIC_PERIOD = 3600
+
+# Metrics published every hour of the day, besides the daily ones, with an extra dimension that tells their resolution
+CW_DIMENSION_NAME_RESOLUTION = 'resolution'
+CW_DIMENSION_VALUE_HOURLY = 'hourly'
+CW_METRIC_NAME_MIN_INSTANCES = 'minRunningInstances'
+CW_METRIC_NAME_MAX_INSTANCES = 'maxRunningInstances'
+HOURLY_METRICS_PERIOD = 3600
+
+# Days in the past up to which CloudWatch accepts data points
+CW_MAX_PAST_DAYS = 14
 ALL_CW_METRICS = {SCORE_DIVERSIFICATION, SCORE_LT, SCORE_POLICY, SCORE_SCALING, CW_METRIC_NAME_VCPU_H}
 
 BUCKET_METRICS = 'BUCKET_METRICS'
@@ -1,3 +1,8 @@
-from . import cloudtrail_helpers, date_helpers, organizations_helpers, ec2_helpers, sts_helpers, s3_helpers, cloudwatch_helpers
+from . import client_helpers, cloudtrail_helpers, date_helpers, organizations_helpers, ec2_helpers, sts_helpers, \
+    s3_helpers, cloudwatch_helpers, cache_helpers, trail_log_helpers, aio_helpers, \
+    pipeline_helpers, decoder_helpers, process_helpers, env_helpers
 from .cloudtrail_helpers import InvalidEvent
 from .date_helpers import TimeWindow
+from .process_helpers import WorkerProcessError
+from .env_helpers import InvalidSetting
+from .cache_helpers import EventCache, CachedEvents, RegionActivityIndex, RegionActivity
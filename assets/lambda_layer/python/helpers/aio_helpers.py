@@ -0,0 +1,492 @@
+#!/usr/bin/python
+# License: Apache 2.0
+# Summary: module with an asyncio engine to perform AWS requests, signed and parsed with botocore
+
+import asyncio
+import collections
+import random
+import ssl
+
+from datetime import datetime
+from urllib.parse import urlsplit
+from botocore.auth import SigV4Auth
+from botocore.awsrequest import prepare_request_dict, create_request_object
+from botocore.credentials import ReadOnlyCredentials
+from botocore.exceptions import ClientError
+from botocore.parsers import create_parser
+from botocore.serialize import create_serializer
+from . import client_helpers, cloudtrail_helpers
+
+_MAX_ATTEMPTS = 5
+_RETRYABLE_ERROR_CODES = ('ThrottlingException', 'Throttling', 'TooManyRequestsException', 'RequestLimitExceeded',
+                          'InternalError', 'InternalFailure', 'ServiceUnavailable')
+
+# Errors of the connections, after which requests are sent again through a new connection
+TRANSPORT_ERRORS = (OSError, EOFError, asyncio.TimeoutError)
+
+# Lambda functions can't open more than 1024 file descriptors
+_DEFAULT_MAX_CONNECTIONS = 256
+_DEFAULT_CONNECT_TIMEOUT = 60
+_DEFAULT_READ_TIMEOUT = 60
+
+
+class HTTPConnectionPool:
+    """
+    Minimal HTTP/1.1 client that keeps the connections to every host open and reuses them between requests. The number
+    of connections open at the same time, either idle or in use, is limited: requests wait for an idle connection or
+    for one to be closed when the limit is reached.
+    """
+
+    def __init__(self, max_connections: int = _DEFAULT_MAX_CONNECTIONS,
+                 connect_timeout: float = _DEFAULT_CONNECT_TIMEOUT, read_timeout: float = _DEFAULT_READ_TIMEOUT):
+        """
+        :param max_connections: maximum number of connections open at the same time
+        :param connect_timeout: seconds to wait for a connection to be established
+        :param read_timeout: seconds to wait for the response of a request once it's sent
+        """
+
+        self.max_connections = max_connections
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+
+        self._idle: dict[tuple: list] = {}
+        self._open_connections = 0
+        self._waiters = collections.deque()
+        self._ssl_context = ssl.create_default_context()
+
+    async def _open(self, scheme: str, host: str, port: int):
+        if scheme == 'https':
+            connection = asyncio.open_connection(host, port, ssl=self._ssl_context, server_hostname=host)
+        else:
+            connection = asyncio.open_connection(host, port)
+
+        return await asyncio.wait_for(connection, self.connect_timeout)
+
+    def _wake_up(self) -> None:
+        # Wake up the first request waiting for a connection
+        while self._waiters:
+            waiter = self._waiters.popleft()
+
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+    def _release(self, origin: tuple, connection: tuple) -> None:
+        self._idle[origin].append(connection)
+        self._wake_up()
+
+    def _discard(self, connection: tuple) -> None:
+        connection[1].close()
+        self._open_connections -= 1
+        self._wake_up()
+
+    async def _acquire(self, origin: tuple) -> (tuple, bool):
+        idle = self._idle.setdefault(origin, [])
+
+        while True:
+            while idle:
+                connection = idle.pop()
+
+                # The server may have closed the connection while it was idle
+                if not connection[0].at_eof():
+                    return connection, True
+
+                self._discard(connection)
+
+            # Rather than waiting for a connection in use, close an idle connection to another host
+            if self._open_connections >= self.max_connections:
+                for _, connections in self._idle.items():
+                    if connections:
+                        self._discard(connections.pop(0))
+                        break
+
+            if self._open_connections < self.max_connections:
+                break
+
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                # Pass the wake-up on to the next request if this one was cancelled after being woken up
+                if waiter.done() and not waiter.cancelled():
+                    self._wake_up()
+
+                raise
+
+        self._open_connections += 1
+
+        try:
+            return await self._open(*origin), False
+        except BaseException:
+            self._open_connections -= 1
+            self._wake_up()
+            raise
+
+    @staticmethod
+    async def _read_body(reader: asyncio.StreamReader, headers: dict) -> (bytes, bool):
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+
+            while True:
+                size = int((await reader.readline()).split(b';')[0].strip(), 16)
+
+                if size == 0:
+                    # Skip the trailers
+                    while (await reader.readline()).strip():
+                        pass
+
+                    return b''.join(chunks), True
+
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+
+        if 'content-length' in headers:
+            return await reader.readexactly(int(headers['content-length'])), True
+
+        # Without length nor chunks, the body lasts until the server closes the connection
+        return await reader.read(), False
+
+    async def _exchange(self, connection: tuple, request: bytes, head: bool) -> (int, dict, bytes, bool):
+        reader, writer = connection
+
+        writer.write(request)
+        await writer.drain()
+
+        status_line = await reader.readline()
+
+        if not status_line:
+            raise ConnectionResetError('The connection was closed before receiving a response')
+
+        status = int(status_line.split()[1])
+        response_headers = {}
+
+        while True:
+            line = (await reader.readline()).decode('latin-1').strip()
+
+            if not line:
+                break
+
+            name, value = line.split(':', 1)
+            response_headers[name.strip().lower()] = value.strip()
+
+        # Responses to HEAD requests and the ones with these status codes never have a body
+        if head or status in (204, 304) or 100 <= status < 200:
+            response_body, reusable = b'', True
+        else:
+            response_body, reusable = await self._read_body(reader, response_headers)
+
+        reusable = reusable and response_headers.get('connection', '').lower() != 'close'
+
+        return status, response_headers, response_body, reusable
+
+    async def request(self, method: str, url: str, headers: dict, body: bytes) -> (int, dict, bytes):
+        """
+        Sends a request and reads its response. If a reused connection turns out to be closed by the server, the
+        request is sent again through a new connection.
+
+        :param method: HTTP method
+        :param url: full URL of the request
+        :param headers: headers of the request
+        :param body: body of the request
+
+        :return: tuple with the status code, headers and body of the response
+
+        :raise: any of TRANSPORT_ERRORS if the request couldn't be sent or its response couldn't be read in time
+        """
+
+        parts = urlsplit(url)
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        origin = (parts.scheme, parts.hostname, port)
+        path = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+
+        lines = [f'{method} {path} HTTP/1.1', f'Host: {parts.netloc}', f'Content-Length: {len(body)}']
+        lines += [f'{name}: {value}' for name, value in headers.items()
+                  if name.lower() not in ('host', 'content-length')]
+        request = ('\r\n'.join(lines) + '\r\n\r\n').encode('utf-8') + body
+
+        while True:
+            connection, reused = await self._acquire(origin)
+
+            try:
+                status, response_headers, response_body, reusable = await asyncio.wait_for(
+                    self._exchange(connection, request, method == 'HEAD'), self.read_timeout
+                )
+            except TRANSPORT_ERRORS as e:
+                self._discard(connection)
+
+                # Idle connections closed by the server fail as soon as they're used, unlike slow servers
+                if reused and not isinstance(e, asyncio.TimeoutError):
+                    continue
+
+                raise
+            except BaseException:
+                self._discard(connection)
+                raise
+
+            if reusable:
+                self._release(origin, connection)
+            else:
+                self._discard(connection)
+
+            return status, response_headers, response_body
+
+    async def close(self) -> None:
+        for _, connections in self._idle.items():
+            for connection in connections:
+                self._discard(connection)
+
+        self._idle = {}
+
+
+class AsyncAWSClient:
+    """
+    Client of an AWS service whose requests are serialized, signed and parsed by botocore, and sent with an asyncio
+    HTTP client
+    """
+
+    def __init__(self, pool: HTTPConnectionPool, client, credentials: ReadOnlyCredentials, endpoint_url: str = None):
+        """
+        :param pool: connections used to send the requests
+        :param client: boto3 client of the service in the region in which to operate, which resolves the service model,
+        endpoint and region. It's only read, so it can be shared by clients with different credentials
+        :param credentials: credentials used to sign the requests
+        :param endpoint_url: URL to which requests are sent instead of the endpoint of the service, e.g. a stub
+        """
+
+        self.pool = pool
+        self.service_model = client.meta.service_model
+        self.region = client.meta.region_name
+        self.endpoint_url = endpoint_url or client.meta.endpoint_url
+
+        self._credentials = credentials
+        self._serializer = create_serializer(self.service_model.metadata['protocol'])
+        self._parser = create_parser(self.service_model.metadata['protocol'])
+
+    def _prepare_request(self, operation_model, params: dict):
+        request_dict = self._serializer.serialize_to_request(params, operation_model)
+        prepare_request_dict(request_dict, endpoint_url=self.endpoint_url)
+
+        request = create_request_object(request_dict)
+        SigV4Auth(self._credentials, self.service_model.signing_name, self.region).add_auth(request)
+
+        return request.prepare()
+
+    async def call(self, operation: str, rate_limiter=None, **params) -> dict:
+        """
+        Performs a request, retrying it with exponential backoff if it's throttled, fails due to a server error or its
+        connection fails
+
+        :param operation: name of the API operation, e.g. LookupEvents
+        :param rate_limiter: TokenBucket from which every attempt takes a token, if any
+        :param params: parameters of the request
+
+        :return: parsed response
+        """
+
+        operation_model = self.service_model.operation_model(operation)
+
+        for attempt in range(1, _MAX_ATTEMPTS + 1):
+            if rate_limiter is not None:
+                await asyncio.sleep(rate_limiter.reserve())
+
+            # Requests are signed again on every attempt, as signatures include the time
+            request = self._prepare_request(operation_model, params)
+            body = request.body or b''
+
+            try:
+                status, headers, response_body = await self.pool.request(
+                    request.method, request.url, dict(request.headers.items()),
+                    body.encode('utf-8') if isinstance(body, str) else body
+                )
+            except TRANSPORT_ERRORS:
+                if attempt == _MAX_ATTEMPTS:
+                    raise
+
+                await asyncio.sleep(random.uniform(0, 0.1 * 2 ** attempt))
+                continue
+
+            parsed = self._parser.parse({'status_code': status, 'headers': headers, 'body': response_body},
+                                        operation_model.output_shape)
+
+            if status < 300:
+                return parsed
+
+            error = ClientError(parsed, operation)
+
+            if rate_limiter is not None and parsed['Error'].get('Code') in _RETRYABLE_ERROR_CODES:
+                rate_limiter.throttled()
+
+            if attempt == _MAX_ATTEMPTS or (status < 500 and parsed['Error'].get('Code') not in _RETRYABLE_ERROR_CODES):
+                raise error
+
+            await asyncio.sleep(random.uniform(0, 0.1 * 2 ** attempt))
+
+    async def paginate(self, operation: str, input_token: str, output_token: str, rate_limiter=None, **params):
+        """
+        Performs a request and the following ones needed to get all the pages of results
+
+        :param operation: name of the API operation, e.g. LookupEvents
+        :param input_token: name of the request parameter that carries the pagination token
+        :param output_token: name of the response field that carries the pagination token
+        :param rate_limiter: TokenBucket from which every request takes a token, if any
+        :param params: parameters of the first request
+
+        :return: asynchronous generator of parsed responses
+        """
+
+        while True:
+            page = await self.call(operation, rate_limiter, **params)
+
+            yield page
+
+            if not page.get(output_token):
+                return
+
+            params = {**params, input_token: page[output_token]}
+
+
+class AsyncFetchEngine:
+    """
+    Performs the CloudTrail, EC2 and STS requests needed to fetch resources as coroutines, so that thousands of them can
+    be in flight in a single thread. The paginations running at the same time in every account and region are limited
+    by a semaphore, and their requests take tokens from the same rate limiters as the synchronous requests.
+    """
+
+    def __init__(self, paginations_per_region: int, endpoint_url: str = None,
+                 max_connections: int = _DEFAULT_MAX_CONNECTIONS):
+        """
+        :param paginations_per_region: maximum number of paginations running at the same time in an account and region
+        :param endpoint_url: URL to which requests are sent instead of the endpoints of the services, e.g. a stub
+        :param max_connections: maximum number of connections open at the same time
+        """
+
+        self.paginations_per_region = paginations_per_region
+        self.endpoint_url = endpoint_url
+
+        self._pool = HTTPConnectionPool(max_connections)
+        self._clients: dict[tuple: AsyncAWSClient] = {}
+        self._boto3_clients: dict[tuple: object] = {}
+        self._default_credentials = None
+        self._semaphores: dict[tuple: asyncio.Semaphore] = {}
+
+    async def _get_client(self, service: str, region: str = None, credentials: dict = None) -> AsyncAWSClient:
+        key = (service, region, (credentials or {}).get('aws_access_key_id'))
+
+        if key in self._clients:
+            return self._clients[key]
+
+        # Creating a boto3 client loads the model of the service from disk, and resolving the default credentials may
+        # request them, so both are done once and in a separate thread not to block the event loop. The boto3 client
+        # is only used to resolve the model and endpoint, so a single one per service and region is created
+        if (service, region) not in self._boto3_clients:
+            self._boto3_clients[(service, region)] = await asyncio.to_thread(client_helpers.get_client, service, region)
+
+        if credentials is not None:
+            signing_credentials = ReadOnlyCredentials(credentials['aws_access_key_id'],
+                                                      credentials['aws_secret_access_key'],
+                                                      credentials.get('aws_session_token'))
+        else:
+            if self._default_credentials is None:
+                self._default_credentials = await asyncio.to_thread(client_helpers.get_credentials)
+
+            signing_credentials = self._default_credentials
+
+        # Another coroutine may have created the client while this one was waiting
+        if key not in self._clients:
+            self._clients[key] = AsyncAWSClient(self._pool, self._boto3_clients[(service, region)], signing_credentials,
+                                                self.endpoint_url)
+
+        return self._clients[key]
+
+    def _get_semaphore(self, account_id: str, region: str) -> asyncio.Semaphore:
+        if (account_id, region) not in self._semaphores:
+            self._semaphores[(account_id, region)] = asyncio.Semaphore(self.paginations_per_region)
+
+        return self._semaphores[(account_id, region)]
+
+    async def assume_role(self, role_arn: str) -> (dict, datetime):
+        """
+        Assumes a role, like sts_helpers does
+
+        :param role_arn: ARN of the role to assume
+
+        :return: tuple with the credentials to perform requests with the role and their expiration time
+        """
+
+        client = await self._get_client('sts')
+        response = await client.call('AssumeRole', RoleArn=role_arn, RoleSessionName='RoleAssume')
+
+        credentials = {
+            'aws_access_key_id': response['Credentials']['AccessKeyId'],
+            'aws_secret_access_key': response['Credentials']['SecretAccessKey'],
+            'aws_session_token': response['Credentials']['SessionToken'],
+        }
+
+        return credentials, response['Credentials']['Expiration']
+
+    async def describe_regions(self, credentials: dict = None) -> [str]:
+        client = await self._get_client('ec2', credentials=credentials)
+        response = await client.call('DescribeRegions', AllRegions=False)
+
+        return [region['RegionName'] for region in response['Regions']]
+
+    async def has_events(self, attribute_key: str, attribute_value: str, region: str, start_time: datetime,
+                         end_time: datetime, credentials: dict = None, account_id: str = None) -> bool:
+        """
+        Checks whether there's at least one CloudTrail event matching a lookup attribute between two points in time,
+        using a single request
+
+        :param attribute_key: lookup attribute used to filter events, e.g. ResourceType or EventName
+        :param attribute_value: value of the lookup attribute
+        :param region: region in which to operate
+        :param start_time: point in time from which to look for events
+        :param end_time: point in time until which to look for events
+        :param credentials: credentials to perform the operation
+        :param account_id: account in which to operate, used to share the rate limit of the account and region
+
+        :return: True if there's at least one event, False otherwise
+        """
+
+        client = await self._get_client('cloudtrail', region, credentials)
+        response = await client.call('LookupEvents', cloudtrail_helpers.get_rate_limiter(account_id, region),
+                                     StartTime=start_time, EndTime=end_time, MaxResults=1,
+                                     LookupAttributes=[{'AttributeKey': attribute_key,
+                                                        'AttributeValue': attribute_value}])
+
+        return len(response['Events']) != 0
+
+    async def lookup_events(self, attribute_key: str, attribute_value: str, region: str, event_names: set,
+                            start_time: datetime, end_time: datetime, credentials: dict = None,
+                            account_id: str = None) -> [dict]:
+        """
+        Fetches the CloudTrail events matching a lookup attribute between two points in time
+
+        :param attribute_key: lookup attribute used to filter events, e.g. ResourceType or EventName
+        :param attribute_value: value of the lookup attribute
+        :param region: region in which to operate
+        :param event_names: names of the events to return
+        :param start_time: point in time from which to fetch events
+        :param end_time: point in time until which to fetch events
+        :param credentials: credentials to perform the operation
+        :param account_id: account in which to operate, used to share the rate limit of the account and region
+
+        :return: list of CloudTrail events, in the order returned by CloudTrail (most recent first)
+        """
+
+        client = await self._get_client('cloudtrail', region, credentials)
+        rate_limiter = cloudtrail_helpers.get_rate_limiter(account_id, region)
+        events = []
+
+        async with self._get_semaphore(account_id, region):
+            async for page in client.paginate('LookupEvents', 'NextToken', 'NextToken', rate_limiter,
+                                              StartTime=start_time, EndTime=end_time,
+                                              LookupAttributes=[{'AttributeKey': attribute_key,
+                                                                 'AttributeValue': attribute_value}]):
+                events += [event for event in page.get('Events', []) if event['EventName'] in event_names]
+
+        return events
+
+    async def close(self) -> None:
+        await self._pool.close()
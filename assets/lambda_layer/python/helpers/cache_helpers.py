@@ -0,0 +1,246 @@
+#!/usr/bin/python
+# License: Apache 2.0
+# Summary: module with tiered caches (memory + S3) to persist already fetched data between executions
+
+import gzip
+import json
+
+from collections import OrderedDict
+from datetime import datetime
+from threading import Lock
+from botocore.exceptions import ClientError
+from . import s3_helpers
+
+# Events are cached compacted, so only the fields used to build resources are persisted: the raw CloudTrail payload
+# is replaced by the fields extracted from it
+_PERSISTED_EVENT_FIELDS = ('EventId', 'EventName', 'EventTime', 'Resources', 'Payload')
+
+# Version of the format of the persisted events. Entries persisted with other versions are ignored and fetched again
+_EVENTS_FORMAT_VERSION = 2
+
+# Entries kept in memory by the event cache. Every account uses a few entries per region
+_DEFAULT_EVENT_CACHE_MAX_ENTRIES = 4096
+
+
+class CachedEvents:
+    """
+    Class that represents the events fetched for a lookup attribute, sorted in ascending order by event time,
+    along with the point in time up to which those events are known to be complete (high-water mark)
+    """
+
+    def __init__(self, events: [dict], high_water_mark: datetime):
+        self.events = events
+        self.high_water_mark = high_water_mark
+
+    def evict(self, horizon: datetime) -> None:
+        """
+        Drops the events that occurred before a given point in time
+
+        :param horizon: events older than this point in time are discarded
+        """
+
+        self.events = [event for event in self.events if event['EventTime'] >= horizon]
+
+    def serialize(self) -> bytes:
+        body = {
+            'version': _EVENTS_FORMAT_VERSION,
+            'highWaterMark': self.high_water_mark.isoformat(),
+            'events': [
+                {
+                    **{field: event[field] for field in _PERSISTED_EVENT_FIELDS if field in event},
+                    'EventTime': event['EventTime'].isoformat()
+                }
+                for event in self.events
+            ]
+        }
+
+        return gzip.compress(json.dumps(body).encode('utf-8'))
+
+    @classmethod
+    def deserialize(cls, contents: bytes):
+        body = json.loads(gzip.decompress(contents).decode('utf-8'))
+
+        # Entries persisted before events were compacted keep the raw payloads, treat them as a miss
+        if body.get('version') != _EVENTS_FORMAT_VERSION:
+            return None
+
+        for event in body['events']:
+            event['EventTime'] = datetime.fromisoformat(event['EventTime'])
+
+        return cls(body['events'], datetime.fromisoformat(body['highWaterMark']))
+
+
+class RegionActivity:
+    """
+    Class that records, for every region of an account, when resources were last found in it and when it was
+    last checked, along with the last time that all the regions of the account were fully scanned
+    """
+
+    def __init__(self, regions: dict = None, last_full_scan: datetime = None):
+        self.regions: dict[str: dict] = {} if regions is None else regions
+        self.last_full_scan = last_full_scan
+
+    def is_active(self, region: str, horizon: datetime) -> bool:
+        """
+        Determines whether resources were found in a region after a given point in time
+
+        :param region: region to check
+        :param horizon: point in time after which resources must have been found
+
+        :return: True if the region is active, False otherwise
+        """
+
+        return region in self.regions and self.regions[region]['lastActive'] is not None and \
+            self.regions[region]['lastActive'] >= horizon
+
+    def last_checked(self, region: str):
+        return self.regions[region]['lastChecked'] if region in self.regions else None
+
+    def update(self, region: str, checked_at: datetime, active: bool) -> None:
+        last_active = self.regions[region]['lastActive'] if region in self.regions else None
+
+        self.regions[region] = {
+            'lastActive': checked_at if active else last_active,
+            'lastChecked': checked_at
+        }
+
+    def serialize(self) -> bytes:
+        def to_str(date_time):
+            return None if date_time is None else date_time.isoformat()
+
+        body = {
+            'lastFullScan': to_str(self.last_full_scan),
+            'regions': {
+                region: {name: to_str(value) for name, value in data.items()}
+                for region, data in self.regions.items()
+            }
+        }
+
+        return json.dumps(body).encode('utf-8')
+
+    @classmethod
+    def deserialize(cls, contents: bytes):
+        def from_str(value):
+            return None if value is None else datetime.fromisoformat(value)
+
+        body = json.loads(contents.decode('utf-8'))
+
+        regions = {
+            region: {name: from_str(value) for name, value in data.items()}
+            for region, data in body['regions'].items()
+        }
+
+        return cls(regions, from_str(body['lastFullScan']))
+
+
+class TieredCache:
+    """
+    Two-tier cache. The first tier lives in the memory of the process and survives between invocations of a warm
+    Lambda container, while the second one is an S3 bucket used by cold containers. Entries must implement the
+    serialize and deserialize methods, which may return None for contents that can't be used.
+    """
+
+    def __init__(self, entry_class, prefix: str, bucket: str = None, extension: str = 'json',
+                 max_entries: int = None):
+        """
+        :param max_entries: maximum number of entries kept in memory. When exceeded, the least recently used ones are
+        discarded from memory, but they remain in S3. If not specified, memory is not bounded
+        """
+
+        self.entry_class = entry_class
+        self.prefix = prefix
+        self.bucket = bucket
+        self.extension = extension
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str: object] = OrderedDict()
+        self._lock = Lock()
+
+    def _build_s3_key(self, key: str) -> str:
+        return f'{self.prefix}/{key}.{self.extension}'
+
+    def _retrieve_from_s3(self, key: str):
+        if not self.bucket:
+            return None
+
+        try:
+            contents = s3_helpers.retrieve_file_bytes(self.bucket, self._build_s3_key(key))
+        except ClientError:
+            # The entry has not been persisted yet, or it can't be read. Either way, treat it as a miss
+            return None
+
+        return self.entry_class.deserialize(contents)
+
+    def _upload_to_s3(self, key: str, entry) -> None:
+        if not self.bucket:
+            return
+
+        try:
+            s3_helpers.upload_file_bytes(self.bucket, self._build_s3_key(key), entry.serialize())
+        except ClientError as e:
+            # Not being able to persist the entry only means that the next cold execution won't find it
+            print(f'Could not persist cached entry {key}: {e}')
+
+    def _keep_in_memory(self, key: str, entry) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+
+            if self.max_entries is not None and len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key: str):
+        """
+        Retrieves the entry of a key, looking first in memory and then in S3
+
+        :param key: key that identifies the entry
+
+        :return: cached entry, or None if the key is not cached
+        """
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None:
+                self._entries.move_to_end(key)
+
+        if entry is None:
+            entry = self._retrieve_from_s3(key)
+
+            if entry is not None:
+                self._keep_in_memory(key, entry)
+
+        return entry
+
+    def put(self, key: str, entry, persist: bool = True) -> None:
+        """
+        Stores the entry of a key in memory and, unless stated otherwise, in S3
+
+        :param key: key that identifies the entry
+        :param entry: entry to cache
+        :param persist: whether to upload the entry to S3. Entries that cold containers can rebuild as cheaply as
+        reading them can be kept only in memory
+        """
+
+        self._keep_in_memory(key, entry)
+
+        if persist:
+            self._upload_to_s3(key, entry)
+
+
+class EventCache(TieredCache):
+    """
+    Cache of CloudTrail events, keyed by account, region and lookup attribute
+    """
+
+    def __init__(self, bucket: str = None, prefix: str = 'cache/cloudtrail',
+                 max_entries: int = _DEFAULT_EVENT_CACHE_MAX_ENTRIES):
+        super().__init__(CachedEvents, prefix, bucket, 'json.gz', max_entries)
+
+
+class RegionActivityIndex(TieredCache):
+    """
+    Cache of the activity of the regions of every account, keyed by account id
+    """
+
+    def __init__(self, bucket: str = None, prefix: str = 'cache/regions'):
+        super().__init__(RegionActivity, prefix, bucket)
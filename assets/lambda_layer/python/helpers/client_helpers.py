@@ -0,0 +1,114 @@
+#!/usr/bin/python
+# License: Apache 2.0
+# Summary: module with a thread-safe registry of boto3 clients, reused by all the helpers
+
+import time
+import boto3
+
+from threading import Lock
+from botocore.config import Config
+from . import env_helpers
+
+# Temporary credentials obtained by assuming a role last for an hour by default. Clients created with them are
+# discarded a bit earlier, as requests made with expired credentials fail
+TEMPORARY_CREDENTIALS_TTL = 3300
+
+_clients: dict[tuple: tuple] = {}
+_sessions: dict[str: boto3.session.Session] = {}
+_lock = Lock()
+
+
+def _get_identity(credentials: dict) -> str:
+    return credentials.get('aws_access_key_id') if credentials else None
+
+
+def _get_config() -> Config:
+    return Config(max_pool_connections=env_helpers.get('MAX_POOL_CONNECTIONS'))
+
+
+def _evict_expired(now: float) -> None:
+    expired = [key for key, (_, expires_at) in _clients.items() if expires_at is not None and expires_at <= now]
+
+    for key in expired:
+        del _clients[key]
+
+    # Drop the sessions that no longer have clients
+    identities = {key[0] for key in _clients}
+
+    for identity in [identity for identity in _sessions if identity not in identities]:
+        del _sessions[identity]
+
+
+def get_client(service: str, region: str = None, credentials: dict = None):
+    """
+    Returns a boto3 client for a service, creating it the first time that it's requested for a combination of
+    credentials, region and service. Clients are thread-safe and keep a pool of connections, so they are shared by
+    all the threads of the process.
+
+    :param service: name of the AWS service
+    :param region: region in which to operate. If not specified, the default region is used
+    :param credentials: credentials to perform requests. If not specified, the default credentials are used
+
+    :return: boto3 client
+    """
+
+    if credentials is None:
+        credentials = {}
+
+    identity = _get_identity(credentials)
+    key = (identity, region, service)
+
+    with _lock:
+        now = time.time()
+        _evict_expired(now)
+
+        if key not in _clients:
+            # Sessions are not thread-safe, so both sessions and clients are created while holding the lock
+            if identity not in _sessions:
+                _sessions[identity] = boto3.session.Session(**credentials)
+
+            client = _sessions[identity].client(service, region_name=region, config=_get_config())
+
+            # Only temporary credentials expire
+            expires_at = now + TEMPORARY_CREDENTIALS_TTL if 'aws_session_token' in credentials else None
+
+            _clients[key] = (client, expires_at)
+
+        return _clients[key][0]
+
+
+def get_credentials(credentials: dict = None):
+    """
+    Returns the credentials used by the clients created with some credentials, resolving the default ones if needed
+
+    :param credentials: credentials to perform requests. If not specified, the default credentials are used
+
+    :return: botocore read-only credentials, used to sign requests
+    """
+
+    if credentials is None:
+        credentials = {}
+
+    identity = _get_identity(credentials)
+
+    with _lock:
+        if identity not in _sessions:
+            _sessions[identity] = boto3.session.Session(**credentials)
+
+        return _sessions[identity].get_credentials().get_frozen_credentials()
+
+
+def evict(credentials: dict) -> None:
+    """
+    Discards all the clients created with some credentials, e.g. because they are about to expire
+
+    :param credentials: credentials of which to discard the clients
+    """
+
+    identity = _get_identity(credentials)
+
+    with _lock:
+        for key in [key for key in _clients if key[0] == identity]:
+            del _clients[key]
+
+        _sessions.pop(identity, None)
@@ -3,31 +3,247 @@
 # License: Apache 2.0
 # Summary: module with helper methods to work with CloudTrail
 
-import boto3
-import json
+import heapq
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from threading import Lock
+from . import client_helpers, decoder_helpers
+
+LOOKUP_ATTRIBUTE_RESOURCE_TYPE = 'ResourceType'
+LOOKUP_ATTRIBUTE_EVENT_NAME = 'EventName'
+LOOKUP_ATTRIBUTE_READ_ONLY = 'ReadOnly'
+LOOKUP_ATTRIBUTE_RESOURCE_NAME = 'ResourceName'
+LOOKUP_ATTRIBUTE_EVENT_SOURCE = 'EventSource'
+
+# Maximum LookupEvents requests per second allowed in an account and region
+LOOKUP_EVENTS_TPS = 2
+
+_THROTTLING_ERROR_CODES = ('ThrottlingException', 'Throttling', 'TooManyRequestsException')
+
+_COMPACT_PAYLOAD_KEY = 'Payload'
+_COMPACT_EVENT_FIELDS = ('EventId', 'EventName', 'EventTime', 'Resources')
 
 
 class InvalidEvent(Exception):
     pass
 
 
-def extract_event_payload(event: dict) -> dict:
+class TokenBucket:
+    """
+    Rate limiter that allows a sustained number of requests per second and bursts of up to a given capacity.
+    Callers that find the bucket empty reserve a token and wait for it outside the lock, so they are served in order.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = rate if capacity is None else capacity
+
+        # Counters exposed to monitor the rate limiter
+        self.requests = 0
+        self.throttles = 0
+        self.wait_time = 0.0
+
+        self._tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self._lock = Lock()
+
+    def acquire(self) -> float:
+        """
+        Takes a token from the bucket, waiting until one is available if needed
+
+        :return: seconds waited
+        """
+
+        wait = self.reserve()
+
+        if wait:
+            time.sleep(wait)
+
+        return wait
+
+    def reserve(self) -> float:
+        """
+        Takes a token from the bucket without waiting for it, for callers that wait on their own, e.g. coroutines
+
+        :return: seconds to wait before using the token
+        """
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+            self._last_refill = now
+
+            # If there are no tokens left, the balance goes negative and the wait covers the debt
+            self._tokens -= 1
+            wait = 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+            self.requests += 1
+            self.wait_time += wait
+
+        return wait
+
+    def throttled(self) -> None:
+        """
+        Records that a request was throttled and empties the bucket, so that the following requests slow down
+        instead of being throttled as well
+        """
+
+        with self._lock:
+            self.throttles += 1
+            self._tokens = min(self._tokens, 0)
+
+    def stats(self) -> dict:
+        return {
+            'requests': self.requests,
+            'throttles': self.throttles,
+            'waitTime': round(self.wait_time, 2)
+        }
+
+
+# LookupEvents requests are rate limited per account and region, so all the callers share one bucket per pair
+_rate_limiters: dict[tuple: TokenBucket] = {}
+_rate_limiters_lock = Lock()
+
+
+def get_rate_limiter(account_id: str, region: str) -> TokenBucket:
+    """
+    Returns the rate limiter of LookupEvents requests in an account and region, creating it if needed
+
+    :param account_id: account in which requests are made
+    :param region: region in which requests are made
+
+    :return: TokenBucket object shared by all the requests made in the account and region
+    """
+
+    with _rate_limiters_lock:
+        if (account_id, region) not in _rate_limiters:
+            _rate_limiters[(account_id, region)] = TokenBucket(LOOKUP_EVENTS_TPS)
+
+        return _rate_limiters[(account_id, region)]
+
+
+def get_rate_limiters_stats() -> dict:
+    """
+    Returns the counters of all the rate limiters
+
+    :return: dictionary containing the counters of each rate limiter, by account id and region
+    """
+
+    with _rate_limiters_lock:
+        return {f'{account_id}/{region}': bucket.stats() for (account_id, region), bucket in _rate_limiters.items()}
+
+
+def _limit_rate(client, rate_limiter: TokenBucket) -> None:
+    """
+    Makes every LookupEvents request attempt sent by a client, including retries, take a token from a rate limiter
+
+    :param client: CloudTrail boto3 client
+    :param rate_limiter: rate limiter from which to take tokens
+    """
+
+    def before_send(**kwargs):
+        rate_limiter.acquire()
+
+    def needs_retry(response=None, **kwargs):
+        if response is not None and response[1].get('Error', {}).get('Code') in _THROTTLING_ERROR_CODES:
+            rate_limiter.throttled()
+
+    client.meta.events.register('before-send.cloudtrail.LookupEvents', before_send, unique_id='rate-limit-send')
+    client.meta.events.register('needs-retry.cloudtrail.LookupEvents', needs_retry, unique_id='rate-limit-retry')
+
+
+def extract_event_payload(event: dict, decoder: decoder_helpers.PayloadDecoder = None) -> dict:
     """
     Extracts and returns the payload of a CloudTrail event. Raises a InvalidEvent exception if there's an error
     associated to the event.
 
     :param event: event of which to extract its payload
+    :param decoder: decoder used to decode only the fields of the payload that will be used. If not specified, the
+    whole payload is decoded
 
     :return: payload of the CloudTrail event
     """
 
-    cloudtrail_event = json.loads(event['CloudTrailEvent'])
+    # Compacted events carry their payload already decoded
+    if _COMPACT_PAYLOAD_KEY in event:
+        return event[_COMPACT_PAYLOAD_KEY]
 
-    # Discard the event if it failed, as it did not incur an Instance state change
-    if 'errorCode' in cloudtrail_event:
+    # Discard the event if it failed, as it did not incur an Instance state change. Checked before decoding the event
+    if decoder_helpers.has_error_code(event['CloudTrailEvent']):
         raise InvalidEvent()
 
-    return cloudtrail_event
+    if decoder is None:
+        return decoder_helpers.loads(event['CloudTrailEvent'])
+
+    return decoder.decode(event['EventName'], event['CloudTrailEvent'])
+
+
+def compact_event(event: dict, decoder: decoder_helpers.PayloadDecoder = None) -> dict:
+    """
+    Decodes the payload of a CloudTrail event and returns a lighter copy of the event without the raw JSON string.
+    Raises a InvalidEvent exception if there's an error associated to the event.
+
+    :param event: event to compact
+    :param decoder: decoder used to keep only the fields of the payload that will be used
+
+    :return: compacted CloudTrail event, from which extract_event_payload returns the compacted payload
+    """
+
+    payload = extract_event_payload(event, decoder)
+
+    # Payloads of events read from trail log files are decoded, but their fields haven't been extracted yet
+    if decoder is not None and _COMPACT_PAYLOAD_KEY in event:
+        payload = decoder.extract(event['EventName'], payload)
+
+    return {
+        **{field: event[field] for field in _COMPACT_EVENT_FIELDS if field in event},
+        _COMPACT_PAYLOAD_KEY: payload
+    }
+
+
+def chronological(events: [dict]):
+    """
+    Returns an iterator over a list of events in ascending order by event time, without copying it. CloudTrail returns
+    the most recent events first, so lists in that order are traversed backwards.
+
+    :param events: list of events sorted by event time, either in ascending or descending order
+
+    :return: iterator over the events in ascending order by event time
+    """
+
+    if len(events) > 1 and events[0]['EventTime'] > events[-1]['EventTime']:
+        return reversed(events)
+
+    return iter(events)
+
+
+def merge_events(*streams):
+    """
+    Lazily merges streams of events sorted in ascending order by event time into a single sorted stream. Events that
+    are present in more than one stream are returned only once.
+
+    :param streams: iterables of events sorted in ascending order by event time
+
+    :return: generator of events sorted in ascending order by event time
+    """
+
+    current_time = None
+    seen_ids = set()
+
+    for event in heapq.merge(*streams, key=lambda e: e['EventTime']):
+        # Duplicated events share the same event time, so only the ids of the current instant need to be remembered
+        if event['EventTime'] != current_time:
+            current_time = event['EventTime']
+            seen_ids.clear()
+
+        if event['EventId'] in seen_ids:
+            continue
+
+        seen_ids.add(event['EventId'])
+
+        yield event
 
 
 def build_events_search_expression(events: [str]) -> str:
@@ -44,69 +260,155 @@ def build_events_search_expression(events: [str]) -> str:
     return 'Events[?{}][]'.format(' || '.join(events))
 
 
-def fetch_events_by_resource_type(resource_type: str, region: str, search_exp: str = 'Events[]', credentials=None,
-                                  **kwargs) -> [dict]:
+def iter_events(attribute_key: str, attribute_value: str, region: str, search_exp: str = 'Events[]',
+                credentials: dict = None, account_id: str = None, **kwargs):
     """
-    Convenience method that uses boto3 to fetch CloudTrail events of a given resource type
+    Convenience method that uses boto3 to lazily fetch CloudTrail events matching a lookup attribute. Pages are
+    requested as the events are consumed, so only one page is held in memory at a time.
 
-    :param credentials: credentials to perform the operation
-    :param resource_type: resource type of which to fetch the events
+    :param attribute_key: lookup attribute used to filter events, e.g. ResourceType or EventName
+    :param attribute_value: value of the lookup attribute
     :param region: region in which to operate
     :param search_exp: expression used to filter the results
+    :param credentials: credentials to perform the operation
+    :param account_id: account in which to operate, used to share the rate limit of the account and region
     :param kwargs: additional keyword arguments, used in the API call
 
-    :return: list of CloudTrail events
+    :return: generator of CloudTrail events, in the order returned by CloudTrail (most recent first)
     """
 
     if credentials is None:
         credentials = {}
 
-    client = boto3.client('cloudtrail', region_name=region, **credentials)
+    client = client_helpers.get_client('cloudtrail', region, credentials)
+    _limit_rate(client, get_rate_limiter(account_id, region))
+
     paginator = client.get_paginator('lookup_events')
 
     kwargs.update({
         'LookupAttributes': [
             {
-                'AttributeKey': 'ResourceType',
-                'AttributeValue': resource_type
+                'AttributeKey': attribute_key,
+                'AttributeValue': attribute_value
             }
         ]
     })
 
     page_iterator = paginator.paginate(**kwargs)
 
-    return list(page_iterator.search(search_exp))
+    return page_iterator.search(search_exp)
 
 
-def fetch_events_by_event_name(event_name: str, region: str, search_exp: str = 'Events[]', credentials: dict = None,
-                               **kwargs) -> [dict]:
+def fetch_events(attribute_key: str, attribute_value: str, region: str, search_exp: str = 'Events[]',
+                 credentials: dict = None, account_id: str = None, **kwargs) -> [dict]:
     """
-    Convenience method that uses boto3 to fetch CloudTrail events with a given name
+    Convenience method that uses boto3 to fetch CloudTrail events matching a lookup attribute
 
-    :param credentials: credentials to perform the operation
-    :param event_name: name of the event to fetch
+    :param attribute_key: lookup attribute used to filter events, e.g. ResourceType or EventName
+    :param attribute_value: value of the lookup attribute
     :param region: region in which to operate
     :param search_exp: expression used to filter the results
+    :param credentials: credentials to perform the operation
+    :param account_id: account in which to operate, used to share the rate limit of the account and region
     :param kwargs: additional keyword arguments, used in the API call
 
     :return: list of CloudTrail events
     """
 
-    if credentials is None:
-        credentials = {}
+    return list(iter_events(attribute_key, attribute_value, region, search_exp, credentials, account_id, **kwargs))
 
-    client = boto3.client('cloudtrail', region_name=region, **credentials)
-    paginator = client.get_paginator('lookup_events')
 
-    kwargs.update({
-        'LookupAttributes': [
+def split_time_range(start_time: datetime, end_time: datetime, shards: int) -> [(datetime, datetime)]:
+    """
+    Splits a time range into consecutive sub-ranges of the same duration
+
+    :param start_time: beginning of the time range
+    :param end_time: end of the time range
+    :param shards: number of sub-ranges
+
+    :return: list of (start time, end time) tuples, from the oldest to the most recent sub-range
+    """
+
+    step = (end_time - start_time) / max(1, shards)
+
+    bounds = [start_time + step * i for i in range(max(1, shards))] + [end_time]
+
+    return [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1)]
+
+
+def fetch_events_sharded(attribute_key: str, attribute_value: str, region: str, search_exp: str = 'Events[]',
+                         credentials: dict = None, account_id: str = None, shards: int = 1, **kwargs) -> [dict]:
+    """
+    Convenience method that uses boto3 to fetch CloudTrail events matching a lookup attribute, splitting the time
+    range between StartTime and EndTime into shards that are paginated at the same time. Requests still share the rate
+    limit of the account and region.
+
+    :param attribute_key: lookup attribute used to filter events, e.g. ResourceType or EventName
+    :param attribute_value: value of the lookup attribute
+    :param region: region in which to operate
+    :param search_exp: expression used to filter the results
+    :param credentials: credentials to perform the operation
+    :param account_id: account in which to operate, used to share the rate limit of the account and region
+    :param shards: number of sub-ranges in which to split the time range
+    :param kwargs: additional keyword arguments, used in the API call. Must contain StartTime and EndTime
+
+    :return: list of CloudTrail events, in the order returned by CloudTrail (most recent first)
+    """
+
+    if shards <= 1:
+        return fetch_events(attribute_key, attribute_value, region, search_exp, credentials, account_id, **kwargs)
+
+    time_ranges = split_time_range(kwargs.pop('StartTime'), kwargs.pop('EndTime'), shards)
+
+    def fetch_shard(time_range: (datetime, datetime)) -> [dict]:
+        return fetch_events(attribute_key, attribute_value, region, search_exp, credentials, account_id,
+                            StartTime=time_range[0], EndTime=time_range[1], **kwargs)
+
+    with ThreadPoolExecutor(max_workers=shards) as executor:
+        results = list(executor.map(fetch_shard, time_ranges))
+
+    # Stitch the shards together from the most recent one. Events that occurred at the boundary between two shards
+    # may be returned by both of them
+    events = []
+    seen_ids = set()
+
+    for shard_events in reversed(results):
+        for event in shard_events:
+            if event['EventId'] not in seen_ids:
+                seen_ids.add(event['EventId'])
+                events.append(event)
+
+    return events
+
+
+def has_events(attribute_key: str, attribute_value: str, region: str, credentials: dict = None, account_id: str = None,
+               **kwargs) -> bool:
+    """
+    Convenience method that uses boto3 to check whether there's at least one CloudTrail event matching a lookup
+    attribute, using a single request
+
+    :param attribute_key: lookup attribute used to filter events, e.g. ResourceType or EventName
+    :param attribute_value: value of the lookup attribute
+    :param region: region in which to operate
+    :param credentials: credentials to perform the operation
+    :param account_id: account in which to operate, used to share the rate limit of the account and region
+    :param kwargs: additional keyword arguments, used in the API call
+
+    :return: True if there's at least one event, False otherwise
+    """
+
+    client = client_helpers.get_client('cloudtrail', region, credentials)
+    _limit_rate(client, get_rate_limiter(account_id, region))
+
+    response = client.lookup_events(
+        LookupAttributes=[
             {
-                'AttributeKey': 'EventName',
-                'AttributeValue': event_name
+                'AttributeKey': attribute_key,
+                'AttributeValue': attribute_value
             }
-        ]
-    })
-
-    page_iterator = paginator.paginate(**kwargs)
+        ],
+        MaxResults=1,
+        **kwargs
+    )
 
-    return list(page_iterator.search(search_exp))
+    return len(response['Events']) != 0
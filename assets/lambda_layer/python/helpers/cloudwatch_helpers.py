@@ -1,12 +1,33 @@
-import boto3
+import random
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import quote
+from botocore.exceptions import ClientError
+from . import client_helpers
+
+# Limits of every PutMetricData request
+MAX_METRIC_DATA_PER_REQUEST = 1000
+MAX_REQUEST_BYTES = 1000000
+
+# Limit of every GetMetricData request
+MAX_QUERIES_PER_REQUEST = 500
+
+# Bytes of a request besides its metric data: the action, the version and the namespace
+_REQUEST_OVERHEAD_BYTES = 1024
+
+_MAX_ATTEMPTS = 5
+_RETRYABLE_ERROR_CODES = ('Throttling', 'ThrottlingException', 'InternalServiceError', 'InternalFailure',
+                          'ServiceUnavailable')
 
 
 def put_metric_data(namespace: str, data: [dict]) -> dict:
-    client = boto3.client('cloudwatch')
+    client = client_helpers.get_client('cloudwatch')
     return client.put_metric_data(Namespace=namespace, MetricData=data)
 
 
-def get_metric_data(start_time, end_time, queries) -> dict:
+def get_metric_data(start_time, end_time, queries, next_token: str = None) -> dict:
     params = {
         'MetricDataQueries': queries,
         'StartTime': start_time,
@@ -14,5 +35,146 @@ def get_metric_data(start_time, end_time, queries) -> dict:
         'ScanBy': 'TimestampDescending'
     }
 
-    client = boto3.client('cloudwatch')
+    if next_token is not None:
+        params['NextToken'] = next_token
+
+    client = client_helpers.get_client('cloudwatch')
     return client.get_metric_data(**params)
+
+
+def get_metric_data_in_batches(start_time, end_time, queries: [dict], max_workers: int) -> [dict]:
+    """
+    Gets the results of any number of metric data queries, split into batches that fit in a GetMetricData request.
+    Batches are requested at the same time by a pool of threads, and the pages of results of every batch one after
+    the other.
+
+    :param start_time: start of the time window to get metrics
+    :param end_time: end of the time window to get metrics
+    :param queries: list of metric data queries
+    :param max_workers: maximum number of batches requested at the same time
+
+    :return: list of metric data results. The data points of a query can be split across several pages, each of
+    them with a result with the id of the query
+    """
+
+    def get(batch: [dict]) -> [dict]:
+        results = []
+        next_token = None
+
+        while True:
+            response = get_metric_data(start_time, end_time, batch, next_token)
+            results += response['MetricDataResults']
+            next_token = response.get('NextToken')
+
+            if next_token is None:
+                return results
+
+    batches = [queries[i:i + MAX_QUERIES_PER_REQUEST] for i in range(0, len(queries), MAX_QUERIES_PER_REQUEST)]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return [result for results in executor.map(get, batches) for result in results]
+
+
+def _flatten(value, prefix: str):
+    # Serializes a value as the parameters of a query request, e.g. Dimensions.member.1.Name=accountId
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from _flatten(item, f'{prefix}.{key}')
+    elif isinstance(value, (list, tuple)):
+        for i, item in enumerate(value):
+            yield from _flatten(item, f'{prefix}.member.{i + 1}')
+    elif isinstance(value, datetime):
+        yield prefix, value.isoformat()
+    else:
+        yield prefix, str(value)
+
+
+def encoded_size(datum: dict) -> int:
+    """
+    Calculates the bytes taken by a metric datum in a PutMetricData request, encoded as the parameters of a query
+    request, which is larger than its JSON encoding. Its position is assumed to take 4 digits.
+
+    :param datum: metric datum
+
+    :return: size in bytes
+    """
+
+    return sum(len(quote(key, safe='.')) + len(quote(value, safe='')) + 2
+               for key, value in _flatten(datum, 'MetricData.member.1000'))
+
+
+def split_metric_data(data: [dict], max_count: int = MAX_METRIC_DATA_PER_REQUEST,
+                      max_bytes: int = MAX_REQUEST_BYTES) -> [[dict]]:
+    """
+    Splits metric data into batches that don't exceed the number of data nor the size of a PutMetricData request
+
+    :param data: list of metric data
+    :param max_count: maximum number of metric data of a batch
+    :param max_bytes: maximum size in bytes of a request
+
+    :return: list of batches, which are lists of metric data in the same order
+    """
+
+    batches = []
+    batch = []
+    size = _REQUEST_OVERHEAD_BYTES
+
+    for datum in data:
+        datum_size = encoded_size(datum)
+
+        if batch and (len(batch) == max_count or size + datum_size > max_bytes):
+            batches.append(batch)
+            batch = []
+            size = _REQUEST_OVERHEAD_BYTES
+
+        batch.append(datum)
+        size += datum_size
+
+    if batch:
+        batches.append(batch)
+
+    return batches
+
+
+def _put_batch(namespace: str, batch: [dict]) -> dict:
+    """
+    Sends a batch of metric data, retrying with exponential backoff if the request is throttled or fails due to a
+    server error
+
+    :return: dictionary with the number of metric data, the attempts made and the seconds taken by the last one
+    """
+
+    for attempt in range(1, _MAX_ATTEMPTS + 1):
+        start = time.perf_counter()
+
+        try:
+            put_metric_data(namespace, batch)
+            return {'metrics': len(batch), 'attempts': attempt, 'latency': round(time.perf_counter() - start, 3)}
+        except ClientError as e:
+            if attempt == _MAX_ATTEMPTS or e.response['Error'].get('Code') not in _RETRYABLE_ERROR_CODES:
+                raise
+
+        time.sleep(random.uniform(0, 0.1 * 2 ** attempt))
+
+
+def put_metric_data_in_batches(namespace: str, data: [dict], max_workers: int) -> [dict]:
+    """
+    Publishes any number of metric data, split into batches that fit in a PutMetricData request and sent at the same
+    time by a pool of threads. Requests that are throttled or fail due to a server error are retried.
+
+    :param namespace: namespace of the metrics
+    :param data: list of metric data
+    :param max_workers: maximum number of requests sent at the same time
+
+    :return: list with the number of metric data, the attempts made and the latency of the request of every batch, or
+    the error of the batches that couldn't be sent
+    """
+
+    def put(batch: [dict]) -> dict:
+        try:
+            return _put_batch(namespace, batch)
+        except Exception as e:
+            return {'metrics': len(batch), 'error': e}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(put, split_metric_data(data)))
@@ -0,0 +1,134 @@
+#!/usr/bin/python
+# License: Apache 2.0
+# Summary: module with helper methods to decode the payloads of CloudTrail events, extracting only the used fields
+
+import json
+import re
+
+# Use the fastest JSON library installed to decode whole documents, falling back to the standard one
+try:
+    import orjson as _fast_json
+    BACKEND = 'orjson'
+except ImportError:
+    try:
+        import ujson as _fast_json
+        BACKEND = 'ujson'
+    except ImportError:
+        _fast_json = None
+        BACKEND = 'json'
+
+# CloudTrail writes this key at the top level of the payloads of failed events. Inside strings, quotes are escaped, so
+# they can't produce it
+_ERROR_CODE_KEY = '"errorCode"'
+
+_decoder = json.JSONDecoder()
+
+# Separators between the members of a JSON object, and between their keys and values
+_MEMBER_SEPARATOR_PATTERN = re.compile(r'[\s,]*')
+_KEY_SEPARATOR_PATTERN = re.compile(r'\s*:\s*')
+
+
+def loads(raw: str) -> dict:
+    """
+    Decodes a whole JSON document with the fastest JSON library installed
+
+    :param raw: JSON document
+
+    :return: decoded document
+    """
+
+    return _fast_json.loads(raw) if _fast_json is not None else json.loads(raw)
+
+
+def has_error_code(raw: str) -> bool:
+    """
+    Determines whether the raw payload of an event belongs to a failed event. The payload is only decoded if it
+    contains the key, to discard the rare payloads that contain it in a nested object.
+
+    :param raw: JSON string with the payload of an event
+
+    :return: True if the event failed, False otherwise
+    """
+
+    return _ERROR_CODE_KEY in raw and 'errorCode' in loads(raw)
+
+
+def decode_fields(raw: str, fields: tuple) -> dict:
+    """
+    Decodes only some top-level fields of a JSON payload. The members of the top-level object are walked one by one,
+    so that keys with the same names in nested objects or inside strings are ignored, and the walk stops once all the
+    fields are found, skipping the rest of the payload. Only the values of the fields are kept.
+
+    :param raw: JSON string with the payload of an event, whose top-level value is an object
+    :param fields: names of the top-level fields to decode
+
+    :return: dictionary containing the fields found in the payload
+    """
+
+    decoded = {}
+    position = _MEMBER_SEPARATOR_PATTERN.match(raw, raw.index('{') + 1).end()
+
+    while len(decoded) < len(fields) and raw[position] != '}':
+        key, position = _decoder.raw_decode(raw, position)
+        value, position = _decoder.raw_decode(raw, _KEY_SEPARATOR_PATTERN.match(raw, position).end())
+
+        if key in fields:
+            decoded[key] = value
+
+        position = _MEMBER_SEPARATOR_PATTERN.match(raw, position).end()
+
+    return decoded
+
+
+class PayloadDecoder:
+    """
+    Decodes the payloads of CloudTrail events using an extractor per event name. An extractor specifies the top-level
+    fields that have to be decoded, and a function that receives them and returns a payload with the same structure,
+    but only with the fields that will be used. Extracting an already extracted payload returns the same payload.
+    """
+
+    def __init__(self, extractors: dict[str: tuple] = None):
+        """
+        :param extractors: dictionary containing tuples of (top-level fields, extract function) by event name
+        """
+
+        self.extractors = {} if extractors is None else extractors
+
+    def __or__(self, other):
+        return PayloadDecoder({**self.extractors, **other.extractors})
+
+    def decode(self, event_name: str, raw: str) -> dict:
+        """
+        Decodes the payload of an event, extracting only the fields that will be used
+
+        :param event_name: name of the event to which the payload belongs
+        :param raw: JSON string with the payload of the event
+
+        :return: extracted payload. Payloads of events without extractor are fully decoded
+        """
+
+        if event_name not in self.extractors:
+            return loads(raw)
+
+        fields, extract = self.extractors[event_name]
+
+        # Faster libraries decode whole payloads faster than the standard library decodes the used fields
+        if _fast_json is not None:
+            return extract(loads(raw))
+
+        return extract(decode_fields(raw, fields))
+
+    def extract(self, event_name: str, payload: dict) -> dict:
+        """
+        Extracts the fields that will be used from an already decoded payload
+
+        :param event_name: name of the event to which the payload belongs
+        :param payload: decoded payload of the event
+
+        :return: extracted payload
+        """
+
+        if event_name not in self.extractors:
+            return payload
+
+        return self.extractors[event_name][1](payload)
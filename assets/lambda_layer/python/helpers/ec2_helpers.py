@@ -1,4 +1,4 @@
-import boto3
+from . import client_helpers
 
 
 def describe_regions(account_id, credentials=None) -> [str]:
@@ -7,7 +7,7 @@ def describe_regions(account_id, credentials=None) -> [str]:
     if credentials is None:
         credentials = {}
 
-    client = boto3.client('ec2', **credentials)
+    client = client_helpers.get_client('ec2', credentials=credentials)
     response = client.describe_regions(AllRegions=False)['Regions']
 
     return [region['RegionName'] for region in response]
@@ -0,0 +1,101 @@
+#!/usr/bin/python
+# License: Apache 2.0
+# Summary: module with the settings given as environment variables, with their defaults and accepted values
+
+import os
+
+
+class InvalidSetting(ValueError):
+    pass
+
+
+def _integer(minimum: int):
+    def parse(value: str) -> int:
+        try:
+            number = int(value)
+        except ValueError:
+            number = None
+
+        if number is None or number < minimum:
+            raise ValueError(f'expected an integer greater than or equal to {minimum}')
+
+        return number
+
+    return parse
+
+
+def _boolean(value: str) -> bool:
+    if value.lower() not in ('true', 'false'):
+        raise ValueError("expected 'true' or 'false'")
+
+    return value.lower() == 'true'
+
+
+def _choice(*choices: str):
+    def parse(value: str) -> str:
+        if value.lower() not in choices:
+            raise ValueError('expected one of {}'.format(', '.join(f"'{choice}'" for choice in choices)))
+
+        return value.lower()
+
+    return parse
+
+
+# Default value and parser of every setting. Values of the environment variables are parsed as the default values
+SETTINGS = {
+    'STREAM_EVENTS': ('false', _boolean),
+    'FETCH_WORKERS': ('16', _integer(1)),
+    'MAX_POOL_CONNECTIONS': ('10', _integer(1)),
+    'PRUNE_IDLE_REGIONS': ('true', _boolean),
+    'FETCH_PLANNING': ('all', _choice('all', 'dependencies')),
+    'FETCH_STRATEGY': ('resource_type', _choice('resource_type', 'event_source', 'trail_logs')),
+    'MAX_LOOKUP_SHARDS': ('4', _integer(0)),
+    'FETCH_ENGINE': ('threads', _choice('threads', 'asyncio')),
+    'ASYNC_PAGINATIONS_PER_REGION': ('2', _integer(1)),
+    'ASYNC_MAX_CONNECTIONS': ('256', _integer(1)),
+    'PIPELINE_EVENTS': ('false', _boolean),
+    'PIPELINE_CAPACITY': ('8', _integer(1)),
+    'PIPELINE_WORKERS': ('2', _integer(1)),
+    'SCORE_PROCESSES': ('1', _integer(1)),
+    'SCORE_PROCESS_TIMEOUT': ('600', _integer(1)),
+    'PUBLISH_WORKERS': ('4', _integer(1))
+}
+
+
+def get(name: str):
+    """
+    Reads a setting from its environment variable, or returns its default value if the variable isn't set or empty
+
+    :param name: name of the setting, one of SETTINGS
+
+    :return: value of the setting, parsed according to its type
+
+    :raises InvalidSetting: if the value of the environment variable isn't accepted
+    """
+
+    default, parse = SETTINGS[name]
+    value = os.environ.get(name) or default
+
+    try:
+        return parse(value)
+    except ValueError as e:
+        raise InvalidSetting(f'Invalid value of {name}: {value!r}, {e}') from None
+
+
+def validate() -> None:
+    """
+    Reads all the settings, so that invalid values are reported at once before they are used
+
+    :raises InvalidSetting: if the value of any environment variable isn't accepted, telling all the invalid ones
+    """
+
+    errors = []
+
+    for name in SETTINGS:
+        try:
+            get(name)
+        except InvalidSetting as e:
+            errors.append(str(e))
+
+    if errors:
+        raise InvalidSetting('. '.join(errors))
@@ -1,12 +1,12 @@
-import boto3
+from . import client_helpers
 
 
 def describe_organization() -> dict:
-    client = boto3.client('organizations')
+    client = client_helpers.get_client('organizations')
     return client.describe_organization()['Organization']
 
 
 def list_organization_accounts() -> [dict]:
-    client = boto3.client('organizations')
+    client = client_helpers.get_client('organizations')
     paginator = client.get_paginator('list_accounts')
     return list(paginator.paginate().search('Accounts[]'))
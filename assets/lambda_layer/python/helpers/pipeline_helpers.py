@@ -0,0 +1,144 @@
+#!/usr/bin/python
+# License: Apache 2.0
+# Summary: module with a producer/consumer pipeline that overlaps fetching items with processing them
+
+import time
+
+from itertools import islice
+from queue import Queue
+from threading import Thread, Lock
+
+# Marks the end of the items put in a queue
+_END = object()
+
+
+class StageCounters:
+    """
+    Counters of a stage of a pipeline. A producer that spends long blocked on a full queue is faster than its
+    consumers, while consumers that spend long waiting on an empty queue are faster than their producer.
+    """
+
+    def __init__(self):
+        self.items = 0
+        self.busy_time = 0.0
+        self.blocked_time = 0.0
+        self._lock = Lock()
+
+    def add(self, items: int, busy_time: float, blocked_time: float) -> None:
+        with self._lock:
+            self.items += items
+            self.busy_time += busy_time
+            self.blocked_time += blocked_time
+
+    def stats(self) -> dict:
+        return {
+            'items': self.items,
+            'busyTime': round(self.busy_time, 2),
+            'blockedTime': round(self.blocked_time, 2),
+            'throughput': round(self.items / self.busy_time, 2) if self.busy_time else None
+        }
+
+
+class PipelineCounters:
+    """
+    Counters of both stages of one or more pipelines, e.g. the ones run to fetch the resources of an account
+    """
+
+    def __init__(self):
+        self.producer = StageCounters()
+        self.consumer = StageCounters()
+
+    def merge(self, other) -> None:
+        """
+        Adds the counters of another pipeline to these ones
+
+        :param other: PipelineCounters object to add
+        """
+
+        for stage, other_stage in ((self.producer, other.producer), (self.consumer, other.consumer)):
+            stage.add(other_stage.items, other_stage.busy_time, other_stage.blocked_time)
+
+
+def _batched(items, size: int):
+    items = iter(items)
+
+    while batch := list(islice(items, size)):
+        yield batch
+
+
+def run(items, process, capacity: int, workers: int, batch_size: int = 50) -> (list, PipelineCounters):
+    """
+    Consumes an iterable in the calling thread, e.g. one that performs requests as it's iterated, while a pool of
+    workers processes the items already consumed. Items are passed in batches through a bounded queue, so that
+    consuming the iterable blocks when the workers fall behind and the memory used stays flat.
+
+    :param items: iterable of items to process
+    :param process: function that receives a batch of items and returns the list of its processed items
+    :param capacity: maximum number of batches waiting to be processed
+    :param workers: number of threads that process batches
+    :param batch_size: number of items in every batch
+
+    :return: tuple with the list of processed items, in the same order as the items they were processed from, and the
+    counters of both stages of the pipeline
+    """
+
+    queue = Queue(maxsize=capacity)
+    counters = PipelineCounters()
+    results = {}
+    errors = []
+
+    def work() -> None:
+        while True:
+            start = time.perf_counter()
+            task = queue.get()
+            blocked_time = time.perf_counter() - start
+
+            if task is _END:
+                counters.consumer.add(0, 0.0, blocked_time)
+                return
+
+            index, batch = task
+            start = time.perf_counter()
+
+            try:
+                results[index] = process(batch)
+            except Exception as e:
+                errors.append(e)
+                results[index] = []
+
+            counters.consumer.add(len(batch), time.perf_counter() - start, blocked_time)
+
+    threads = [Thread(target=work) for _ in range(max(1, workers))]
+
+    for thread in threads:
+        thread.start()
+
+    try:
+        batches = _batched(items, batch_size)
+        index = 0
+
+        while True:
+            start = time.perf_counter()
+            batch = next(batches, None)
+            busy_time = time.perf_counter() - start
+
+            if batch is None:
+                break
+
+            start = time.perf_counter()
+            queue.put((index, batch))
+            counters.producer.add(len(batch), busy_time, time.perf_counter() - start)
+
+            index += 1
+    finally:
+        # Let the workers finish even if consuming the iterable failed
+        for _ in threads:
+            queue.put(_END)
+
+        for thread in threads:
+            thread.join()
+
+    if errors:
+        raise errors[0]
+
+    return [item for i in range(len(results)) for item in results[i]], counters
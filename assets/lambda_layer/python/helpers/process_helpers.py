@@ -0,0 +1,120 @@
+#!/usr/bin/python
+# License: Apache 2.0
+# Summary: module with helper methods to run CPU-bound work in child processes
+
+import multiprocessing
+import sys
+import threading
+import time
+import traceback
+
+
+class WorkerProcessError(Exception):
+    """
+    Raised when a function called in a child process raises an exception, or when the process dies without results
+    """
+
+
+def _run(func, items: list, connection) -> None:
+    try:
+        connection.send((True, [func(item) for item in items]))
+    except BaseException:
+        connection.send((False, traceback.format_exc()))
+    finally:
+        connection.close()
+
+
+def can_fork() -> bool:
+    """
+    Determines if child processes can be forked safely. A forked process only has the thread that forked it, so a lock
+    held by any other thread at that moment, e.g. the lock of sys.stdout, would never be released in the child.
+
+    The helpers that start threads, i.e. the thread pools, the scheduler, the pipelines and the asyncio engine, join
+    them before returning, so only the main thread is alive once the resources of the accounts have been fetched. Other
+    threads are only alive if one was left running, e.g. by a stream of events that wasn't consumed to the end.
+
+    :return: True if the calling thread is the only one alive, False otherwise
+    """
+
+    return threading.active_count() == 1
+
+
+def map_in_processes(func, items: list, processes: int, timeout: float = None) -> list:
+    """
+    Calls a function with every item in a set of child processes, and returns the results in the order of the items.
+
+    Lambda doesn't provide /dev/shm, which multiprocessing.Pool and ProcessPoolExecutor need for their semaphores, so
+    every child process is started with multiprocessing.Process and sends back its results through a pipe. Processes
+    are forked, so the function and the items are inherited from the parent process instead of serialized, and only
+    the results are serialized.
+
+    If other threads are alive, forking isn't safe and the function is called in this process instead (see can_fork).
+
+    :param func: function to call with every item, whose results must be picklable
+    :param items: items for which to call the function, distributed among the processes in round-robin
+    :param processes: maximum number of child processes
+    :param timeout: seconds to wait for the results of all the processes. If not specified, there's no limit
+
+    :return: list with the result of calling the function with every item
+    """
+
+    if not items:
+        return []
+
+    if not can_fork():
+        return [func(item) for item in items]
+
+    # Buffered output would be written again by every child process
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+    context = multiprocessing.get_context('fork')
+    processes = max(1, min(processes, len(items)))
+    deadline = None if timeout is None else time.monotonic() + timeout
+    children = []
+
+    for i in range(processes):
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(target=_run, args=(func, items[i::processes], sender), daemon=True)
+        process.start()
+
+        # Only the child process writes to the pipe, so that reading from it fails if the child dies
+        sender.close()
+        children.append((process, receiver))
+
+    results = [None] * len(items)
+    errors = []
+
+    try:
+        # Results are received before joining the processes, which otherwise could block writing big results to the
+        # pipes
+        for i, (process, receiver) in enumerate(children):
+            if deadline is not None and not receiver.poll(max(0.0, deadline - time.monotonic())):
+                raise WorkerProcessError(f'The processes did not send their results within {timeout} seconds')
+
+            try:
+                succeeded, value = receiver.recv()
+            except EOFError:
+                process.join()
+                succeeded, value = False, f'The process exited with code {process.exitcode} without results'
+
+            if succeeded:
+                results[i::processes] = value
+            else:
+                errors.append(value)
+    except BaseException:
+        # Processes that didn't send their results in time are stuck
+        for process, _ in children:
+            if process.is_alive():
+                process.terminate()
+
+        raise
+    finally:
+        for process, receiver in children:
+            receiver.close()
+            process.join()
+
+    if errors:
+        raise WorkerProcessError(errors[0])
+
+    return results
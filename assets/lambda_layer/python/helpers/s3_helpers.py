@@ -1,4 +1,4 @@
-import boto3
+from . import client_helpers
 
 
 def upload_file_contents(bucket: str, key: str, contents: str) -> dict:
@@ -12,7 +12,7 @@ def upload_file_contents(bucket: str, key: str, contents: str) -> dict:
     :return: operation response
     """
 
-    client = boto3.client('s3')
+    client = client_helpers.get_client('s3')
     return client.put_object(Bucket=bucket, Key=key, Body=contents.encode('utf-8'))
 
 
@@ -26,7 +26,54 @@ def retrieve_file_contents(bucket: str, key: str) -> str:
     :return: string with all the contents of the file
     """
 
-    client = boto3.client('s3')
+    client = client_helpers.get_client('s3')
     response = client.get_object(Bucket=bucket, Key=key)
 
     return response['Body'].read().decode('utf-8')
+
+
+def upload_file_bytes(bucket: str, key: str, contents: bytes) -> dict:
+    """
+    Uploads a file to S3 with the binary contents received as an argument
+
+    :param bucket: S3 bucket to upload the file to
+    :param key: full path in the bucket where to upload the file
+    :param contents: bytes of the file to upload
+
+    :return: operation response
+    """
+
+    client = client_helpers.get_client('s3')
+    return client.put_object(Bucket=bucket, Key=key, Body=contents)
+
+
+def retrieve_file_bytes(bucket: str, key: str) -> bytes:
+    """
+    Gets a file from S3 and reads all its contents without decoding them
+
+    :param bucket: S3 bucket to get the file from
+    :param key: full path in the bucket of the file to download
+
+    :return: bytes of the file
+    """
+
+    client = client_helpers.get_client('s3')
+    response = client.get_object(Bucket=bucket, Key=key)
+
+    return response['Body'].read()
+
+
+def prefix_exists(bucket: str, prefix: str) -> bool:
+    """
+    Determines if there's any file in a bucket whose key starts with a prefix
+
+    :param bucket: S3 bucket in which to look for files
+    :param prefix: prefix of the keys to look for
+
+    :return: True if there's any file with the prefix, False otherwise
+    """
+
+    client = client_helpers.get_client('s3')
+    response = client.list_objects_v2(Bucket=bucket, Prefix=prefix, MaxKeys=1)
+
+    return response['KeyCount'] > 0
@@ -1,21 +1,128 @@
-import boto3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from threading import Lock
+from . import client_helpers
 
 
 def get_caller_identity() -> dict:
-    client = boto3.client('sts')
+    client = client_helpers.get_client('sts')
     return client.get_caller_identity()
 
 
-def assume_role(role_arn: str) -> dict:
-    client = boto3.client('sts')
+def _assume_role(role_arn: str, region: str = None) -> (dict, datetime):
+    client = client_helpers.get_client('sts', region)
 
     response = client.assume_role(
         RoleArn=role_arn,
         RoleSessionName="RoleAssume"
     )
 
-    return {
+    credentials = {
         'aws_access_key_id': response["Credentials"]["AccessKeyId"],
         'aws_secret_access_key': response["Credentials"]["SecretAccessKey"],
         'aws_session_token': response["Credentials"]["SessionToken"],
     }
+
+    return credentials, response["Credentials"]["Expiration"]
+
+
+def assume_role(role_arn: str, region: str = None) -> dict:
+    return _assume_role(role_arn, region)[0]
+
+
+class CredentialsCache:
+    """
+    Cache of temporary credentials obtained by assuming roles. Credentials are reused across invocations of a warm
+    Lambda container, and they are refreshed when they're requested and about to expire. Every role is assumed by a
+    single thread at a time, so that threads requesting the same credentials wait for them instead of assuming the role
+    again.
+    """
+
+    def __init__(self, refresh_margin: int = 900, regions: [str] = None):
+        """
+        :param refresh_margin: seconds before the expiration of some credentials in which they are refreshed. Returned
+        credentials are always valid for at least this amount of time
+        :param regions: regions whose STS endpoints are used to assume roles. If not specified, the default one is used
+        """
+
+        self.refresh_margin = timedelta(seconds=refresh_margin)
+        self.regions = regions if regions else [None]
+
+        self._entries: dict[str: tuple] = {}
+        self._role_locks: dict[str: Lock] = {}
+        self._lock = Lock()
+
+    def _get_role_lock(self, role_arn: str) -> Lock:
+        with self._lock:
+            return self._role_locks.setdefault(role_arn, Lock())
+
+    def _is_valid(self, role_arn: str) -> bool:
+        return role_arn in self._entries and \
+            self._entries[role_arn][1] - self.refresh_margin > datetime.now(tz=timezone.utc)
+
+    def _refresh(self, role_arn: str, region: str = None) -> dict:
+        return self._store(role_arn, *_assume_role(role_arn, region))
+
+    def _store(self, role_arn: str, credentials: dict, expiration: datetime) -> dict:
+        previous = self._entries.get(role_arn)
+        self._entries[role_arn] = (credentials, expiration)
+
+        # Clients created with the previous credentials won't be requested anymore
+        if previous is not None:
+            client_helpers.evict(previous[0])
+
+        return credentials
+
+    def get(self, role_arn: str, region: str = None) -> dict:
+        """
+        Returns credentials to perform requests with a role, assuming it if there are no cached credentials or they
+        expire within the refresh margin
+
+        :param role_arn: ARN of the role to assume
+        :param region: region whose STS endpoint is used to assume the role
+
+        :return: dictionary with credentials to perform requests
+        """
+
+        with self._get_role_lock(role_arn):
+            if self._is_valid(role_arn):
+                return self._entries[role_arn][0]
+
+            return self._refresh(role_arn, region)
+
+    async def get_async(self, role_arn: str, assume_role) -> dict:
+        """
+        Same as get, for coroutines that assume roles without blocking the event loop. Coroutines run in a single
+        thread, so the role locks are not taken: every account is fetched by a single coroutine, which is the only one
+        assuming its role
+
+        :param role_arn: ARN of the role to assume
+        :param assume_role: coroutine function that assumes a role, returning its credentials and their expiration time
+
+        :return: dictionary with credentials to perform requests
+        """
+
+        if self._is_valid(role_arn):
+            return self._entries[role_arn][0]
+
+        return self._store(role_arn, *(await assume_role(role_arn)))
+
+    def prefetch(self, role_arns: [str], max_workers: int = 10) -> None:
+        """
+        Assumes in parallel the roles of which there are no valid cached credentials, spreading the requests across
+        the STS endpoints of the cache's regions. Errors are ignored, since they are raised again when calling get.
+
+        :param role_arns: ARNs of the roles to assume
+        :param max_workers: maximum number of roles assumed at the same time
+        """
+
+        role_arns = [role_arn for role_arn in role_arns if not self._is_valid(role_arn)]
+
+        def assume(i: int) -> None:
+            try:
+                self.get(role_arns[i], self.regions[i % len(self.regions)])
+            except Exception as e:
+                print(f'Could not assume role {role_arns[i]}: {e}')
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(assume, range(len(role_arns))))
@@ -0,0 +1,186 @@
+#!/usr/bin/python
+# License: Apache 2.0
+# Summary: module with helper methods to read the log files that a CloudTrail trail delivers to S3
+
+import gzip
+import os
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from . import client_helpers, decoder_helpers
+
+_DEFAULT_MAX_WORKERS = 8
+
+# Resource types of the events, as returned by LookupEvents
+_RESOURCE_TYPE_INSTANCE = 'AWS::EC2::Instance'
+_RESOURCE_TYPE_LT = 'AWS::EC2::LaunchTemplate'
+_RESOURCE_TYPE_ASG = 'AWS::AutoScaling::AutoScalingGroup'
+_RESOURCE_TYPE_SP = 'AWS::AutoScaling::ScalingPolicy'
+
+
+class S3TrailSource:
+    """
+    Log files stored in the S3 bucket of a trail
+    """
+
+    def __init__(self, bucket: str):
+        self.bucket = bucket
+
+    def list_objects(self, prefix: str) -> [str]:
+        client = client_helpers.get_client('s3')
+        paginator = client.get_paginator('list_objects_v2')
+
+        return [key for key in paginator.paginate(Bucket=self.bucket, Prefix=prefix).search('Contents[].Key') if key]
+
+    def open_object(self, key: str):
+        client = client_helpers.get_client('s3')
+
+        return client.get_object(Bucket=self.bucket, Key=key)['Body']
+
+
+class LocalTrailSource:
+    """
+    Log files stored in a local directory laid out like the S3 bucket of a trail
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def list_objects(self, prefix: str) -> [str]:
+        keys = []
+
+        for root, _, files in os.walk(os.path.join(self.directory, prefix)):
+            for file in files:
+                keys.append(os.path.relpath(os.path.join(root, file), self.directory).replace(os.sep, '/'))
+
+        return keys
+
+    def open_object(self, key: str):
+        return open(os.path.join(self.directory, key), 'rb')
+
+
+def build_day_prefix(account_id: str, region: str, day: datetime, prefix: str = '', org_id: str = None) -> str:
+    """
+    Builds the key prefix under which a trail delivers the log files of an account, region and day
+
+    :param account_id: account to which the log files belong
+    :param region: region to which the log files belong
+    :param day: day to which the log files belong
+    :param prefix: key prefix configured in the trail
+    :param org_id: id of the organization, if the trail is an organization trail
+
+    :return: key prefix
+    """
+
+    parts = [prefix.strip('/'), 'AWSLogs', org_id, account_id, 'CloudTrail', region, day.strftime('%Y/%m/%d')]
+
+    return '/'.join([part for part in parts if part]) + '/'
+
+
+def _build_resources(record: dict) -> [dict]:
+    """
+    Builds the list of resources that LookupEvents returns along with an event, as trail logs don't include it. Only
+    the resources read when building resources are included.
+    """
+
+    request = record.get('requestParameters') or {}
+    response = record.get('responseElements') or {}
+
+    if record['eventSource'] == 'autoscaling.amazonaws.com':
+        if 'policyName' in request:
+            return [{'ResourceType': _RESOURCE_TYPE_SP, 'ResourceName': request['policyName']}]
+
+        return [{'ResourceType': _RESOURCE_TYPE_ASG, 'ResourceName': request.get('autoScalingGroupName')}]
+
+    # Launch Template events reference the LT by name first and by id second
+    for response_name in ('CreateLaunchTemplateResponse', 'ModifyLaunchTemplateResponse'):
+        if response_name in response:
+            lt = response[response_name]['launchTemplate']
+            return [{'ResourceType': _RESOURCE_TYPE_LT, 'ResourceName': lt['launchTemplateName']},
+                    {'ResourceType': _RESOURCE_TYPE_LT, 'ResourceName': lt['launchTemplateId']}]
+
+    if 'CreateLaunchTemplateVersionResponse' in response:
+        lt = response['CreateLaunchTemplateVersionResponse']['launchTemplateVersion']
+        return [{'ResourceType': _RESOURCE_TYPE_LT, 'ResourceName': lt['launchTemplateName']},
+                {'ResourceType': _RESOURCE_TYPE_LT, 'ResourceName': lt['launchTemplateId']}]
+
+    if 'instancesSet' in response:
+        return [{'ResourceType': _RESOURCE_TYPE_INSTANCE, 'ResourceName': item['instanceId']}
+                for item in response['instancesSet'].get('items', [])]
+
+    return []
+
+
+def to_lookup_event(record: dict) -> dict:
+    """
+    Converts a record of a trail log file into an event like the ones returned by LookupEvents, with the record
+    already decoded as its payload
+
+    :param record: record of a trail log file
+
+    :return: CloudTrail event, from which cloudtrail_helpers.extract_event_payload returns the record
+    """
+
+    return {
+        'EventId': record['eventID'],
+        'EventName': record['eventName'],
+        'EventTime': datetime.strptime(record['eventTime'], '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=timezone.utc),
+        'Resources': _build_resources(record),
+        'Payload': record
+    }
+
+
+def _read_log_file(source, key: str, event_names: set, start_time: datetime, end_time: datetime) -> [dict]:
+    with source.open_object(key) as body:
+        records = decoder_helpers.loads(gzip.GzipFile(fileobj=body).read())['Records']
+
+    events = []
+
+    for record in records:
+        # Discard failed events, as they did not incur any change
+        if record['eventName'] not in event_names or 'errorCode' in record:
+            continue
+
+        event = to_lookup_event(record)
+
+        if start_time <= event['EventTime'] <= end_time:
+            events.append(event)
+
+    return events
+
+
+def fetch_events(source, account_id: str, region: str, event_names: set, start_time: datetime, end_time: datetime,
+                 prefix: str = '', org_id: str = None, max_workers: int = _DEFAULT_MAX_WORKERS) -> [dict]:
+    """
+    Reads in parallel the log files delivered by a trail for an account and region between two points in time, and
+    returns their records with the given event names
+
+    :param source: source of the log files, either S3TrailSource or LocalTrailSource
+    :param account_id: account of which to read the log files
+    :param region: region of which to read the log files
+    :param event_names: names of the events to return
+    :param start_time: point in time from which to return events
+    :param end_time: point in time until which to return events
+    :param prefix: key prefix configured in the trail
+    :param org_id: id of the organization, if the trail is an organization trail
+    :param max_workers: maximum number of log files read at the same time
+
+    :return: list of CloudTrail events sorted in ascending order by event time
+    """
+
+    keys = []
+    day = start_time.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    # Log files are delivered a few minutes after their events occurred, look in the following day as well
+    while day <= end_time + timedelta(days=1):
+        keys += [key for key in source.list_objects(build_day_prefix(account_id, region, day, prefix, org_id))
+                 if key.endswith('.json.gz')]
+        day += timedelta(days=1)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(lambda key: _read_log_file(source, key, event_names, start_time, end_time), keys)
+
+        events = {event['EventId']: event for file_events in results for event in file_events}
+
+    # Records may be delivered more than once, so they are deduplicated by their id
+    return sorted(events.values(), key=lambda e: e['EventTime'])
@@ -1,5 +1,7 @@
 from .instance_manager import InstanceManager
 from .asg_manager import ASGManager
 from .launch_template_manager import LaunchTemplateManager
+from .event_source_manager import EventSourceManager
+from .trail_log_manager import TrailLogManager
 from . import account_manager
 from . import org_manager
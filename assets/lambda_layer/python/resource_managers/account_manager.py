@@ -1,25 +1,141 @@
-import uuid
+import asyncio
 
-from threading import Thread
+from datetime import datetime, timedelta, timezone
+from threading import Lock
 from botocore.exceptions import ClientError
 from .libs_finder import *
 from .instance_manager import InstanceManager
 from .launch_template_manager import LaunchTemplateManager
 from .asg_manager import ASGManager
+from .event_source_manager import EventSourceManager
+from .trail_log_manager import TrailLogManager
+from .scheduler import WorkStealingScheduler, TaskError
 
 _ORG_NOT_USED_EXCEPTION = 'AWSOrganizationsNotInUseException'
 _ROUND_DECIMALS = 2
+_METRIC_READ_WORKERS = 4
+
+# Strategies to fetch CloudTrail events: one lookup per resource type, one lookup per event source, or reading the
+# log files of the organization trail
+FETCH_STRATEGY_RESOURCE_TYPE = 'resource_type'
+FETCH_STRATEGY_EVENT_SOURCE = 'event_source'
+FETCH_STRATEGY_TRAIL_LOGS = 'trail_logs'
 
 accounts = {}
 
+# Credentials of the member accounts, reused across invocations. Roles can be assumed using the STS endpoints of
+# several regions, specified as a comma-separated list
+credentials_cache = sts_helpers.CredentialsCache(regions=[
+    region for region in os.environ.get('STS_REGIONS', '').split(',') if region
+])
+
+
+# Regions in which resources were found for every account, used to skip idle regions
+region_index = RegionActivityIndex(os.environ.get('BUCKET'))
+
+
+def _get_role_arn(account_id: str) -> str:
+    return 'arn:aws:iam::{}:role/{}'.format(account_id, os.environ['ORGS_IAM_ROLE'])
+
+
+class RegionPlanner:
+    """
+    Decides in which regions of an account resources are fetched: the ones where resources were found recently, and
+    the idle ones that had write events since they were last checked, which are probed first. Shared by both fetch
+    engines, which perform the probes and fetch the resources.
+    """
+
+    def __init__(self, account_id: str, started_at: datetime):
+        """
+        :param account_id: account whose regions are planned. Its region activity is read from S3
+        :param started_at: point in time at which fetching the resources of the account started
+        """
+
+        self.account_id = account_id
+        self.started_at = started_at
+        self.activity = None
+        self.full_scan = False
+
+        if env_helpers.get('PRUNE_IDLE_REGIONS'):
+            self.activity = region_index.get(account_id) or RegionActivity()
+
+            # Periodically scan all the regions in case resources appeared in a region without being detected
+            self.full_scan = self.activity.last_full_scan is None or \
+                self.activity.last_full_scan < started_at - timedelta(REGION_FULL_SCAN_DAYS)
+
+    def needs_probe(self, region: str) -> bool:
+        """
+        :return: True if the region is idle and must be probed before fetching its resources, False if its resources
+        are fetched right away
+        """
+
+        if self.activity is None or self.full_scan:
+            return False
 
-class AccountResourcesFetcher(Thread):
-    _ROLE_ARN_FORMAT = 'arn:aws:iam::{}:role/{}'
+        return not self.activity.is_active(region, self.started_at - timedelta(MAX_CT_RELATIVE_DAYS_SEARCH))
+
+    def get_probe_start_time(self, region: str) -> datetime:
+        """
+        :return: point in time from which write events are looked up when probing an idle region
+        """
+
+        last_checked = self.activity.last_checked(region)
+
+        if last_checked is None:
+            return self.started_at - timedelta(MAX_CT_RELATIVE_DAYS_SEARCH)
+
+        return last_checked - timedelta(minutes=MAX_CT_EVENT_DELIVERY_MINUTES)
+
+    def update(self, regions: [str], active_regions: set) -> None:
+        """
+        Records which regions had resources and stores the region activity of the account in S3
+
+        :param regions: regions enabled in the account
+        :param active_regions: regions in which resources were found
+        """
+
+        if self.activity is None:
+            return
+
+        for region in regions:
+            self.activity.update(region, self.started_at, region in active_regions)
+
+        if self.full_scan:
+            self.activity.last_full_scan = self.started_at
+
+        region_index.put(self.account_id, self.activity)
+
+
+class AccountResourcesFetcher:
+    """
+    Splits fetching the resources of an account into tasks, one per region and resource manager, and puts their
+    results back together once all of them have finished
+    """
 
-    def __init__(self, account: Account, tw: TimeWindow):
-        super().__init__(name=account.id)
+    _MANAGERS = (InstanceManager, LaunchTemplateManager, ASGManager)
+
+    def __init__(self, account: Account, tw: TimeWindow, scheduler: WorkStealingScheduler):
+        self.name = account.id
         self.tw = tw
         self.account = account
+        self.scheduler = scheduler
+        self.failed = False
+
+        self._credentials = None
+        self._regions = []
+        self._fetched_regions = set()
+        self._planner = None
+        self._started_at = None
+        self._stream = False
+        self._plan_dependencies = False
+        self._strategy = FETCH_STRATEGY_RESOURCE_TYPE
+        self._lookups_before = 0
+        self._results = {}
+        self._remaining = 0
+        self._lock = Lock()
+
+        # Counters of the pipelines of all the managers of the account, if events are pipelined
+        self._pipeline_counters = pipeline_helpers.PipelineCounters()
 
     def _get_credentials(self) -> dict:
         """
@@ -28,33 +144,177 @@ class AccountResourcesFetcher(Thread):
         :return: dictionary with credentials to perform requests in the account
         """
 
-        role_name = os.environ['ORGS_IAM_ROLE']
+        return None if self.account.is_main else credentials_cache.get(_get_role_arn(self.account.id))
 
-        return None if self.account.is_main else sts_helpers.assume_role(self._ROLE_ARN_FORMAT.format(self.account.id,
-                                                                                                      role_name))
+    def _submit(self, key: tuple, func, *args) -> None:
+        with self._lock:
+            self._remaining += 1
 
-    def run(self):
-        # Get temporary credentials to access AWS resources
-        credentials = self._get_credentials()
+        self.scheduler.submit((self.account.id, *key), self._run_task, func, args)
 
-        # Get the list of enabled regions in the account
-        regions = ec2_helpers.describe_regions(self.account.id, credentials)
+    def _run_task(self, func, args) -> None:
+        succeeded = False
 
-        print(f'({self.name}) fetching resources...')
+        try:
+            func(*args)
+            succeeded = True
+        finally:
+            with self._lock:
+                self.failed = self.failed or not succeeded
+                self._remaining -= 1
+                last = self._remaining == 0 and not self.failed
+
+            # The last task of the account puts the results together
+            if last:
+                self._set_resources()
 
+    def _set_resources(self) -> None:
         instances = {}
         lt = {}
         asg = {}
 
-        # Fetch resources in all regions
-        for region in regions:
-            instances.update(InstanceManager(self.tw, region, credentials).fetch_resources())
-            lt.update(LaunchTemplateManager(self.tw, region, credentials).fetch_resources())
-            asg.update(ASGManager(self.tw, region, credentials).fetch_resources())
+        # Merge the results following the order of the regions, as resources were merged before splitting the work
+        for region in [region for region in self._regions if region in self._fetched_regions]:
+            instances.update(self._results[(region, InstanceManager)])
+            lt.update(self._results[(region, LaunchTemplateManager)])
+            asg.update(self._results[(region, ASGManager)])
 
         self.account.set_resources(instances, lt, asg)
+        self._update_region_activity()
+
+        print('({}) done fetching in {} of {} regions with the {} strategy: {} LookupEvents requests in {}s.'.format(
+            self.name, len(self._fetched_regions), len(self._regions), self._strategy,
+            self._count_lookups() - self._lookups_before,
+            round((datetime.now(tz=date_helpers.get_timezone()) - self._started_at).total_seconds(), 2)
+        ))
+
+        # Report which stage of the pipelines was the bottleneck, if events were pipelined
+        if self._pipeline_counters.producer.items:
+            print(f'({self.name}) events fetched: {self._pipeline_counters.producer.stats()}, '
+                  f'events decoded: {self._pipeline_counters.consumer.stats()}')
+
+    def _count_lookups(self) -> int:
+        stats = cloudtrail_helpers.get_rate_limiters_stats()
+
+        return sum([s['requests'] for key, s in stats.items() if key.startswith(f'{self.account.id}/')])
+
+    def _update_region_activity(self) -> None:
+        active_regions = {
+            region for region in self._regions
+            if any([self._results.get((region, manager_class)) for manager_class in self._MANAGERS])
+        }
+
+        self._planner.update(self._regions, active_regions)
+
+    def _fetch_region_resources(self, manager_class, region: str, resource_names: set = None) -> None:
+        manager = manager_class(self.tw, region, self._credentials, self.account.id, self._stream, resource_names)
+        resources = manager.fetch_resources()
+        self._pipeline_counters.merge(manager.pipeline_counters)
+
+        with self._lock:
+            self._results[(region, manager_class)] = resources
+
+        if self._plan_dependencies:
+            self._schedule_dependencies(manager_class, region, resources)
+
+    def _schedule_dependencies(self, manager_class, region: str, resources: dict) -> None:
+        """
+        Schedules fetching only the resources referenced by the ones just fetched: the ASGs that launched the
+        instances, and the LTs used by those instances and ASGs
+        """
+
+        if manager_class == InstanceManager:
+            asg_names = {instance.asg_name for instance in resources.values() if instance.asg_name is not None}
+
+            self._submit((region, ASGManager.__name__), self._fetch_region_resources, ASGManager, region, asg_names)
+        elif manager_class == ASGManager:
+            instances = self._results[(region, InstanceManager)]
+
+            lt_ids = {instance.lt.id for instance in instances.values() if instance.lt is not None} | \
+                {asg.lt.id for asg in resources.values() if asg.lt is not None}
+
+            self._submit((region, LaunchTemplateManager.__name__), self._fetch_region_resources,
+                         LaunchTemplateManager, region, lt_ids)
+
+    def _fetch_source_resources(self, manager: EventSourceManager, region: str) -> None:
+        resources = manager.fetch_resources()
+        self._pipeline_counters.merge(manager.pipeline_counters)
+
+        with self._lock:
+            for manager_class, manager_resources in resources.items():
+                self._results[(region, manager_class)] = manager_resources
+
+    def _schedule_region(self, region: str) -> None:
+        with self._lock:
+            self._fetched_regions.add(region)
+
+        if self._strategy == FETCH_STRATEGY_EVENT_SOURCE:
+            for event_source in EventSourceManager.MANAGERS_BY_SOURCE:
+                manager = EventSourceManager(event_source, self.tw, region, self._credentials, self.account.id,
+                                             self._stream)
+
+                self._submit((region, event_source), self._fetch_source_resources, manager, region)
+
+            return
+
+        if self._strategy == FETCH_STRATEGY_TRAIL_LOGS:
+            manager = TrailLogManager(self.tw, region, self._credentials, self.account.id, self._stream)
+            self._submit((region, FETCH_STRATEGY_TRAIL_LOGS), self._fetch_source_resources, manager, region)
+
+            return
+
+        # When planning by dependencies, the rest of the managers are scheduled once the instances have been fetched
+        for manager_class in (InstanceManager,) if self._plan_dependencies else self._MANAGERS:
+            self._submit((region, manager_class.__name__), self._fetch_region_resources, manager_class, region)
+
+    def _probe_region(self, region: str) -> None:
+        """
+        Checks whether there have been write events in a region since it was last checked, and schedules fetching its
+        resources if so
+        """
+
+        if cloudtrail_helpers.has_events(cloudtrail_helpers.LOOKUP_ATTRIBUTE_READ_ONLY, 'false', region,
+                                         self._credentials, self.account.id,
+                                         StartTime=self._planner.get_probe_start_time(region),
+                                         EndTime=self._started_at):
+            self._schedule_region(region)
+
+    def _plan(self) -> None:
+        # Get temporary credentials to access AWS resources
+        self._credentials = self._get_credentials()
+
+        # Get the list of enabled regions in the account
+        self._regions = ec2_helpers.describe_regions(self.account.id, self._credentials)
+
+        print(f'({self.name}) fetching resources...')
 
-        print(f'({self.name}) done fetching.')
+        # Stream events instead of caching them to bound the memory used by accounts with a long history
+        self._stream = env_helpers.get('STREAM_EVENTS')
+
+        # Only fetch the ASGs and LTs referenced by instances. Disabled by default, as unused ASGs are then ignored
+        # when calculating the instance diversification score
+        self._plan_dependencies = env_helpers.get('FETCH_PLANNING') == 'dependencies'
+
+        # Both strategies can be selected to compare the number of requests and time they take in every account
+        self._strategy = env_helpers.get('FETCH_STRATEGY')
+        self._lookups_before = self._count_lookups()
+        self._started_at = datetime.now(tz=date_helpers.get_timezone())
+        self._planner = RegionPlanner(self.account.id, self._started_at)
+
+        for region in self._regions:
+            # Fetch resources in regions where resources were found recently, and probe the idle ones
+            if self._planner.needs_probe(region):
+                self._submit((region, 'probe'), self._probe_region, region)
+            else:
+                self._schedule_region(region)
+
+    def schedule(self) -> None:
+        """
+        Schedules the task that gets the account credentials and enabled regions, which in turn schedules the tasks
+        that fetch resources from every region
+        """
+
+        self._submit((), self._plan)
 
 
 def _fetch_accounts():
@@ -79,32 +339,187 @@ def _fetch_accounts():
     accounts = {data['Id']: Account(data) for data in account_data}
 
 
-def fetch_resources(tw: TimeWindow):
-    threads = []
+async def _fetch_region_resources_async(account: Account, region: str, tw: TimeWindow, credentials: dict,
+                                       engine: aio_helpers.AsyncFetchEngine, planner: RegionPlanner) -> dict:
+    # Idle regions are only fetched if they had write events since they were last checked, like the threaded engine
+    if planner.needs_probe(region) and not await engine.has_events(
+            cloudtrail_helpers.LOOKUP_ATTRIBUTE_READ_ONLY, 'false', region, planner.get_probe_start_time(region),
+            planner.started_at, credentials, account.id):
+        return None
+
+    managers = [
+        EventSourceManager(event_source, tw, region, credentials, account.id)
+        for event_source in EventSourceManager.MANAGERS_BY_SOURCE
+    ]
+
+    # Requests are made concurrently, but building resources uses the CPU and is done in a separate thread
+    await asyncio.gather(*[manager.fetch_events_async(engine) for manager in managers])
+
+    resources = {}
+
+    for manager in managers:
+        resources.update(await asyncio.to_thread(manager.fetch_resources))
+
+    return resources
+
+
+async def _fetch_account_resources_async(account: Account, tw: TimeWindow,
+                                         engine: aio_helpers.AsyncFetchEngine) -> None:
+    print(f'({account.id}) fetching resources...')
+
+    # Credentials are cached across invocations, like with the threaded engine
+    credentials = None if account.is_main else \
+        await credentials_cache.get_async(_get_role_arn(account.id), engine.assume_role)
+
+    regions = await engine.describe_regions(credentials)
+
+    # Reading and storing the region activity are S3 requests made with boto3, so they're made in a separate thread
+    planner = await asyncio.to_thread(RegionPlanner, account.id, datetime.now(tz=date_helpers.get_timezone()))
+
+    results = await asyncio.gather(*[
+        _fetch_region_resources_async(account, region, tw, credentials, engine, planner) for region in regions
+    ])
+
+    instances = {}
+    lt = {}
+    asg = {}
+
+    # Merge the results following the order of the regions, skipping the idle ones
+    for resources in [resources for resources in results if resources is not None]:
+        instances.update(resources[InstanceManager])
+        lt.update(resources[LaunchTemplateManager])
+        asg.update(resources[ASGManager])
+
+    account.set_resources(instances, lt, asg)
+
+    active_regions = {
+        region for region, resources in zip(regions, results) if resources is not None and any(resources.values())
+    }
+
+    await asyncio.to_thread(planner.update, regions, active_regions)
+
+    fetched = len([resources for resources in results if resources is not None])
+    print(f'({account.id}) done fetching in {fetched} of {len(regions)} regions.')
+
+
+async def _fetch_resources_async(tw: TimeWindow) -> [TaskError]:
+    engine = aio_helpers.AsyncFetchEngine(
+        env_helpers.get('ASYNC_PAGINATIONS_PER_REGION'),
+        os.environ.get('AWS_ENDPOINT_URL'),
+        env_helpers.get('ASYNC_MAX_CONNECTIONS')
+    )
+
+    try:
+        results = await asyncio.gather(*[
+            _fetch_account_resources_async(account, tw, engine) for account in accounts.values()
+        ], return_exceptions=True)
+    finally:
+        await engine.close()
+
+    return [
+        TaskError((account_id,), result) for account_id, result in zip(accounts, results)
+        if isinstance(result, Exception)
+    ]
+
+
+def _fetch_resources_threads(tw: TimeWindow) -> [TaskError]:
+    # Assume the roles of the member accounts in parallel before starting to fetch resources
+    credentials_cache.prefetch([_get_role_arn(a_id) for a_id, account in accounts.items() if not account.is_main])
+
+    scheduler = WorkStealingScheduler(env_helpers.get('FETCH_WORKERS'))
 
-    # Fetch account resources in parallel
     for _, account in accounts.items():
-        threads.append(AccountResourcesFetcher(account, tw))
-        threads[-1].start()
+        AccountResourcesFetcher(account, tw, scheduler).schedule()
 
-    # Wait until all the threads have executed
-    for thread in threads:
-        thread.join()
+    # Wait until all the tasks have executed
+    return scheduler.run()
 
 
-def _weight_scores(metrics: dict) -> dict:
+def fetch_resources(tw: TimeWindow) -> dict:
     """
-    Weights the score values from different days to return a single value per score in the time range
+    Fetches the resources of all the accounts in the organization in parallel, either with a pool of threads or with
+    an asyncio engine
 
-    :param metrics: metric values per account for a list of days in the format:
+    :param tw: time window in which to fetch resources
 
-    account_id_1:
-        metric_name_1:
-           day_1: value
-           day_2: value
-        metric_name_2:
-           day_1: value
-           day_2: value
+    :return: dictionary containing the errors that prevented fetching the resources of an account, by account id
+    """
+
+    if env_helpers.get('FETCH_ENGINE') == 'asyncio':
+        task_errors = asyncio.run(_fetch_resources_async(tw))
+    else:
+        task_errors = _fetch_resources_threads(tw)
+
+    errors = {}
+
+    for error in task_errors:
+        errors.setdefault(error.key[0], []).append(error)
+
+    # Report how close to the LookupEvents rate limit the requests were made
+    stats = cloudtrail_helpers.get_rate_limiters_stats().values()
+
+    print('CloudTrail LookupEvents requests: {}, throttled: {}, seconds waiting for the rate limiter: {}'.format(
+        sum([s['requests'] for s in stats]),
+        sum([s['throttles'] for s in stats]),
+        round(sum([s['waitTime'] for s in stats]), 2)
+    ))
+
+    return errors
+
+
+class MetricValues:
+    """
+    Daily values of metrics of accounts, preallocated as a list of values per account, metric and day. The metric data
+    queries have ids that tell the position of their account and metric, so that their results are stored directly
+    """
+
+    def __init__(self, account_ids: [str], metric_names: [str], first_day: datetime, days: int):
+        """
+        :param account_ids: ids of the accounts
+        :param metric_names: names of the metrics
+        :param first_day: first day of the values, in UTC like the timestamps of the data points
+        :param days: number of days
+        """
+
+        self.account_ids = account_ids
+        self.metric_names = metric_names
+        self.first_day = first_day.date()
+        self.days = days
+
+        # None where there's no value. Timestamps are kept to keep the most recent value of every day
+        self.values = [[[None] * days for _ in metric_names] for _ in account_ids]
+        self._timestamps = [[[None] * days for _ in metric_names] for _ in account_ids]
+
+    @staticmethod
+    def query_id(account_index: int, metric_index: int) -> str:
+        return f'a{account_index}_m{metric_index}'
+
+    def add(self, query_id: str, timestamps: [datetime], values: [float]) -> None:
+        """
+        Stores the data points of a metric data result, keeping the most recent value of every day
+
+        :param query_id: id of the query, as returned by query_id
+        :param timestamps: timestamps of the data points
+        :param values: values of the data points
+        """
+
+        account_index, metric_index = (int(position[1:]) for position in query_id.split('_'))
+        day_values = self.values[account_index][metric_index]
+        day_timestamps = self._timestamps[account_index][metric_index]
+
+        for timestamp, value in zip(timestamps, values):
+            day = (timestamp.astimezone(timezone.utc).date() - self.first_day).days
+
+            if 0 <= day < self.days and (day_timestamps[day] is None or day_timestamps[day] < timestamp):
+                day_values[day] = value
+                day_timestamps[day] = timestamp
+
+
+def _weight_scores(metrics: MetricValues) -> dict:
+    """
+    Weights the score values from different days to return a single value per score in the time range
+
+    :param metrics: daily metric values of the accounts
 
     :return: dictionary with weighted score values in the format:
 
@@ -116,24 +531,27 @@ def _weight_scores(metrics: dict) -> dict:
         metric_name_2: value
     """
 
-    weighted_scores = {a_id: {} for a_id in metrics}
+    weighted_scores = {}
+    vcpu_h_index = metrics.metric_names.index(CW_METRIC_NAME_VCPU_H)
+
+    for a_id, account_values in zip(metrics.account_ids, metrics.values):
+        vcpu_h = account_values[vcpu_h_index]
 
-    for a_id in metrics:
         # First calculate the total vCPU hours in the time window
-        total_vcpu_h = int(sum([value for day, value in metrics[a_id][CW_METRIC_NAME_VCPU_H].items()]))
+        total_vcpu_h = int(sum([value for value in vcpu_h if value is not None]))
 
         # Calculate the wighted component values adding the products between the daily vCPU hours and component
         # and dividing by the total vCPU hours
         weighted_scores[a_id] = {
             metric_name: round(sum([
-                metrics[a_id][metric_name][day] *
-                metrics[a_id][CW_METRIC_NAME_VCPU_H][day]
+                metric_value * vcpu_h_value
 
                 # Ensure that there are metric values on that day for both the vCPU hours and the metric being calculated
-                for day in metrics[a_id][CW_METRIC_NAME_VCPU_H] if day in metrics[a_id][metric_name]
+                for metric_value, vcpu_h_value in zip(values, vcpu_h)
+                if metric_value is not None and vcpu_h_value is not None
             ]) / total_vcpu_h, _ROUND_DECIMALS) if total_vcpu_h != 0 else 0
 
-            for metric_name in ALL_CW_METRICS - {CW_METRIC_NAME_VCPU_H}
+            for metric_name, values in zip(metrics.metric_names, account_values) if metric_name != CW_METRIC_NAME_VCPU_H
         }
 
         # Add the total vCPU hours to the account metrics
@@ -148,9 +566,18 @@ def _weight_scores(metrics: dict) -> dict:
     return weighted_scores
 
 
+def _to_utc(time) -> datetime:
+    # Times are either epoch seconds or datetime objects
+    if isinstance(time, datetime):
+        return time.astimezone(timezone.utc)
+
+    return datetime.fromtimestamp(time, timezone.utc)
+
+
 def fetch_scores(start_time, end_time, account_ids=None, metric_names=None) -> dict:
     """
-    Retrieves account metrics from CloudWatch and calculates their weighted values in the time frame
+    Retrieves account metrics from CloudWatch and calculates their weighted values in the time frame. Queries are sent
+    in batches of the maximum size accepted by GetMetricData, at the same time, following their pages of results
 
     :param start_time: start of the time window to get metrics
     :param end_time: end of the time window to get metrics
@@ -176,13 +603,15 @@ def fetch_scores(start_time, end_time, account_ids=None, metric_names=None) -> d
         metric_names = ALL_CW_METRICS
     else:
         # Ensure we retrieve the vCPU hours, since it's needed for the weighted calculations
-        metric_names.append(CW_METRIC_NAME_VCPU_H)
-        metric_names = set(metric_names)
+        metric_names = set(metric_names) | {CW_METRIC_NAME_VCPU_H}
+
+    metric_names = sorted(metric_names)
+    first_day = _to_utc(start_time)
+    metrics = MetricValues(account_ids, metric_names, first_day, (_to_utc(end_time).date() - first_day.date()).days + 1)
 
     queries = [
         {
-            'Id': f'a_{str(uuid.uuid4()).replace("-", "_")}',
-            'Label': f'{a_id}_{metric}',
+            'Id': MetricValues.query_id(i, j),
             'MetricStat': {
                 'Metric': {
                     'Namespace': CW_NAMESPACE,
@@ -199,31 +628,11 @@ def fetch_scores(start_time, end_time, account_ids=None, metric_names=None) -> d
             }
         }
 
-        for a_id in account_ids for metric in ALL_CW_METRICS
+        for i, a_id in enumerate(account_ids) for j, metric in enumerate(metric_names)
     ]
 
-    response = cloudwatch_helpers.get_metric_data(start_time, end_time, queries)
-    metrics = {a_id: {name: {} for name in metric_names} for a_id in account_ids}
-
-    # Generate a dictionary with the following format:
-    # account_id_1:
-    #   metric_name_1:
-    #       day_1: value
-    #       day_2: value
-    #   metric_name_2:
-    #       day_1: value
-    #       day_2: value
-
-    for result in response['MetricDataResults']:
-        account_id = result['Label'].split('_')[0]
-        metric_name = result['Label'].split('_')[1]
-
-        # We have requested the most recent data points, so these come sorted by date in ascending mode.
-        # Traverse the results in reverse so that the last dictionary update keeps the most recent metric value
-        for i in range(len(result['Timestamps'])):
-            # Generate a string with the date of the value in the format %Y-%m-%d
-            date_key = date_helpers.datetime_to_str(result['Timestamps'][-i - 1])
-            metrics[account_id][metric_name][date_key] = result['Values'][-i - 1]
+    for result in cloudwatch_helpers.get_metric_data_in_batches(start_time, end_time, queries, _METRIC_READ_WORKERS):
+        metrics.add(result['Id'], result['Timestamps'], result['Values'])
 
     return _weight_scores(metrics)
 
@@ -1,28 +1,39 @@
-from datetime import datetime, timedelta
 from .resource_manager import ResourceManager
 from .libs_finder import *
 
+# Request parameters used to hydrate ASG objects and to find their scaling policies
+_REQUEST_PARAMETERS = ('autoScalingGroupName', 'policyType', 'mixedInstancesPolicy')
+
+
+def _extract_request_parameters(event_payload: dict) -> dict:
+    params = event_payload['requestParameters']
+
+    return {'requestParameters': {name: params[name] for name in _REQUEST_PARAMETERS if name in params}}
+
 
 class ASGManager(ResourceManager):
+    EVENT_NAMES = ALL_ASG_EVENT_NAMES | ALL_SP_EVENT_NAMES
+
+    decoder = decoder_helpers.PayloadDecoder({
+        event_name: (('requestParameters',), _extract_request_parameters) for event_name in EVENT_NAMES
+    })
+
     def _fetch_cloud_trail_events(self) -> [dict]:
-        events = cloudtrail_helpers.fetch_events_by_resource_type(
+        if self.source_events is not None:
+            return self._select_source_events(ALL_ASG_EVENT_NAMES)
+
+        # Events are returned sorted in ascending order by event time
+        return self._fetch_resource_type_events(
             RESOURCE_TYPE_ASG,
-            self.region,
-            cloudtrail_helpers.build_events_search_expression(ALL_ASG_EVENT_NAMES),
-            credentials=self.credentials,
-            StartTime=datetime.now() - timedelta(MAX_CT_RELATIVE_DAYS_SEARCH),
-            EndTime=self.tw.end_time
+            cloudtrail_helpers.build_events_search_expression(ALL_ASG_EVENT_NAMES)
         )
 
-        # Sort all the events in ascending order by event time
-        return sorted(events, key=lambda e: e['EventTime'])
-
     def _extract_resources_data_from_events(self, events: [dict]) -> dict[str: object]:
         resources = {}
 
         for event_data in events:
             try:
-                event_payload = cloudtrail_helpers.extract_event_payload(event_data)
+                event_payload = cloudtrail_helpers.extract_event_payload(event_data, self.decoder)
             except InvalidEvent:
                 continue
 
@@ -36,54 +47,57 @@ class ASGManager(ResourceManager):
         return resources
 
     def _fetch_sp_cloud_trail_events(self) -> [dict]:
-        events = cloudtrail_helpers.fetch_events_by_resource_type(
+        if self.source_events is not None:
+            return self._select_source_events(ALL_SP_EVENT_NAMES)
+
+        # Events are returned sorted in ascending order by event time
+        return self._fetch_events(
+            cloudtrail_helpers.LOOKUP_ATTRIBUTE_RESOURCE_TYPE,
             RESOURCE_TYPE_SP,
-            self.region,
-            cloudtrail_helpers.build_events_search_expression(ALL_SP_EVENT_NAMES),
-            credentials=self.credentials,
-            StartTime=datetime.now() - timedelta(MAX_CT_RELATIVE_DAYS_SEARCH),
-            EndTime=self.tw.end_time
+            cloudtrail_helpers.build_events_search_expression(ALL_SP_EVENT_NAMES)
         )
 
-        # Sort all the events in ascending order by event time
-        return sorted(events, key=lambda e: e['EventTime'])
-
-    def _extract_sp_data_from_events(self, events: [dict]) -> dict[str: str]:
+    def _extract_sp_data_from_events(self, events: [dict]) -> dict[str: list]:
+        # Types of scaling policy set by every event, sorted by event time, by the name of their ASG
         sp = {}
 
         for event_data in events:
             try:
-                event_payload = cloudtrail_helpers.extract_event_payload(event_data)
+                event_payload = cloudtrail_helpers.extract_event_payload(event_data, self.decoder)
             except InvalidEvent:
                 continue
 
             params = event_payload['requestParameters']
 
-            if event_data['EventName'] == EVENT_NAME_DELETE_SP:
-                sp[params['autoScalingGroupName']] = None
-            else:
-                sp[params['autoScalingGroupName']] = params['policyType']
+            policy_type = None if event_data['EventName'] == EVENT_NAME_DELETE_SP else params['policyType']
+            sp.setdefault(params['autoScalingGroupName'], []).append((event_data['EventTime'], policy_type))
 
         return sp
 
     def fetch_resources(self) -> dict[str: object]:
+        # There's nothing to fetch if none of the ASGs are requested
+        if self.resource_names is not None and not self.resource_names:
+            self.resources = {}
+            return self.resources
+
         events = self._fetch_cloud_trail_events()
         asg_data = self._extract_resources_data_from_events(events)
 
-        # Discard ASGs deleted before the time window
+        # Discard ASGs deleted before the time window, and those not requested
         asg_data = {
             name: asg for name, asg in asg_data.items()
-            if asg.deleted_at is None or self.tw.contains(asg.deleted_at)
+            if (asg.deleted_at is None or self.tw.contains(asg.deleted_at)) and self._is_requested(name, asg)
         }
 
         # Fetch scaling policies events
         events = self._fetch_sp_cloud_trail_events()
         sps = self._extract_sp_data_from_events(events)
 
-        # Assign each ASG its scaling policy
-        for asg_name, sp in sps.items():
+        # Assign each ASG its scaling policies, the last one being the current one
+        for asg_name, policies in sps.items():
             if asg_name in asg_data:
-                asg_data[asg_name].scaling_policy = sp
+                for event_time, sp in policies:
+                    asg_data[asg_name].set_scaling_policy(event_time, sp)
 
         self.resources = asg_data
 
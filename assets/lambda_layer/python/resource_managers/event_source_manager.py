@@ -0,0 +1,78 @@
+import functools
+import operator
+
+from .resource_manager import ResourceManager
+from .instance_manager import InstanceManager
+from .launch_template_manager import LaunchTemplateManager
+from .asg_manager import ASGManager
+from .libs_finder import *
+
+
+class EventSourceManager(ResourceManager):
+    """
+    Fetches with a single lookup the events of an event source used by any manager, and hands every manager the
+    events it uses to build its resources
+    """
+
+    MANAGERS_BY_SOURCE = {
+        EVENT_SOURCE_EC2: (InstanceManager, LaunchTemplateManager),
+        EVENT_SOURCE_AUTOSCALING: (ASGManager,)
+    }
+
+    def __init__(self, event_source: str, tw: TimeWindow, region: str, credentials: dict = None,
+                 account_id: str = None, stream: bool = False):
+        """
+        :param event_source: event source to look up, e.g. ec2.amazonaws.com
+        """
+
+        super().__init__(tw, region, credentials, account_id, stream)
+
+        self.event_source = event_source
+        self.managers = [
+            manager_class(tw, region, credentials, account_id, stream) for manager_class in self._get_manager_classes()
+        ]
+
+        self._managers_by_event_name = {name: manager for manager in self.managers for name in manager.EVENT_NAMES}
+
+        # Each event is decoded by the extractor of the manager that will use it
+        self.decoder = functools.reduce(operator.or_, [manager.decoder for manager in self.managers])
+
+    def _get_manager_classes(self) -> tuple:
+        return self.MANAGERS_BY_SOURCE[self.event_source]
+
+    async def fetch_events_async(self, engine: aio_helpers.AsyncFetchEngine) -> None:
+        """
+        Fetches the events of the event source with an asyncio engine, so that fetch_resources doesn't request them
+
+        :param engine: engine used to request the events
+        """
+
+        self.source_events = await self._fetch_events_async(engine, cloudtrail_helpers.LOOKUP_ATTRIBUTE_EVENT_SOURCE,
+                                                            self.event_source, set(self._managers_by_event_name))
+
+    def _fetch_cloud_trail_events(self) -> [dict]:
+        if self.source_events is not None:
+            return self.source_events
+
+        # Events are returned sorted in ascending order by event time
+        return self._fetch_events(
+            cloudtrail_helpers.LOOKUP_ATTRIBUTE_EVENT_SOURCE,
+            self.event_source,
+            cloudtrail_helpers.build_events_search_expression(set(self._managers_by_event_name))
+        )
+
+    def _extract_resources_data_from_events(self, events: [dict]) -> dict[str: object]:
+        resources = {}
+
+        for manager in self.managers:
+            manager.source_events = []
+
+        # Streamed events can only be iterated once, so they're handed to the managers in a single pass
+        for event in events:
+            if event['EventName'] in self._managers_by_event_name:
+                self._managers_by_event_name[event['EventName']].source_events.append(event)
+
+        for manager in self.managers:
+            resources[type(manager)] = manager.fetch_resources()
+
+        return resources
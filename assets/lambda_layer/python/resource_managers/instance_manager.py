@@ -1,38 +1,62 @@
-from datetime import datetime, timedelta
 from .resource_manager import ResourceManager
 from .libs_finder import *
 
+# Fields of the Instances contained in an event that are used to hydrate Instance objects
+_INSTANCE_FIELDS = ('instanceId', 'instanceType', 'architecture', 'instanceLifecycle', 'tagSet', 'previousState',
+                    'currentState')
+
+
+def _extract_instances(event_payload: dict) -> dict:
+    return {
+        'responseElements': {
+            'instancesSet': {
+                'items': [
+                    {field: data[field] for field in _INSTANCE_FIELDS if field in data}
+                    for data in event_payload['responseElements']['instancesSet']['items']
+                ]
+            }
+        }
+    }
+
+
+def _extract_bid_eviction(event_payload: dict) -> dict:
+    return {'serviceEventDetails': {'instanceIdSet': event_payload['serviceEventDetails']['instanceIdSet']}}
+
 
 class InstanceManager(ResourceManager):
+    EVENT_NAMES = ALL_INSTANCE_EVENT_NAMES
+
+    decoder = decoder_helpers.PayloadDecoder({
+        **{
+            event_name: (('responseElements',), _extract_instances)
+            for event_name in ALL_INSTANCE_EVENT_NAMES if event_name != EVENT_NAME_BID_EVICTED
+        },
+        EVENT_NAME_BID_EVICTED: (('serviceEventDetails',), _extract_bid_eviction)
+    })
+
     def _fetch_cloud_trail_events(self) -> [dict]:
+        if self.source_events is not None:
+            return self._select_source_events(ALL_INSTANCE_EVENT_NAMES)
+
         # Lookup EC2 Instance events and keep only Run, Stop, Start and Terminate
-        events = cloudtrail_helpers.fetch_events_by_resource_type(
+        events = self._fetch_events(
+            cloudtrail_helpers.LOOKUP_ATTRIBUTE_RESOURCE_TYPE,
             RESOURCE_TYPE_INSTANCE,
-            self.region,
-            cloudtrail_helpers.build_events_search_expression(ALL_INSTANCE_EVENT_NAMES),
-            credentials=self.credentials,
-            StartTime=datetime.now() - timedelta(MAX_CT_RELATIVE_DAYS_SEARCH),
-            EndTime=self.tw.end_time
+            cloudtrail_helpers.build_events_search_expression(ALL_INSTANCE_EVENT_NAMES)
         )
 
         # Lookup Spot termination events (those are not included in the EC2 Instance resource type based search)
-        events += cloudtrail_helpers.fetch_events_by_event_name(
-            EVENT_NAME_BID_EVICTED,
-            self.region,
-            credentials=self.credentials,
-            StartTime=datetime.now() - timedelta(MAX_CT_RELATIVE_DAYS_SEARCH),
-            EndTime=self.tw.end_time
-        )
+        spot_events = self._fetch_events(cloudtrail_helpers.LOOKUP_ATTRIBUTE_EVENT_NAME, EVENT_NAME_BID_EVICTED)
 
-        # Sort all the events in ascending order by event time
-        return sorted(events, key=lambda e: e['EventTime'])
+        # Both lookups are sorted in ascending order by event time, merge them lazily
+        return cloudtrail_helpers.merge_events(events, spot_events)
 
     def _extract_resources_data_from_events(self, events: [dict]) -> dict[str: object]:
         instances = {}
 
         for event_data in events:
             try:
-                event_payload = cloudtrail_helpers.extract_event_payload(event_data)
+                event_payload = cloudtrail_helpers.extract_event_payload(event_data, self.decoder)
             except InvalidEvent:
                 continue
 
@@ -1,28 +1,58 @@
-from datetime import datetime, timedelta
 from .resource_manager import ResourceManager
 from .libs_finder import *
 
+# Launch Template Versions only need to know whether they use attribute-based instance type selection
+_LT_DATA_FIELDS = ('InstanceRequirements',)
+
+
+def _extract_version(event_payload: dict) -> dict:
+    params = {}
+
+    for request, data in event_payload['requestParameters'].items():
+        if isinstance(data, dict) and 'LaunchTemplateData' in data:
+            data = {'LaunchTemplateData': {field: data['LaunchTemplateData'][field]
+                                           for field in _LT_DATA_FIELDS if field in data['LaunchTemplateData']}}
+
+        params[request] = data
+
+    return {'requestParameters': params, 'responseElements': event_payload['responseElements']}
+
+
+def _extract_modification(event_payload: dict) -> dict:
+    # Modifications only change the default version, which is found in the response
+    return {'responseElements': event_payload['responseElements']}
+
 
 class LaunchTemplateManager(ResourceManager):
+    EVENT_NAMES = ALL_LT_EVENT_NAMES
+
+    decoder = decoder_helpers.PayloadDecoder({
+        EVENT_NAME_CREATE_LT: (('requestParameters', 'responseElements'), _extract_version),
+        EVENT_NAME_CREATE_LT_VERSION: (('requestParameters', 'responseElements'), _extract_version),
+        EVENT_NAME_MODIFY_LT: (('responseElements',), _extract_modification)
+    })
+
     def _fetch_cloud_trail_events(self) -> [dict]:
-        events = cloudtrail_helpers.fetch_events_by_resource_type(
+        if self.source_events is not None:
+            return self._select_source_events(ALL_LT_EVENT_NAMES)
+
+        # Events are returned sorted in ascending order by event time
+        return self._fetch_resource_type_events(
             RESOURCE_TYPE_LT,
-            self.region,
-            cloudtrail_helpers.build_events_search_expression(ALL_LT_EVENT_NAMES),
-            credentials=self.credentials,
-            StartTime=datetime.now() - timedelta(MAX_CT_RELATIVE_DAYS_SEARCH),
-            EndTime=self.tw.end_time
+            cloudtrail_helpers.build_events_search_expression(ALL_LT_EVENT_NAMES)
         )
 
-        # Sort all the events in ascending order by event time
-        return sorted(events, key=lambda e: e['EventTime'])
+    def _is_requested(self, name: str, resource) -> bool:
+        # LTs can be referenced either by their id or name
+        return self.resource_names is None or resource.id in self.resource_names or \
+            resource.name in self.resource_names
 
     def _extract_resources_data_from_events(self, events: [dict]) -> dict[str: object]:
         resources = {}
 
         for event_data in events:
             try:
-                event_payload = cloudtrail_helpers.extract_event_payload(event_data)
+                event_payload = cloudtrail_helpers.extract_event_payload(event_data, self.decoder)
             except InvalidEvent:
                 continue
 
@@ -1,17 +1,344 @@
+import asyncio
+import collections
+import hashlib
+import math
+import re
+
 from abc import ABCMeta, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from .libs_finder import *
 
+# Events already fetched in previous executions, shared by all the managers of the process
+event_cache = EventCache(os.environ.get('BUCKET'))
+
+# Names of the events filtered by a search expression built by cloudtrail_helpers.build_events_search_expression
+_SEARCH_EXP_EVENT_NAME = re.compile(r'EventName == `([^`]+)`')
+
 
 class ResourceManager(metaclass=ABCMeta):
-    def __init__(self, tw: TimeWindow, region: str, credentials: dict = None):
+    # Names of the CloudTrail events used to build the resources of the manager
+    EVENT_NAMES = set()
+
+    # Decoder of the payloads of the events, which extracts only the fields used to build the resources
+    decoder = decoder_helpers.PayloadDecoder()
+
+    def __init__(self, tw: TimeWindow, region: str, credentials: dict = None, account_id: str = None,
+                 stream: bool = False, resource_names: set = None):
+        """
+        :param resource_names: if specified, only the resources with these names or ids are fetched
+        """
+
         if credentials is None:
             credentials = {}
 
         self.credentials = credentials
+        self.account_id = account_id
+        self.stream = stream
+        self.resource_names = resource_names
         self.tw = tw
         self.region = region
         self.resources: dict[str: object] = {}
 
+        # Events already fetched by looking up their event source. If set, managers build their resources from them
+        # instead of making their own lookups
+        self.source_events: [dict] = None
+
+        # Counters of the pipelines that compacted the events of the manager, if PIPELINE_EVENTS is enabled
+        self.pipeline_counters = pipeline_helpers.PipelineCounters()
+
+    def _select_source_events(self, event_names: set) -> [dict]:
+        return [event for event in self.source_events if event['EventName'] in event_names]
+
+    def _build_cache_key(self, attribute_key: str, attribute_value: str, search_exp: str) -> str:
+        # Events are cached already filtered, so the search expression must be part of the key. Expressions built from
+        # sets list the event names in the order in which sets are iterated, which changes with the hash seed of every
+        # process, so the names are sorted to build the same key in every execution
+        event_names = _SEARCH_EXP_EVENT_NAME.findall(search_exp)
+
+        if event_names:
+            search_exp = cloudtrail_helpers.build_events_search_expression(sorted(event_names))
+
+        search_exp_hash = hashlib.sha1(search_exp.encode('utf-8')).hexdigest()[:8]
+
+        return f'{self.account_id}/{self.region}/{attribute_key}/{attribute_value}/{search_exp_hash}'
+
+    def _request_events(self, attribute_key: str, attribute_value: str, search_exp: str, start_time: datetime,
+                        end_time: datetime, shards: int = 1):
+        """
+        Requests to CloudTrail the events matching a lookup attribute between two points in time
+
+        :param attribute_key: lookup attribute used to filter events, e.g. ResourceType or EventName
+        :param attribute_value: value of the lookup attribute
+        :param search_exp: expression used to filter the results
+        :param start_time: point in time from which to fetch events
+        :param end_time: point in time until which to fetch events
+        :param shards: number of time ranges paginated at the same time. With a single one, pages are requested lazily
+
+        :return: iterable of CloudTrail events, sorted by event time in either ascending or descending order
+        """
+
+        if shards <= 1:
+            return cloudtrail_helpers.iter_events(attribute_key, attribute_value, self.region, search_exp,
+                                                  credentials=self.credentials, account_id=self.account_id,
+                                                  StartTime=start_time, EndTime=end_time)
+
+        return cloudtrail_helpers.fetch_events_sharded(attribute_key, attribute_value, self.region, search_exp,
+                                                       credentials=self.credentials, account_id=self.account_id,
+                                                       shards=shards, StartTime=start_time, EndTime=end_time)
+
+    def _stream_events(self, attribute_key: str, attribute_value: str, search_exp: str = 'Events[]'):
+        """
+        Fetches the CloudTrail events matching a lookup attribute as they are consumed. CloudTrail returns the most
+        recent events first, so the time range is split into slices of DAYS_PER_COLD_LOOKUP_SHARD days that are
+        requested from the oldest to the most recent one, as many at the same time as lookup shards. Events are
+        compacted page by page, so that the raw CloudTrail payloads are released with the page they came in, and
+        only the compacted events of the slices being fetched are held in memory. Failed events are discarded.
+
+        :param attribute_key: lookup attribute used to filter events, e.g. ResourceType or EventName
+        :param attribute_value: value of the lookup attribute
+        :param search_exp: expression used to filter the results
+
+        :return: generator of compacted CloudTrail events sorted in ascending order by event time
+        """
+
+        start_time = datetime.now(tz=date_helpers.get_timezone()) - timedelta(MAX_CT_RELATIVE_DAYS_SEARCH)
+        shards = self._count_lookup_shards(None, start_time, start_time, self.tw.end_time)
+
+        days = (self.tw.end_time - start_time).total_seconds() / 86400
+        time_ranges = collections.deque(cloudtrail_helpers.split_time_range(
+            start_time, self.tw.end_time, max(1, math.ceil(days / DAYS_PER_COLD_LOOKUP_SHARD))
+        ))
+
+        def fetch(time_range: (datetime, datetime)) -> [dict]:
+            # Every time range is requested lazily, so that its events are compacted page by page
+            return self._compact_events(self._request_events(attribute_key, attribute_value, search_exp, *time_range))
+
+        def stream():
+            with ThreadPoolExecutor(max_workers=shards) as executor:
+                pending = collections.deque()
+
+                while time_ranges or pending:
+                    # Keep requesting the following slices while the events of the oldest one are consumed
+                    while time_ranges and len(pending) < shards:
+                        pending.append(executor.submit(fetch, time_ranges.popleft()))
+
+                    yield from cloudtrail_helpers.chronological(pending.popleft().result())
+
+        # Events that occurred at the boundary between two slices may be returned by both of them
+        return cloudtrail_helpers.merge_events(stream())
+
+    def _compact_events(self, events) -> [dict]:
+        """
+        Compacts the events of an iterable, discarding the failed ones. If PIPELINE_EVENTS is enabled, the events are
+        compacted by a pool of workers while the iterable keeps requesting pages, instead of after each page arrives.
+
+        :param events: iterable of CloudTrail events
+
+        :return: list of compacted CloudTrail events, in the same order
+        """
+
+        def compact(batch: [dict]) -> [dict]:
+            compacted = []
+
+            for event in batch:
+                try:
+                    compacted.append(cloudtrail_helpers.compact_event(event, self.decoder))
+                except InvalidEvent:
+                    continue
+
+            return compacted
+
+        if not env_helpers.get('PIPELINE_EVENTS'):
+            return compact(events)
+
+        compacted, counters = pipeline_helpers.run(events, compact, env_helpers.get('PIPELINE_CAPACITY'),
+                                                   env_helpers.get('PIPELINE_WORKERS'))
+
+        self.pipeline_counters.merge(counters)
+
+        return compacted
+
+    def _read_events(self, events) -> [dict]:
+        # Without pipelining, events are decoded when building resources
+        if not env_helpers.get('PIPELINE_EVENTS'):
+            return list(events)
+
+        return self._compact_events(events)
+
+    @staticmethod
+    def _count_lookup_shards(entry: CachedEvents, horizon: datetime, start_time: datetime, end_time: datetime) -> int:
+        """
+        Estimates the events that will be fetched between two points in time from the density of the cached events
+        found in previous executions, and splits the lookup in as many shards as needed to fetch
+        EVENTS_PER_LOOKUP_SHARD events each. Lookups without previous executions are split in shards of
+        DAYS_PER_COLD_LOOKUP_SHARD days.
+
+        :param entry: events cached for the lookup attribute, if any
+        :param horizon: oldest point in time covered by the cached events
+        :param start_time: beginning of the time range to fetch
+        :param end_time: end of the time range to fetch
+
+        :return: number of shards
+        """
+
+        max_shards = env_helpers.get('MAX_LOOKUP_SHARDS')
+        covered = 0 if entry is None else (entry.high_water_mark - horizon).total_seconds()
+
+        if max_shards <= 1:
+            return 1
+
+        # Without previous executions the density is unknown, split the lookup by days
+        if covered <= 0:
+            days = (end_time - start_time).total_seconds() / 86400
+
+            return max(1, min(max_shards, math.ceil(days / DAYS_PER_COLD_LOOKUP_SHARD)))
+
+        expected_events = len(entry.events) / covered * (end_time - start_time).total_seconds()
+
+        return max(1, min(max_shards, math.ceil(expected_events / EVENTS_PER_LOOKUP_SHARD)))
+
+    def _fetch_events(self, attribute_key: str, attribute_value: str, search_exp: str = 'Events[]') -> [dict]:
+        """
+        Fetches the CloudTrail events matching a lookup attribute since MAX_CT_RELATIVE_DAYS_SEARCH days ago and until
+        the end of the time window. Events fetched in previous executions are retrieved from the cache, so that
+        only the events that occurred since then are requested to CloudTrail.
+
+        :param attribute_key: lookup attribute used to filter events, e.g. ResourceType or EventName
+        :param attribute_value: value of the lookup attribute
+        :param search_exp: expression used to filter the results
+
+        :return: list of CloudTrail events sorted in ascending order by event time
+        """
+
+        # Streamed events are not cached, as that would keep the whole history in memory
+        if self.stream:
+            return self._stream_events(attribute_key, attribute_value, search_exp)
+
+        now = datetime.now(tz=date_helpers.get_timezone())
+        horizon = now - timedelta(MAX_CT_RELATIVE_DAYS_SEARCH)
+
+        # Without an account id the events can't be identified in the cache, fetch the whole history
+        if self.account_id is None:
+            shards = self._count_lookup_shards(None, horizon, horizon, self.tw.end_time)
+            events = self._read_events(
+                self._request_events(attribute_key, attribute_value, search_exp, horizon, self.tw.end_time, shards)
+            )
+
+            return list(cloudtrail_helpers.chronological(events))
+
+        key = self._build_cache_key(attribute_key, attribute_value, search_exp)
+        entry = event_cache.get(key)
+
+        if entry is None:
+            entry = CachedEvents([], horizon)
+
+        # Only fetch the events that occurred after the high-water mark of the cached ones
+        start_time = max(entry.high_water_mark, horizon)
+
+        if start_time < self.tw.end_time:
+            # Busy lookups are split into time ranges that are paginated at the same time
+            shards = self._count_lookup_shards(entry, horizon, start_time, self.tw.end_time)
+
+            # Events are cached compacted, without their raw payloads
+            new_events = self._compact_events(self._request_events(attribute_key, attribute_value, search_exp,
+                                                                   start_time, self.tw.end_time, shards))
+
+            entry = self._update_cache_entry(key, entry, new_events, now)
+
+        # The cache may contain events past the end of the time window
+        return [event for event in entry.events if horizon <= event['EventTime'] <= self.tw.end_time]
+
+    def _update_cache_entry(self, key: str, entry: CachedEvents, new_events: [dict], now: datetime) -> CachedEvents:
+        """
+        Merges the events fetched since the high-water mark of a cache entry with the cached ones, and caches the result
+
+        :param key: key of the cache entry
+        :param entry: cache entry whose events were fetched up to its high-water mark
+        :param new_events: compacted events fetched since the high-water mark, sorted by event time in any order
+        :param now: point in time at which the events were fetched
+
+        :return: updated cache entry
+        """
+
+        horizon = now - timedelta(MAX_CT_RELATIVE_DAYS_SEARCH)
+
+        # Merge the new events with the cached ones, discarding those that were already cached
+        events = cloudtrail_helpers.merge_events(entry.events, cloudtrail_helpers.chronological(new_events))
+
+        # Events that occurred recently may not have been delivered yet, so the high-water mark can't be set
+        # past the maximum delivery delay
+        high_water_mark = min(self.tw.end_time, now - timedelta(minutes=MAX_CT_EVENT_DELIVERY_MINUTES))
+
+        previous_high_water_mark = entry.high_water_mark
+        entry = CachedEvents(list(events), max(previous_high_water_mark, high_water_mark))
+        entry.evict(horizon)
+
+        # Events past the high-water mark are fetched again by the next execution, so the entry only needs to be
+        # uploaded again when the high-water mark moves
+        event_cache.put(key, entry, persist=entry.high_water_mark > previous_high_water_mark)
+
+        return entry
+
+    async def _fetch_events_async(self, engine: aio_helpers.AsyncFetchEngine, attribute_key: str,
+                                  attribute_value: str, event_names: set) -> [dict]:
+        """
+        Same as _fetch_events, but requesting the events with an asyncio engine. Work that blocks, like reading and
+        writing the cache, runs in a separate thread.
+
+        :param engine: engine used to request the events
+        :param attribute_key: lookup attribute used to filter events, e.g. ResourceType or EventName
+        :param attribute_value: value of the lookup attribute
+        :param event_names: names of the events to return
+
+        :return: list of CloudTrail events sorted in ascending order by event time
+        """
+
+        now = datetime.now(tz=date_helpers.get_timezone())
+        horizon = now - timedelta(MAX_CT_RELATIVE_DAYS_SEARCH)
+
+        # The search expression is not used to filter the events, but it makes the keys the same as with _fetch_events
+        key = self._build_cache_key(attribute_key, attribute_value,
+                                    cloudtrail_helpers.build_events_search_expression(event_names))
+
+        entry = await asyncio.to_thread(event_cache.get, key) if self.account_id is not None else None
+
+        if entry is None:
+            entry = CachedEvents([], horizon)
+
+        start_time = max(entry.high_water_mark, horizon)
+
+        if start_time < self.tw.end_time:
+            new_events = await engine.lookup_events(attribute_key, attribute_value, self.region, event_names,
+                                                    start_time, self.tw.end_time, self.credentials, self.account_id)
+
+            if self.account_id is None:
+                return list(cloudtrail_helpers.chronological(new_events))
+
+            new_events = await asyncio.to_thread(self._compact_events, new_events)
+            entry = await asyncio.to_thread(self._update_cache_entry, key, entry, new_events, now)
+
+        return [event for event in entry.events if horizon <= event['EventTime'] <= self.tw.end_time]
+
+    def _fetch_resource_type_events(self, resource_type: str, search_exp: str = 'Events[]') -> [dict]:
+        """
+        Fetches the CloudTrail events of a resource type. If the manager only fetches some resources and they are
+        few, their events are fetched with one lookup per resource instead.
+
+        :param resource_type: resource type of which to fetch the events
+        :param search_exp: expression used to filter the results
+
+        :return: events sorted in ascending order by event time
+        """
+
+        if self.resource_names is None or len(self.resource_names) > MAX_TARGETED_LOOKUPS:
+            return self._fetch_events(cloudtrail_helpers.LOOKUP_ATTRIBUTE_RESOURCE_TYPE, resource_type, search_exp)
+
+        return cloudtrail_helpers.merge_events(*[
+            self._fetch_events(cloudtrail_helpers.LOOKUP_ATTRIBUTE_RESOURCE_NAME, name, search_exp)
+            for name in sorted(self.resource_names)
+        ])
+
     @abstractmethod
     def _fetch_cloud_trail_events(self) -> [dict]:
         pass
@@ -20,7 +347,18 @@ class ResourceManager(metaclass=ABCMeta):
     def _extract_resources_data_from_events(self, events: [dict]) -> dict[str: object]:
         pass
 
+    def _is_requested(self, name: str, resource) -> bool:
+        return self.resource_names is None or name in self.resource_names
+
     def fetch_resources(self) -> dict[str: object]:
+        # There's nothing to fetch if none of the resources are requested
+        if self.resource_names is not None and not self.resource_names:
+            self.resources = {}
+            return self.resources
+
         events = self._fetch_cloud_trail_events()
-        self.resources = self._extract_resources_data_from_events(events)
+        resources = self._extract_resources_data_from_events(events)
+
+        self.resources = {name: resource for name, resource in resources.items() if self._is_requested(name, resource)}
+
         return self.resources
@@ -0,0 +1,124 @@
+import random
+
+from collections import deque
+from threading import Thread, Condition, local
+
+
+class TaskError:
+    """
+    Class that represents an exception raised by a task, along with the key that identifies the task
+    """
+
+    def __init__(self, key, exception: Exception):
+        self.key = key
+        self.exception = exception
+
+    def __str__(self):
+        return f'{self.key}: {self.exception!r}'
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class WorkStealingScheduler:
+    """
+    Executes tasks in a fixed number of worker threads. Each worker has its own queue of tasks and works on the most
+    recently added one first, so that the tasks spawned by a task are executed by the same worker. Idle workers steal
+    the oldest pending tasks from the queues of the other workers.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = max(1, workers)
+        self.errors: [TaskError] = []
+
+        self._queues = [deque() for _ in range(self.workers)]
+        self._pending = 0
+        self._next_queue = 0
+        self._condition = Condition()
+        self._local = local()
+
+    def submit(self, key, func, *args) -> None:
+        """
+        Schedules a task. Tasks submitted from within another task are added to the queue of the worker executing it.
+
+        :param key: identifier of the task, used to report its exception if it fails
+        :param func: function to execute
+        :param args: arguments to pass to the function
+        """
+
+        with self._condition:
+            self._pending += 1
+
+            index = getattr(self._local, 'index', None)
+
+            # Distribute tasks submitted from outside the workers evenly
+            if index is None:
+                index = self._next_queue
+                self._next_queue = (self._next_queue + 1) % self.workers
+
+            self._queues[index].append((key, func, args))
+            self._condition.notify()
+
+    def _take_task(self, index: int):
+        # Called with the condition held, so that no two workers take the same task. Work on the most recent task of
+        # the worker's own queue first
+        if self._queues[index]:
+            return self._queues[index].pop()
+
+        # Steal the oldest task from another worker's queue, starting by a random one to spread the work
+        offset = random.randrange(self.workers)
+
+        for i in range(self.workers):
+            victim = (offset + i) % self.workers
+
+            if victim != index and self._queues[victim]:
+                return self._queues[victim].popleft()
+
+        return None
+
+    def _work(self, index: int) -> None:
+        self._local.index = index
+
+        while True:
+            with self._condition:
+                task = self._take_task(index)
+
+                while task is None:
+                    # All the tasks have been executed and no more can be spawned
+                    if self._pending == 0:
+                        return
+
+                    # Other workers are still executing tasks that may spawn new ones, which notify an idle worker
+                    self._condition.wait()
+                    task = self._take_task(index)
+
+            key, func, args = task
+
+            try:
+                func(*args)
+            except Exception as e:
+                with self._condition:
+                    self.errors.append(TaskError(key, e))
+            finally:
+                with self._condition:
+                    self._pending -= 1
+
+                    if self._pending == 0:
+                        self._condition.notify_all()
+
+    def run(self) -> [TaskError]:
+        """
+        Executes all the submitted tasks, and the ones spawned by them, and waits until they finish
+
+        :return: list of errors raised by the tasks
+        """
+
+        threads = [Thread(target=self._work, args=(i,), name=f'worker-{i}') for i in range(self.workers)]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        return self.errors
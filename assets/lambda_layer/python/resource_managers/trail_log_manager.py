@@ -0,0 +1,58 @@
+from datetime import datetime
+from .event_source_manager import EventSourceManager
+from .instance_manager import InstanceManager
+from .launch_template_manager import LaunchTemplateManager
+from .asg_manager import ASGManager
+from .libs_finder import *
+
+# Pseudo lookup attribute that identifies the events read from trail log files in the cache
+_LOOKUP_ATTRIBUTE_TRAIL_LOGS = 'TrailLogs'
+
+
+def get_trail_source():
+    """
+    Returns the source of the trail log files: a local directory laid out like a trail bucket if TRAIL_LOCAL_DIR is
+    set, the S3 bucket of the trail otherwise
+    """
+
+    if os.environ.get('TRAIL_LOCAL_DIR'):
+        return trail_log_helpers.LocalTrailSource(os.environ['TRAIL_LOCAL_DIR'])
+
+    return trail_log_helpers.S3TrailSource(os.environ['TRAIL_BUCKET'])
+
+
+class TrailLogManager(EventSourceManager):
+    """
+    Reads the events used by all the managers from the log files that the organization trail delivers to S3, instead
+    of looking them up, and hands every manager the events it uses to build its resources
+    """
+
+    def __init__(self, tw: TimeWindow, region: str, credentials: dict = None, account_id: str = None,
+                 stream: bool = False, source=None):
+        """
+        :param source: source of the log files. If not specified, it's configured with environment variables
+        """
+
+        self.source = get_trail_source() if source is None else source
+        self.prefix = os.environ.get('TRAIL_PREFIX', '')
+        self.org_id = os.environ.get('TRAIL_ORG_ID')
+
+        super().__init__(_LOOKUP_ATTRIBUTE_TRAIL_LOGS, tw, region, credentials, account_id, stream)
+
+    def _get_manager_classes(self) -> tuple:
+        return InstanceManager, LaunchTemplateManager, ASGManager
+
+    def _request_events(self, attribute_key: str, attribute_value: str, search_exp: str, start_time: datetime,
+                        end_time: datetime, shards: int = 1):
+        # Log files are already read in parallel, so the time range is not split
+        return trail_log_helpers.fetch_events(self.source, self.account_id, self.region,
+                                              set(self._managers_by_event_name), start_time, end_time, self.prefix,
+                                              self.org_id)
+
+    def _fetch_cloud_trail_events(self) -> [dict]:
+        # Events are returned sorted in ascending order by event time
+        return self._fetch_events(
+            _LOOKUP_ATTRIBUTE_TRAIL_LOGS,
+            self.prefix or 'AWSLogs',
+            cloudtrail_helpers.build_events_search_expression(set(self._managers_by_event_name))
+        )
@@ -1,4 +1,6 @@
 from .instance import Instance
+from .instance_table import InstanceTable
+from .interval_index import IntervalIndex
 from .launch_template import LaunchTemplate
 from .asg import ASG
 from .account import Account
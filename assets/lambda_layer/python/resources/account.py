@@ -1,5 +1,13 @@
+from .instance_table import InstanceTable
+from .interval_index import IntervalIndex
+from .libs_finder import *
+
+
 class Account:
     def _get_vcpu_h(self):
+        if self.instance_table is not None:
+            return self.instance_table.total_vcpu_h()
+
         vcpu_h = 0
 
         for _, instance in self.instances.items():
@@ -16,8 +24,45 @@ class Account:
         self.instances = {}
         self.lt = {}
         self.asg = {}
+        self.instance_table = None
+        self.interval_index = None
+
+    def at(self, tw: TimeWindow):
+        """
+        Returns the account with its resources as they were during another time window, e.g. a past day, reusing the
+        resources fetched for a time window that contains it
+
+        :param tw: time window in which to evaluate the resources
+
+        :return: Account object
+        """
+
+        account = Account({'Id': self.id, 'isMain': self.is_main, 'Name': self.name})
 
-    def set_resources(self, instances, lt, asg):
+        instances = {i_id: instance.at(tw) for i_id, instance in self.instances.items()}
+        asg = {name: data.at(tw) for name, data in self.asg.items()}
+
+        # LTs are referenced both by id and name, evaluate each of them once
+        lts = {id(data): data.at(tw) for _, data in self.lt.items()}
+        lt = {key: lts[id(data)] for key, data in self.lt.items()}
+
+        account.set_resources(
+            {i_id: instance for i_id, instance in instances.items() if instance is not None},
+            {key: data for key, data in lt.items() if data is not None},
+            {name: data for name, data in asg.items() if data is not None},
+            self.interval_index
+        )
+
+        return account
+
+    def set_resources(self, instances, lt, asg, interval_index: IntervalIndex = None):
         self.instances = instances
         self.lt = lt
         self.asg = asg
+
+        # The scores aggregate the Instances from a columnar copy of them
+        self.instance_table = InstanceTable(instances, asg)
+
+        # The running intervals of the Instances answer for any time window, accounts evaluated in a time window reuse
+        # the index of the account they're evaluated from
+        self.interval_index = IntervalIndex(instances) if interval_index is None else interval_index
@@ -1,3 +1,5 @@
+import copy
+
 from enum import Enum
 from .resource import Resource
 from .libs_finder import *
@@ -50,6 +52,12 @@ class ASG(Resource):
         self.sp = None
         self.overrides = Overrides(event_payload)
 
+        # Launch Template and overrides set by every event, to know the state of the ASG at any point in time
+        self._states: [tuple] = []
+
+        # Type of scaling policy set by every event, which are fetched separately from the events of the ASG
+        self._policies: [tuple] = []
+
         super().__init__(event_data, event_payload)
 
     def hydrate(self, event_data: dict, event_payload: dict):
@@ -64,3 +72,42 @@ class ASG(Resource):
             event_payload['requestParameters']['mixedInstancesPolicy']['launchTemplate'][
                 'launchTemplateSpecification']
         )
+
+        self._states.append((event_data['EventTime'], self.lt, self.overrides))
+
+    def set_scaling_policy(self, event_time, sp: str) -> None:
+        """
+        Records the type of scaling policy set by an event. Events must be recorded in ascending order by event time
+
+        :param event_time: time of the event
+        :param sp: type of the scaling policy, or None if the policy was deleted
+        """
+
+        self.sp = sp
+        self._policies.append((event_time, sp))
+
+    def at(self, tw: TimeWindow):
+        """
+        Returns the ASG as it was during another time window, e.g. a past day
+
+        :param tw: time window in which to evaluate the ASG
+
+        :return: copy of the ASG with the configuration and scaling policy it had at the end of the time window, or None
+        if it was created after the time window or deleted before it
+        """
+
+        states = [state for state in self._states if state[0] <= tw.end_time]
+
+        if not states or (self.deleted_at is not None and self.deleted_at < tw.start_time):
+            return None
+
+        asg = copy.copy(self)
+        _, asg.lt, asg.overrides = states[-1]
+
+        policies = [policy for policy in self._policies if policy[0] <= tw.end_time]
+        asg.sp = policies[-1][1] if policies else None
+
+        if self.deleted_at is not None and self.deleted_at > tw.end_time:
+            asg.deleted_at = None
+
+        return asg
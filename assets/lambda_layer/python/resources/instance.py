@@ -1,3 +1,9 @@
+import copy
+import sys
+
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
 from .resource import Resource
 from .libs_finder import *
 
@@ -24,23 +30,67 @@ NORMALIZATION_TABLE = {
     '112xlarge': 896
 }
 
+# Lifecycle events store the code of their name, which is the position of the name in this tuple
+_EVENT_NAMES = (EVENT_NAME_RUN_INSTANCES, EVENT_NAME_START_INSTANCES, EVENT_NAME_STOP_INSTANCES,
+                EVENT_NAME_TERMINATE_INSTANCES, EVENT_NAME_BID_EVICTED)
+_EVENT_CODES = {name: code for code, name in enumerate(_EVENT_NAMES)}
+
+# Bits of the packed flags of lifecycle events that tell if the Instance was running before and after every event
+_PREVIOUSLY_RUNNING = 2
+_CURRENTLY_RUNNING = 1
+
+# Time zone of the datetime objects built from the epoch times stored by Instances and lifecycle events
+_TIMEZONE = date_helpers.get_timezone()
+
+
+def _to_epoch(date_time: datetime) -> int:
+    return int(date_time.timestamp())
+
+
+def _to_datetime(epoch: int) -> datetime:
+    return None if epoch is None else datetime.fromtimestamp(epoch, _TIMEZONE)
+
+
+def _intern(value: str) -> str:
+    # Instance types, ASG names and LT ids are repeated by many Instances, keep a single copy of each of them
+    return None if value is None else sys.intern(value)
+
 
 class LaunchTemplate:
+    __slots__ = ('id', 'version')
+
     def __init__(self, id: str, version: str):
-        self.id = id
+        self.id = _intern(id)
         self.version = version if version == DEFAULT else int(version)
 
     def __str__(self):
-        return str(self.__dict__)
+        return str({'id': self.id, 'version': self.version})
 
     def __repr__(self):
         return self.__str__()
 
 
 class LifecycleEvent:
+    """
+    Event that changed the state of an Instance. The time and the name of the event are stored as an epoch timestamp
+    and a small integer code, which Instances pack in arrays, as there are as many lifecycle events as events fetched
+    """
+
+    __slots__ = ('code', 'timestamp', 'previously_running', 'currently_running')
+
+    def _get_name(self) -> str:
+        return _EVENT_NAMES[self.code]
+
+    def _get_time(self) -> datetime:
+        return _to_datetime(self.timestamp)
+
+    name = property(_get_name)
+
+    time = property(_get_time)
+
     def __init__(self, event_data: dict, event_payload: dict):
-        self.name = event_data['EventName']
-        self.time = event_data['EventTime']
+        self.code = _EVENT_CODES[event_data['EventName']]
+        self.timestamp = _to_epoch(event_data['EventTime'])
 
         # Determine if the Instance to which this event belongs, was running before this event and as a result of it
         if event_data['EventName'] == EVENT_NAME_BID_EVICTED:
@@ -54,11 +104,44 @@ class LifecycleEvent:
             self.currently_running = event_payload['currentState']['code'] in (EVENT_CODE_RUNNING,
                                                                                EVENT_CODE_PENDING)
 
+    def pack(self) -> int:
+        """
+        :return: integer containing the code of the event and whether the Instance was running before and after it
+        """
+
+        return self.code << 2 | (_PREVIOUSLY_RUNNING if self.previously_running else 0) | \
+            (_CURRENTLY_RUNNING if self.currently_running else 0)
+
+    @classmethod
+    def unpack(cls, timestamp: int, flags: int):
+        """
+        Builds a lifecycle event from its epoch time and the integer returned by pack
+
+        :param timestamp: epoch time of the event
+        :param flags: integer returned by pack
+
+        :return: LifecycleEvent object
+        """
+
+        event = cls.__new__(cls)
+        event.code = flags >> 2
+        event.timestamp = timestamp
+        event.previously_running = bool(flags & _PREVIOUSLY_RUNNING)
+        event.currently_running = bool(flags & _CURRENTLY_RUNNING)
+
+        return event
+
     def __str__(self):
-        return self.__dict__
+        return str({'name': self.name, 'time': self.time, 'previously_running': self.previously_running,
+                    'currently_running': self.currently_running})
+
+    def __repr__(self):
+        return self.__str__()
 
 
 class InstanceAttrs:
+    __slots__ = ('type', 'size', 'arch', 'is_spot')
+
     def __init__(self, event_data: dict, event_payload: dict):
         self.type = None
         self.size = None
@@ -69,11 +152,11 @@ class InstanceAttrs:
 
     def hydrate(self, event_data: dict, event_payload: dict):
         if 'instanceType' in event_payload:
-            self.type = event_payload['instanceType']
-            self.size = self.type.split('.')[1]
+            self.type = _intern(event_payload['instanceType'])
+            self.size = _intern(self.type.split('.')[1])
 
         if 'architecture' in event_payload:
-            self.arch = event_payload['architecture']
+            self.arch = _intern(event_payload['architecture'])
 
         if event_data['EventName'] == EVENT_NAME_RUN_INSTANCES:
             self.is_spot = 'instanceLifecycle' in event_payload and event_payload['instanceLifecycle'] == MARKET_SPOT
@@ -87,13 +170,16 @@ class InstanceAttrs:
         return self.size is not None
 
     def __str__(self):
-        return str(self.__dict__)
+        return str({'type': self.type, 'size': self.size, 'arch': self.arch, 'is_spot': self.is_spot})
 
     def __repr__(self):
         return self.__str__()
 
 
 class Instance(Resource):
+    __slots__ = ('id', '_launched_at', '_terminated_at', 'asg_name', 'lt', 'attrs', '_event_times', '_event_flags',
+                 '_running_windows', '_vcpu_h', '_events_time_window')
+
     _TAG_KEY_ASG_NAME = 'aws:autoscaling:groupName'
     _TAG_KEY_LT_ID = 'aws:ec2launchtemplate:id'
     _TAG_KEY_LT_VERSION = 'aws:ec2launchtemplate:version'
@@ -111,54 +197,84 @@ class Instance(Resource):
 
         return self._vcpu_h
 
+    def _get_lifecycle_events(self) -> [LifecycleEvent]:
+        return [LifecycleEvent.unpack(timestamp, flags) for timestamp, flags in zip(self._event_times, self._event_flags)]
+
+    def _get_launched_at(self) -> datetime:
+        return _to_datetime(self._launched_at)
+
+    def _get_terminated_at(self) -> datetime:
+        return _to_datetime(self._terminated_at)
+
     # --------------- PROPERTIES -------------- #
+    lifecycle_events = property(_get_lifecycle_events)
+
+    launched_at = property(_get_launched_at)
+
+    terminated_at = property(_get_terminated_at)
+
     running_windows = property(_get_running_windows)
 
     vcpu_h = property(_get_vcpu_h)
 
     # ------------ PRIVATE METHODS ------------ #
-    def _entered_running(self, tw: TimeWindow):
-        # Note: lifecycle events are sorted by event time in ascending order, and there no events past the time window
-        for event in self.lifecycle_events:
-            if event.time >= tw.start_time:
-                return event.previously_running
+    def _entered_running(self, first: int):
+        # The first lifecycle event since the start of the time window tells if the Instance was running before it
+        if first < len(self._event_times):
+            return bool(self._event_flags[first] & _PREVIOUSLY_RUNNING)
 
-        # If we reach this point, the Instance doesn't have any event during the time window; its last event will
-        # tell us if the instance was running before entering the time window
-        return self.lifecycle_events[-1].currently_running
+        # If there are no events since the start of the time window, the last event will tell us if the instance was
+        # running before entering it
+        return bool(self._event_flags[-1] & _CURRENTLY_RUNNING)
 
-    def _calculate_running_windows(self) -> None:
+    def _find_running_windows(self, tw: TimeWindow) -> [tuple]:
         """
-        Uses the list of lifecycle events to calculate the running windows of the Instance.
+        Finds the running windows of the Instance during a time window. Lifecycle events are sorted by event time, so
+        the events in the time window are found with a binary search, in O(log n + k) for n events and k in the window.
 
         For those situations in which the Instance did run during the whole time window, or in which it run from
-        the last event until the end of the time window, we won't store the end time of the running window to simplify
+        an event until the end of the time window, we won't store the end time of the running window to simplify
         the calculation of the Scaling Score.
+
+        :param tw: time window in which to find the running windows
+
+        :return: list of tuples with the indexes of the lifecycle events that start and end every window. The start
+        index is None for windows that start with the time window, and the end index is None for windows that end with it
         """
 
-        windows: [TimeWindow] = []
-        prev_start_time = self._events_time_window.start_time
+        windows = []
 
-        # Work only with lifecycle events in the time window
-        events_in_tw = [event for event in self.lifecycle_events if self._events_time_window.contains(event.time)]
+        # Work only with lifecycle events in the time window, comparing their epoch times to avoid building datetimes
+        first = bisect_left(self._event_times, tw.start_time.timestamp())
+        last = bisect_right(self._event_times, tw.end_time.timestamp())
 
         # No events during the time window, check if the Instance was running during the whole of it
-        if not events_in_tw:
-            if self._entered_running(self._events_time_window):
-                windows.append(TimeWindow(self._events_time_window.start_time, None))
+        if first == last:
+            if self._entered_running(first):
+                windows.append((None, None))
         # Check if the Instance was running between events, starting from the beginning of the time window
         else:
-            for event in events_in_tw:
-                if event.previously_running:
-                    windows.append(TimeWindow(prev_start_time, event.time))
+            prev_start = None
+
+            for i in range(first, last):
+                if self._event_flags[i] & _PREVIOUSLY_RUNNING:
+                    windows.append((prev_start, i))
 
-                prev_start_time = event.time
+                prev_start = i
 
             # Check if the Instance was running between the last event and the end of the time window
-            if events_in_tw[-1].currently_running:
-                windows.append(TimeWindow(events_in_tw[-1].time, None))
+            if self._event_flags[last - 1] & _CURRENTLY_RUNNING:
+                windows.append((last - 1, None))
+
+        return windows
+
+    def _calculate_running_windows(self) -> None:
+        """
+        Uses the list of lifecycle events to calculate the running windows of the Instance during the time window for
+        which events were fetched
+        """
 
-        self._running_windows = windows
+        self._running_windows = self.running_windows_for(self._events_time_window)
 
     def _calculate_vcpu_h(self) -> None:
         running_time = 0
@@ -174,12 +290,15 @@ class Instance(Resource):
     # -------------- INITIALIZER -------------- #
     def __init__(self, event_data: dict, event_payload: dict, tw: TimeWindow):
         self.id = None
-        self.launched_at = None
-        self.terminated_at = None
+        self._launched_at = None
+        self._terminated_at = None
         self.asg_name = None
         self.lt = None
         self.attrs = InstanceAttrs(event_data, event_payload)
-        self.lifecycle_events: [LifecycleEvent] = []
+
+        # Epoch times and packed flags of the lifecycle events, sorted by event time in ascending order
+        self._event_times = array('q')
+        self._event_flags = bytearray()
 
         self._running_windows = None
         self._vcpu_h = None
@@ -189,23 +308,25 @@ class Instance(Resource):
 
     # ------------- PUBLIC METHODS ------------ #
     def hydrate(self, event_data: dict, event_payload: dict):
-        self.lifecycle_events.append(LifecycleEvent(event_data, event_payload))
+        event = LifecycleEvent(event_data, event_payload)
+        self._event_times.append(event.timestamp)
+        self._event_flags.append(event.pack())
         self.attrs.hydrate(event_data, event_payload)
 
         if 'instanceId' in event_payload:
             self.id = event_payload['instanceId']
 
         if event_data['EventName'] == EVENT_NAME_RUN_INSTANCES:
-            self.launched_at = event_data['EventTime']
+            self._launched_at = _to_epoch(event_data['EventTime'])
         elif event_data['EventName'] in (EVENT_NAME_TERMINATE_INSTANCES, EVENT_NAME_BID_EVICTED):
-            self.terminated_at = event_data['EventTime']
+            self._terminated_at = _to_epoch(event_data['EventTime'])
 
         # Explore the tags to try to find the used LT and the ASG to which the Instance has been launched
         if 'tagSet' in event_payload:
             tags = {tag['key']: tag['value'] for tag in event_payload['tagSet']['items']}
 
             if self._TAG_KEY_ASG_NAME in tags:
-                self.asg_name = tags[self._TAG_KEY_ASG_NAME]
+                self.asg_name = _intern(tags[self._TAG_KEY_ASG_NAME])
 
             if self._TAG_KEY_LT_ID in tags:
                 self.lt = LaunchTemplate(tags[self._TAG_KEY_LT_ID], tags[self._TAG_KEY_LT_VERSION])
@@ -216,4 +337,65 @@ class Instance(Resource):
         :return: True if required attributes are present, False otherwise
         """
 
-        return self.attrs.is_initialised() and self.launched_at is not None
+        return self.attrs.is_initialised() and self._launched_at is not None
+
+    def at(self, tw: TimeWindow):
+        """
+        Returns the Instance as it was during another time window, e.g. a past day, reusing its lifecycle events
+
+        :param tw: time window in which to evaluate the Instance
+
+        :return: copy of the Instance whose running windows and vCPU hours are calculated for the time window, or None
+        if the Instance was launched after the time window or terminated before it
+        """
+
+        if self._launched_at > tw.end_time.timestamp() or \
+                (self._terminated_at is not None and self._terminated_at < tw.start_time.timestamp()):
+            return None
+
+        # Lifecycle events are shared with the copy, only the results calculated for a time window are reset
+        instance = copy.copy(self)
+        instance._events_time_window = tw
+        instance._running_windows = None
+        instance._vcpu_h = None
+
+        return instance
+
+    def running_windows_for(self, tw: TimeWindow) -> [TimeWindow]:
+        """
+        Calculates the running windows of the Instance during any time window, without scanning all its lifecycle
+        events. Windows that last until the end of the time window don't have end time.
+
+        :param tw: time window in which to find the running windows
+
+        :return: list of TimeWindow objects
+        """
+
+        return [
+            TimeWindow(tw.start_time if start is None else _to_datetime(self._event_times[start]),
+                       None if end is None else _to_datetime(self._event_times[end]))
+            for start, end in self._find_running_windows(tw)
+        ]
+
+    def running_intervals(self) -> [tuple]:
+        """
+        Calculates the intervals in which the Instance was running according to all its lifecycle events, which contain
+        its running windows during any time window. The state of the Instance between two events is given by the later.
+
+        :return: list of tuples with the start and end times of the intervals as epoch seconds. The start time is None
+        if the Instance was running before its first event, and the end time is None if it was running after its last
+        """
+
+        intervals = []
+        prev_time = None
+
+        for time, flags in zip(self._event_times, self._event_flags):
+            if flags & _PREVIOUSLY_RUNNING:
+                intervals.append((prev_time, time))
+
+            prev_time = time
+
+        if self._event_flags and self._event_flags[-1] & _CURRENTLY_RUNNING:
+            intervals.append((prev_time, None))
+
+        return intervals
@@ -0,0 +1,109 @@
+from array import array
+
+# NumPy is optional: if it isn't installed in the layer, the columns are stored in arrays and aggregated in Python
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Code of the columns that reference a category when the Instance has none, e.g. Instances launched outside ASGs
+NO_CODE = -1
+
+
+class InstanceTable:
+    """
+    Columnar store of the Instances of an account, built once after fetching them, so that the aggregates used by the
+    scores are computed as masked sums over arrays instead of looping over Instance objects. Every column has a value
+    per Instance, in the order of the dictionary of Instances it's built from.
+    """
+
+    def __init__(self, instances: dict, asg_data: dict):
+        """
+        :param instances: dictionary containing the Instances of the account, by id
+        :param asg_data: dictionary containing the ASGs of the account, by name
+        """
+
+        policy_type_codes = {}
+
+        vcpu_h = []
+        uses_lt = []
+        uses_lc = []
+        policy_type_ids = []
+
+        for _, instance in instances.items():
+            vcpu_h.append(instance.vcpu_h)
+            uses_lt.append(instance.asg_name is not None and instance.lt is not None)
+            uses_lc.append(instance.asg_name is not None and instance.lt is None)
+
+            # The scaling policy is only known if the ASG of the Instance was fetched
+            asg = asg_data.get(instance.asg_name) if instance.asg_name is not None else None
+
+            if asg is None or asg.sp is None:
+                policy_type_ids.append(NO_CODE)
+            else:
+                policy_type_ids.append(policy_type_codes.setdefault(asg.sp, len(policy_type_codes)))
+
+        # Types of scaling policies, by the codes stored in the columns
+        self.policy_types: [str] = list(policy_type_codes)
+
+        self.vcpu_h = self._column(vcpu_h, 'd')
+        self.uses_lt = self._column(uses_lt, 'B')
+        self.uses_lc = self._column(uses_lc, 'B')
+        self.policy_type_ids = self._column(policy_type_ids, 'l')
+
+    @staticmethod
+    def _column(values: list, typecode: str):
+        if np is None:
+            return array(typecode, values)
+
+        # Unsigned bytes hold flags, which are stored as booleans to be used as masks
+        dtypes = {'d': np.float64, 'q': np.int64, 'l': np.int32, 'B': np.bool_}
+
+        return np.array(values, dtype=dtypes[typecode])
+
+    def __len__(self):
+        return len(self.vcpu_h)
+
+    def _masked_sum(self, values, mask) -> int:
+        if np is None:
+            return sum(value for value, selected in zip(values, mask) if selected)
+
+        return int(values[mask].sum())
+
+    def total_vcpu_h(self) -> int:
+        """
+        :return: vCPU hours of all the Instances
+        """
+
+        return sum(self.vcpu_h) if np is None else int(self.vcpu_h.sum())
+
+    def lt_vcpu_h(self) -> int:
+        """
+        :return: vCPU hours of the Instances launched in ASGs driven by a Launch Template
+        """
+
+        return self._masked_sum(self.vcpu_h, self.uses_lt)
+
+    def lc_vcpu_h(self) -> int:
+        """
+        :return: vCPU hours of the Instances launched in ASGs driven by a Launch Configuration
+        """
+
+        return self._masked_sum(self.vcpu_h, self.uses_lc)
+
+    def count_by_policy_type(self) -> dict[str: int]:
+        """
+        :return: dictionary containing the number of Instances launched in ASGs with a known scaling policy, by type
+        """
+
+        if np is None:
+            counts = [0] * len(self.policy_types)
+
+            for code in self.policy_type_ids:
+                if code != NO_CODE:
+                    counts[code] += 1
+        else:
+            codes = self.policy_type_ids[self.policy_type_ids != NO_CODE]
+            counts = np.bincount(codes, minlength=len(self.policy_types)).tolist()
+
+        return dict(zip(self.policy_types, counts))
@@ -0,0 +1,335 @@
+from array import array
+from bisect import bisect_right
+from datetime import timedelta
+from itertools import groupby
+from .instance import NORMALIZATION_TABLE
+from .libs_finder import *
+
+# NumPy is optional: if it isn't installed in the layer, the intervals are stored in arrays and queried in Python
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Epoch times that stand for the open ends of the intervals, far from any event time
+_OPEN_START = -2 ** 62
+_OPEN_END = 2 ** 62
+
+
+def _bounds(tw: TimeWindow) -> (int, int):
+    return int(tw.start_time.timestamp()), int(tw.end_time.timestamp())
+
+
+def sweep(starts, ends) -> (int, int):
+    """
+    Traverses the sorted start and end times of running windows, increasing a counter when finding a start time and
+    decreasing it when finding an end time. The minimum is incremented, instead of set to the counter, when more than
+    one consecutive start times are the same.
+
+    With NumPy, the times are encoded as an array with +1 and -1 deltas, sorted with a stable sort and accumulated with
+    a cumulative sum. The minimum is updated as min_k = min(count_k, min_k-1 + inc_k), where inc_k is 1 when the k-th
+    time is a start time equal to the previous one. Unrolling it, min_n = sum(inc) + min_j(count_j - sum(inc[:j + 1])).
+
+    :param starts: start times of the running windows as epoch seconds
+    :param ends: end times of the running windows that end within the time window, as epoch seconds
+
+    :return: tuple with the minimum and maximum concurrent running windows
+    """
+
+    if len(starts) == 0:
+        return None, 0
+
+    if np is None:
+        min_i = None
+        max_i = 0
+        count = 0
+        prev_start_time = None
+
+        # Start times are placed before the end times, so a stable sort leaves start times first among equal times
+        for time, delta in sorted([(start, 1) for start in starts] + [(end, -1) for end in ends], key=lambda w: w[0]):
+            if prev_start_time is not None and prev_start_time == time and delta == 1:
+                min_i += 1
+
+            if delta == 1:
+                prev_start_time = time
+
+            count += delta
+            max_i = max(max_i, count)
+            min_i = count if min_i is None else min(count, min_i)
+
+        return min_i, max_i
+
+    times = np.concatenate((np.asarray(starts, dtype=np.int64), np.asarray(ends, dtype=np.int64)))
+    deltas = np.concatenate((np.ones(len(starts), dtype=np.int64), np.full(len(ends), -1, dtype=np.int64)))
+
+    order = np.argsort(times, kind='stable')
+    times = times[order]
+    deltas = deltas[order]
+    counts = np.cumsum(deltas)
+
+    # Among equal times start times come first, so a start time equal to the previous time follows another start time
+    increments = np.zeros(len(times), dtype=np.int64)
+    increments[1:] = (deltas[1:] == 1) & (times[1:] == times[:-1])
+    increments = np.cumsum(increments)
+
+    return int(increments[-1] + np.min(counts - increments)), max(0, int(counts.max()))
+
+
+class IntervalIndex:
+    """
+    Index of the intervals in which the Instances of an account were running, built once from their lifecycle events.
+    The intervals are sorted by start time, so the ones that overlap any time window are found with a binary search
+    and a filter on their end times, and the vCPU hours, the concurrency and the running time of every Instance during
+    the time window are calculated from them without calculating the running windows of the Instances again.
+
+    The results are the same as the ones calculated by the Instances evaluated in the time window with Instance.at,
+    given that the state of an Instance after a lifecycle event is the state before the next one.
+    """
+
+    def __init__(self, instances: dict):
+        """
+        :param instances: dictionary containing the Instances of the account, by id
+        """
+
+        factors = []
+        launched_at = []
+        terminated_at = []
+        intervals = []
+
+        for owner, (_, instance) in enumerate(instances.items()):
+            factors.append(NORMALIZATION_TABLE[instance.attrs.size])
+            launched_at.append(_OPEN_START if instance.launched_at is None else int(instance.launched_at.timestamp()))
+            terminated_at.append(_OPEN_END if instance.terminated_at is None else
+                                 int(instance.terminated_at.timestamp()))
+            intervals += [(_OPEN_START if start is None else start, _OPEN_END if end is None else end, owner)
+                          for start, end in instance.running_intervals()]
+
+        intervals.sort()
+
+        # Ids of the Instances, by the position of the Instance in the columns
+        self.ids: [str] = list(instances)
+
+        # One value per Instance
+        self.factors = self._column(factors, 'd')
+        self.launched_at = self._column(launched_at, 'q')
+        self.terminated_at = self._column(terminated_at, 'q')
+
+        # One value per interval, sorted by start time
+        self.starts = self._column([start for start, _, _ in intervals], 'q')
+        self.ends = self._column([end for _, end, _ in intervals], 'q')
+        self.owners = self._column([owner for _, _, owner in intervals], 'q')
+
+        # Intervals found for the last time window, shared by the daily and the hourly metrics of the same day
+        self._found = None
+
+    @staticmethod
+    def _column(values: list, typecode: str):
+        if np is None:
+            return array(typecode, values)
+
+        return np.array(values, dtype={'q': np.int64, 'd': np.float64}[typecode])
+
+    def __len__(self):
+        return len(self.starts)
+
+    def _find(self, start: int, end: int) -> tuple:
+        """
+        Finds the intervals that overlap a time window, which start before its end and end after its start
+
+        :param start: start time of the time window as epoch seconds
+        :param end: end time of the time window as epoch seconds, included in it
+
+        :return: tuple with the start times, clipped to the start of the time window, the end times and the owners of
+        the intervals
+        """
+
+        if self._found is not None and self._found[0] == (start, end):
+            return self._found[1]
+
+        if np is None:
+            last = bisect_right(self.starts, end)
+            found = [(max(s, start), e, o) for s, e, o in zip(self.starts[:last], self.ends[:last], self.owners[:last])
+                     if e >= start]
+            found = [s for s, _, _ in found], [e for _, e, _ in found], [o for _, _, o in found]
+        else:
+            last = np.searchsorted(self.starts, end, side='right')
+            mask = self.ends[:last] >= start
+            found = np.maximum(self.starts[:last][mask], start), self.ends[:last][mask], self.owners[:last][mask]
+
+        self._found = (start, end), found
+
+        return found
+
+    def _running_times(self, start: int, end: int):
+        starts, ends, owners = self._find(start, end)
+
+        # Windows that last until the end of the time window include its last second
+        if np is None:
+            running_times = [0] * len(self.ids)
+
+            for s, e, o in zip(starts, ends, owners):
+                running_times[o] += min(e, end + 1) - s
+
+            return running_times
+
+        return np.bincount(owners, weights=np.minimum(ends, end + 1) - starts, minlength=len(self.ids)).astype(np.int64)
+
+    def running_times(self, tw: TimeWindow) -> dict[str: int]:
+        """
+        Calculates for how long every Instance was running during a time window
+
+        :param tw: time window in which to evaluate the Instances
+
+        :return: dictionary containing the running seconds of the Instances that were running during the time window,
+        by id
+        """
+
+        running_times = self._running_times(*_bounds(tw))
+
+        return {self.ids[owner]: int(running_time) for owner, running_time in enumerate(running_times) if running_time}
+
+    def vcpu_h(self, tw: TimeWindow) -> int:
+        """
+        Calculates the vCPU hours of the Instances that existed during a time window
+
+        :param tw: time window in which to evaluate the Instances
+
+        :return: vCPU hours of the Instances
+        """
+
+        start, end = _bounds(tw)
+        running_times = self._running_times(start, end)
+
+        if np is None:
+            return sum(running_time * (factor if factor % 1 else int(factor)) // 3600 * 2
+                       for running_time, factor, launched_at, terminated_at
+                       in zip(running_times, self.factors, self.launched_at, self.terminated_at)
+                       if launched_at <= end and terminated_at >= start)
+
+        mask = (self.launched_at <= end) & (self.terminated_at >= start)
+        vcpu_h = np.floor_divide(running_times[mask] * self.factors[mask], 3600) * 2
+
+        # Sizes smaller than small have fractional factors, which make the vCPU hours a float, as Instance.vcpu_h does
+        return float(vcpu_h.sum()) if np.any(self.factors[mask] % 1) else int(vcpu_h.sum())
+
+    def concurrency(self, tw: TimeWindow) -> (int, int):
+        """
+        Calculates the minimum and maximum concurrent running Instances during a time window
+
+        :param tw: time window in which to evaluate the Instances
+
+        :return: tuple with the minimum and maximum concurrent running Instances. The minimum is None if no Instance
+        was running during the time window
+        """
+
+        start, end = _bounds(tw)
+        starts, ends, _ = self._find(start, end)
+
+        # Windows that last until the end of the time window don't have end time
+        if np is None:
+            return sweep(starts, [e for e in ends if e <= end])
+
+        return sweep(starts, ends[ends <= end])
+
+    def buckets(self, tw: TimeWindow, period: int = 3600) -> [tuple]:
+        """
+        Splits a time window in buckets of the same duration, e.g. hours, and calculates the minimum and maximum
+        concurrent running Instances and the vCPU hours of every bucket in a single sweep over the sorted start and end
+        times of the running intervals that overlap the time window.
+
+        The concurrency at a time is the number of running Instances once all the start and end times at that time are
+        counted. The vCPU hours aren't rounded down by Instance as Instance.vcpu_h does, so a day of buckets adds up to
+        slightly more than the daily vCPU hours.
+
+        :param tw: time window in which to evaluate the Instances
+        :param period: duration of the buckets in seconds. The last bucket is shorter if it doesn't divide the time
+        window
+
+        :return: list of tuples with the start time, the minimum and maximum concurrent running Instances and the vCPU
+        hours of every bucket, sorted by start time
+        """
+
+        start, end = _bounds(tw)
+        starts, ends, owners = self._find(start, end)
+        length = end + 1 - start
+        count = -(-length // period)
+
+        # Times are relative to the start of the time window, and windows that last until its end, end after it
+        edges = [min(k * period, length) for k in range(count + 1)]
+
+        if len(starts) == 0:
+            min_i, max_i, vcpu_h = [0] * count, [0] * count, [0] * count
+        elif np is None:
+            min_i, max_i, vcpu_h = self._sweep_buckets(starts, ends, owners, start, end, period, edges)
+        else:
+            min_i, max_i, vcpu_h = self._sweep_buckets_vectorized(starts, ends, owners, start, end, period, edges)
+
+        return [(tw.start_time + timedelta(seconds=edges[k]), min_i[k], max_i[k], vcpu_h[k]) for k in range(count)]
+
+    def _sweep_buckets(self, starts, ends, owners, start: int, end: int, period: int, edges: [int]) -> tuple:
+        count = len(edges) - 1
+        levels = [[] for _ in range(count)]
+        vcpu_h = [0] * count
+        times = []
+        counts = []
+        running = 0
+
+        # Concurrency after every group of start and end times at the same time
+        boundaries = sorted([(s - start, 1) for s in starts] + [(e - start, -1) for e in ends if e <= end])
+
+        for time, group in groupby(boundaries, key=lambda b: b[0]):
+            running += sum(delta for _, delta in group)
+            levels[time // period].append(running)
+            times.append(time)
+            counts.append(running)
+
+        # Concurrency at the start of every bucket, which lasts since the last time before it
+        for k in range(count):
+            i = bisect_right(times, edges[k]) - 1
+            levels[k].append(counts[i] if i >= 0 else 0)
+
+        # Split the running time of every interval among the buckets that it overlaps
+        for s, e, o in zip(starts, ends, owners):
+            s, e = s - start, min(e, end + 1) - start
+
+            for k in range(s // period, (e - 1) // period + 1):
+                vcpu_h[k] += (min(e, edges[k + 1]) - max(s, edges[k])) * self.factors[o] * 2 / 3600
+
+        return [min(level) for level in levels], [max(level) for level in levels], vcpu_h
+
+    def _sweep_buckets_vectorized(self, starts, ends, owners, start: int, end: int, period: int,
+                                  edges: [int]) -> tuple:
+        edges = np.array(edges, dtype=np.int64)
+        factors = self.factors[owners]
+
+        times = np.concatenate((starts, np.minimum(ends, end + 1))) - start
+        deltas = np.concatenate((np.ones(len(starts), dtype=np.int64), np.full(len(ends), -1, dtype=np.int64)))
+        rates = np.concatenate((factors, -factors))
+
+        order = np.argsort(times, kind='stable')
+        times = times[order]
+        counts = np.cumsum(deltas[order])
+        rates = rates[order]
+
+        # Concurrency after the last start or end time of every group at the same time, within the time window
+        last = np.append(times[1:] != times[:-1], True) & (times < end + 1 - start)
+        group_times = times[last]
+        group_counts = counts[last]
+
+        # Concurrency at the start of every bucket, which lasts since the last time before it
+        i = np.searchsorted(group_times, edges[:-1], side='right') - 1
+        held = np.where(i >= 0, group_counts[np.maximum(i, 0)], 0)
+
+        min_i = held.copy()
+        max_i = held.copy()
+        np.minimum.at(min_i, group_times // period, group_counts)
+        np.maximum.at(max_i, group_times // period, group_counts)
+
+        # The vCPU rate is a step function, integrated up to every edge as edge * sum(rates) - sum(rates * times) over
+        # the times before the edge
+        i = np.searchsorted(times, edges, side='right') - 1
+        rate = np.where(i >= 0, np.cumsum(rates)[np.maximum(i, 0)], 0)
+        weighted = np.where(i >= 0, np.cumsum(rates * times)[np.maximum(i, 0)], 0)
+        vcpu_h = np.diff(edges * rate - weighted) * 2 / 3600
+
+        return min_i.tolist(), max_i.tolist(), vcpu_h.tolist()
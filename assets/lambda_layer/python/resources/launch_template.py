@@ -1,3 +1,5 @@
+import copy
+
 from .resource import Resource
 from .libs_finder import *
 
@@ -29,6 +31,9 @@ class LaunchTemplate(Resource):
         self.name = None
         self.versions = {}
 
+        # Times at which every version was set as the default one, to know the default version at any point in time
+        self._default_versions: [tuple] = []
+
         super().__init__(event_data, event_payload)
 
     def hydrate(self, event_data: dict, event_payload: dict):
@@ -38,12 +43,14 @@ class LaunchTemplate(Resource):
         if event_data['EventName'] == EVENT_NAME_CREATE_LT:
             self.versions[1] = LaunchTemplateVersion(event_data, event_payload)
             self.versions[DEFAULT] = self.versions[1]
+            self._default_versions.append((event_data['EventTime'], 1))
         elif event_data['EventName'] == EVENT_NAME_MODIFY_LT:
             default_version = event_payload['responseElements']['ModifyLaunchTemplateResponse']['launchTemplate'][
                 'defaultVersionNumber']
 
             if default_version in self.versions:
                 self.versions[DEFAULT] = self.versions[default_version]
+                self._default_versions.append((event_data['EventTime'], default_version))
         elif event_data['EventName'] == EVENT_NAME_CREATE_LT_VERSION:
             version = event_payload['responseElements']['CreateLaunchTemplateVersionResponse'][
                 'launchTemplateVersion']['versionNumber']
@@ -53,3 +60,32 @@ class LaunchTemplate(Resource):
             if event_payload['responseElements']['CreateLaunchTemplateVersionResponse']['launchTemplateVersion'][
              'defaultVersion']:
                 self.versions[DEFAULT] = self.versions[version]
+                self._default_versions.append((event_data['EventTime'], version))
+
+    def at(self, tw: TimeWindow):
+        """
+        Returns the Launch Template as it was during another time window, e.g. a past day
+
+        :param tw: time window in which to evaluate the Launch Template
+
+        :return: copy of the Launch Template with the versions created until the end of the time window, or None if
+        none of them were
+        """
+
+        versions = {
+            number: version for number, version in self.versions.items()
+            if number != DEFAULT and version.created_at <= tw.end_time
+        }
+
+        if not versions:
+            return None
+
+        defaults = [number for time, number in self._default_versions if time <= tw.end_time and number in versions]
+
+        if defaults:
+            versions[DEFAULT] = versions[defaults[-1]]
+
+        lt = copy.copy(self)
+        lt.versions = versions
+
+        return lt
@@ -2,6 +2,9 @@ from abc import ABCMeta, abstractmethod
 
 
 class Resource(metaclass=ABCMeta):
+    # Allows subclasses to declare __slots__ and store their attributes without a __dict__
+    __slots__ = ()
+
     def __init__(self, event_data: dict, event_payload: dict):
         self.hydrate(event_data, event_payload)
 
@@ -10,7 +13,10 @@ class Resource(metaclass=ABCMeta):
         pass
 
     def __str__(self):
-        return str(self.__dict__)
+        if hasattr(self, '__dict__'):
+            return str(self.__dict__)
+
+        return str({name: getattr(self, name) for cls in type(self).__mro__ for name in getattr(cls, '__slots__', ())})
 
     def __repr__(self):
         return self.__str__()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# License: Apache 2.0
+# Summary: benchmark that compares decoding whole CloudTrail payloads with decoding only the fields that are used
+#
+# Usage, from the root of the repository: python -m benchmarks.decoder_benchmark [events.json]
+#
+# The file contains the output of one or more LookupEvents calls, e.g. from `aws cloudtrail lookup-events`, or a list
+# of events. If no file is given, synthetic events are generated.
+
+import json
+import random
+import sys
+import time
+
+from assets.lambda_layer.python.helpers import decoder_helpers
+
+# Top-level fields of the payloads read by the managers, by event name
+_USED_FIELDS = {
+    'RunInstances': ('responseElements',),
+    'StartInstances': ('responseElements',),
+    'StopInstances': ('responseElements',),
+    'TerminateInstances': ('responseElements',),
+    'BidEvictedEvent': ('serviceEventDetails',),
+    'CreateLaunchTemplate': ('requestParameters', 'responseElements'),
+    'CreateLaunchTemplateVersion': ('requestParameters', 'responseElements'),
+    'ModifyLaunchTemplate': ('responseElements',),
+    'CreateAutoScalingGroup': ('requestParameters',),
+    'UpdateAutoScalingGroup': ('requestParameters',),
+    'DeleteAutoScalingGroup': ('requestParameters',),
+    'PutScalingPolicy': ('requestParameters',),
+    'DeletePolicy': ('requestParameters',)
+}
+
+# Decoder that keeps the used fields whole, as the extractors of the managers only drop some of their keys
+_DECODER = decoder_helpers.PayloadDecoder({
+    event_name: (fields, lambda payload: payload) for event_name, fields in _USED_FIELDS.items()
+})
+
+_SYNTHETIC_EVENTS = 20000
+_ROUNDS = 5
+
+
+def _synthetic_event(i: int) -> dict:
+    instance_id = f'i-{i:017x}'
+    payload = {
+        'eventVersion': '1.09',
+        'userIdentity': {
+            'type': 'AssumedRole',
+            'arn': 'arn:aws:sts::123456789012:assumed-role/AWSServiceRoleForAutoScaling/AutoScaling',
+            'sessionContext': {'attributes': {'creationDate': '2024-01-01T00:00:00Z', 'mfaAuthenticated': 'false'}}
+        },
+        'eventTime': '2024-01-01T00:00:00Z',
+        'eventSource': 'ec2.amazonaws.com',
+        'eventName': 'RunInstances',
+        'awsRegion': 'eu-west-1',
+        'userAgent': 'autoscaling.amazonaws.com',
+        'requestParameters': {
+            'instancesSet': {'items': [{'minCount': 1, 'maxCount': 1}]},
+            'userData': '<sensitiveDataRemoved>',
+            'blockDeviceMapping': {'items': [{'deviceName': f'/dev/sd{chr(97 + d)}',
+                                              'ebs': {'volumeSize': 100, 'volumeType': 'gp3'}} for d in range(8)]},
+            'tagSpecificationSet': {'items': [{'resourceType': 'instance', 'tags': [
+                {'key': f'tag-{t}', 'value': 'x' * 40} for t in range(20)
+            ]}]}
+        },
+        'responseElements': {
+            'requestId': f'{i:032x}',
+            'instancesSet': {'items': [{
+                'instanceId': instance_id,
+                'instanceType': random.choice(['m5.large', 'c6g.xlarge', 'r6i.2xlarge']),
+                'architecture': 'x86_64',
+                'instanceState': {'code': 0, 'name': 'pending'},
+                'tagSet': {'items': [{'key': 'aws:autoscaling:groupName', 'value': 'my-asg'}]},
+                'networkInterfaceSet': {'items': [{'networkInterfaceId': f'eni-{i:017x}',
+                                                   'privateIpAddress': '10.0.0.1'}]}
+            }]}
+        },
+        'eventID': f'{i:032x}',
+        'readOnly': False,
+        'eventType': 'AwsApiCall',
+        'recipientAccountId': '123456789012'
+    }
+
+    # Some events fail, e.g. due to insufficient capacity
+    if i % 10 == 0:
+        payload['errorCode'] = 'Server.InsufficientInstanceCapacity'
+        del payload['responseElements']
+
+    return {'EventId': payload['eventID'], 'EventName': 'RunInstances', 'CloudTrailEvent': json.dumps(payload)}
+
+
+def _load_events(path: str) -> [dict]:
+    with open(path) as fd:
+        data = json.load(fd)
+
+    # A single LookupEvents output, a list of them, or a list of events
+    pages = [data] if isinstance(data, dict) else data
+
+    return [event for page in pages for event in (page['Events'] if 'Events' in page else [page])]
+
+
+def _decode_whole(events: [dict]) -> int:
+    decoded = 0
+
+    for event in events:
+        payload = json.loads(event['CloudTrailEvent'])
+
+        if 'errorCode' not in payload:
+            decoded += 1
+
+    return decoded
+
+
+def _decode_used_fields(events: [dict]) -> int:
+    decoded = 0
+
+    for event in events:
+        raw = event['CloudTrailEvent']
+
+        if decoder_helpers.has_error_code(raw):
+            continue
+
+        _DECODER.decode(event['EventName'], raw)
+        decoded += 1
+
+    return decoded
+
+
+def _time(decode, events: [dict]) -> (float, int):
+    best = None
+    decoded = 0
+
+    for _ in range(_ROUNDS):
+        start = time.perf_counter()
+        decoded = decode(events)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best, decoded
+
+
+def main() -> None:
+    if len(sys.argv) > 1:
+        events = _load_events(sys.argv[1])
+    else:
+        events = [_synthetic_event(i) for i in range(_SYNTHETIC_EVENTS)]
+
+    size = sum(len(event['CloudTrailEvent']) for event in events)
+    print(f'{len(events)} events, {size / 2 ** 20:.1f} MiB of payloads')
+
+    baseline, decoded = _time(_decode_whole, events)
+    print(f'json.loads of whole payloads: {baseline:.3f}s, {decoded} valid events')
+
+    # Payloads are decoded whole by faster libraries, and only up to the last used field by the standard library
+    backend = decoder_helpers.BACKEND
+
+    elapsed, decoded = _time(_decode_used_fields, events)
+    print(f'Used fields with {backend}: {elapsed:.3f}s, {decoded} valid events, {baseline / elapsed:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# License: Apache 2.0
+# Summary: benchmark that measures the memory used by the Instances of an account and their lifecycle events
+#
+# Usage, from the root of the repository: python -m benchmarks.instance_memory_benchmark [instances]
+
+import random
+import sys
+import tracemalloc
+
+from datetime import datetime, timedelta
+from assets.lambda_layer.python.helpers import TimeWindow, date_helpers
+from assets.lambda_layer.python.resources import Instance
+
+_DEFAULT_INSTANCES = 100000
+_INSTANCE_TYPES = ('m5.large', 'm5.xlarge', 'c6g.2xlarge', 'r6i.4xlarge', 't3.micro')
+_ASGS = 200
+
+
+def _generate_events(i: int, tw: TimeWindow):
+    """
+    Generates the events of an Instance launched in the 90 days before the time window, which is started and stopped
+    a few times and may be terminated
+    """
+
+    time = tw.start_time - timedelta(days=random.randint(0, 89), seconds=random.randint(0, 86399))
+    instance_data = {
+        'instanceId': f'i-{i:017x}',
+        'instanceType': random.choice(_INSTANCE_TYPES),
+        'architecture': 'x86_64',
+        'tagSet': {'items': [{'key': 'aws:autoscaling:groupName', 'value': f'asg-{i % _ASGS}'}]}
+    }
+
+    yield {'EventName': 'RunInstances', 'EventTime': time}, instance_data
+
+    for j in range(random.randint(0, 3)):
+        time += timedelta(hours=random.randint(1, 48))
+
+        yield {'EventName': 'StopInstances', 'EventTime': time}, {'instanceId': instance_data['instanceId'],
+                                                                 'previousState': {'code': 16},
+                                                                 'currentState': {'code': 80}}
+
+        time += timedelta(minutes=random.randint(1, 120))
+
+        yield {'EventName': 'StartInstances', 'EventTime': time}, {'instanceId': instance_data['instanceId'],
+                                                                  'previousState': {'code': 80},
+                                                                  'currentState': {'code': 0}}
+
+    if random.random() < 0.5:
+        time += timedelta(hours=random.randint(1, 48))
+
+        yield {'EventName': 'TerminateInstances', 'EventTime': time}, {'instanceId': instance_data['instanceId'],
+                                                                      'previousState': {'code': 16},
+                                                                      'currentState': {'code': 32}}
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else _DEFAULT_INSTANCES
+    today = datetime.now(tz=date_helpers.get_timezone()).replace(hour=0, minute=0, second=0, microsecond=0)
+    tw = TimeWindow(today - timedelta(1), today - timedelta(seconds=1))
+    random.seed(0)
+
+    tracemalloc.start()
+    instances = {}
+    events = 0
+
+    # Events are generated lazily, so that only the memory retained by the Instances is measured
+    for i in range(count):
+        instance = None
+
+        for event_data, event_payload in _generate_events(i, tw):
+            if instance is None:
+                instance = Instance(event_data, event_payload, tw)
+            else:
+                instance.hydrate(event_data, event_payload)
+
+            events += 1
+
+        instances[instance.id] = instance
+
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f'{count} Instances, {events} lifecycle events')
+    print(f'Retained: {size / 2 ** 20:.1f} MiB ({size / count:.0f} bytes per Instance), peak: {peak / 2 ** 20:.1f} MiB')
+
+
+if __name__ == '__main__':
+    main()
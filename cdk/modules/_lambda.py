@@ -47,8 +47,31 @@ class LambdaModule:
             layer_version_name='FlexibilityScoreHelpers'
         )
 
+    @classmethod
+    def _get_trail_logs_config(cls) -> dict:
+        """
+        Reads from the CDK context the organization trail whose log files are read by the trail_logs fetch strategy,
+        e.g. cdk deploy -c trailBucket=<bucket> -c trailPrefix=<prefix> -c trailOrgId=<organization id>
+
+        :return: dictionary with the environment variables that configure the strategy, empty if no trail bucket is set
+        """
+
+        trail_bucket = cls.context.node.try_get_context('trailBucket')
+
+        if not trail_bucket:
+            return {}
+
+        return {
+            'FETCH_STRATEGY': 'trail_logs',
+            'TRAIL_BUCKET': trail_bucket,
+            'TRAIL_PREFIX': cls.context.node.try_get_context('trailPrefix') or '',
+            'TRAIL_ORG_ID': cls.context.node.try_get_context('trailOrgId') or ''
+        }
+
     @classmethod
     def _create_func_daily_metrics_calculation(cls, layer, bucket, org_role_name) -> None:
+        trail_logs_config = cls._get_trail_logs_config()
+
         func = _lambda.Function(
             cls.context,
             'FuncDailyMetricsCalculation',
@@ -57,7 +80,10 @@ class LambdaModule:
             runtime=_lambda.Runtime.PYTHON_3_10,
             environment={
                 'BUCKET': bucket.bucket_name,
-                'ORGS_IAM_ROLE': org_role_name.value_as_string
+                'ORGS_IAM_ROLE': org_role_name.value_as_string,
+                # Assume member account roles through the STS endpoint of the function's region
+                'AWS_STS_REGIONAL_ENDPOINTS': 'regional',
+                **trail_logs_config
             },
             code=_lambda.Code.from_asset('assets/func_calculate_daily_metrics'),
             handler='index.handler',
@@ -65,8 +91,8 @@ class LambdaModule:
             memory_size=256
         )
 
-        # Grant the function permission to write to the S3 Bucket
-        bucket.grant_write(func)
+        # Grant the function permission to write metrics to the S3 Bucket and to read and write cached CloudTrail events
+        bucket.grant_read_write(func)
 
         # Define a structure containing the permissions needed by the function
         statements = [
@@ -87,6 +113,22 @@ class LambdaModule:
             }
         ]
 
+        # Grant the function permission to list and read the log files delivered by the organization trail
+        if trail_logs_config:
+            trail_bucket = trail_logs_config['TRAIL_BUCKET']
+            logs_prefix = '/'.join([part for part in (trail_logs_config['TRAIL_PREFIX'].strip('/'), 'AWSLogs') if part])
+
+            statements += [
+                {
+                    'actions': ['s3:ListBucket'],
+                    'resources': [f'arn:aws:s3:::{trail_bucket}']
+                },
+                {
+                    'actions': ['s3:GetObject'],
+                    'resources': [f'arn:aws:s3:::{trail_bucket}/{logs_prefix}/*']
+                }
+            ]
+
         # Attach the permissions to the function execution role
         for statement in statements:
             func.add_to_role_policy(iam.PolicyStatement(
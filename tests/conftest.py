@@ -0,0 +1,43 @@
+import os
+
+from unittest import mock
+
+import pytest
+
+# Requests are only sent to stub servers, but botocore needs a region and credentials to sign them
+os.environ.update({
+    'AWS_DEFAULT_REGION': 'eu-west-1',
+    'AWS_ACCESS_KEY_ID': 'testing',
+    'AWS_SECRET_ACCESS_KEY': 'testing',
+    'ORGS_IAM_ROLE': 'OrgRole'
+})
+os.environ.pop('AWS_SESSION_TOKEN', None)
+os.environ.pop('AWS_PROFILE', None)
+
+from assets.lambda_layer.python.helpers import organizations_helpers
+
+MAIN_ACCOUNT_ID = '111122223333'
+
+# The account manager lists the accounts of the organization when it's imported
+with mock.patch.object(organizations_helpers, 'list_organization_accounts', return_value=[{'Id': MAIN_ACCOUNT_ID}]), \
+        mock.patch.object(organizations_helpers, 'describe_organization',
+                          return_value={'MasterAccountId': MAIN_ACCOUNT_ID}):
+    from assets.lambda_layer.python.resource_managers import account_manager
+
+
+from assets.lambda_layer.python.resources import instance_table, interval_index
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def numpy_backend(request, monkeypatch):
+    """
+    Runs a test with and without NumPy, which the modules that store columns of Instances use when it's installed
+    """
+
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+    else:
+        for module in (instance_table, interval_index):
+            monkeypatch.setattr(module, 'np', None)
+
+    return request.param
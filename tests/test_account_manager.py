@@ -0,0 +1,284 @@
+import asyncio
+import json
+
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from assets.lambda_layer.python.constants import ALL_CW_METRICS, MAX_CT_EVENT_DELIVERY_MINUTES, \
+    MAX_CT_RELATIVE_DAYS_SEARCH
+from assets.lambda_layer.python.helpers import aio_helpers, cloudtrail_helpers, cloudwatch_helpers, ec2_helpers
+from assets.lambda_layer.python.helpers.cache_helpers import RegionActivity
+from assets.lambda_layer.python.helpers.date_helpers import TimeWindow
+from assets.lambda_layer.python.resource_managers.asg_manager import ASGManager
+from assets.lambda_layer.python.resource_managers.instance_manager import InstanceManager
+from assets.lambda_layer.python.resource_managers.launch_template_manager import LaunchTemplateManager
+from assets.lambda_layer.python.resource_managers.scheduler import WorkStealingScheduler
+from assets.lambda_layer.python.resources.account import Account
+from tests.conftest import account_manager
+from tests.test_aio_helpers import AWSStub
+
+_ASSUME_ROLE_RESPONSE = """
+    <AssumeRoleResponse xmlns="https://sts.amazonaws.com/doc/2011-06-15/">
+      <AssumeRoleResult>
+        <Credentials>
+          <AccessKeyId>AKIDMEMBER</AccessKeyId>
+          <SecretAccessKey>secret</SecretAccessKey>
+          <SessionToken>token</SessionToken>
+          <Expiration>{}</Expiration>
+        </Credentials>
+      </AssumeRoleResult>
+    </AssumeRoleResponse>
+"""
+
+_DESCRIBE_REGIONS_RESPONSE = """
+    <DescribeRegionsResponse xmlns="http://ec2.amazonaws.com/doc/2016-11-15/">
+      <regionInfo>
+        <item><regionName>eu-west-1</regionName></item>
+        <item><regionName>us-east-1</regionName></item>
+      </regionInfo>
+    </DescribeRegionsResponse>
+"""
+
+
+def _get_region(headers: dict) -> str:
+    # The credential scope of the signature is <key>/<date>/<region>/<service>/aws4_request
+    return headers['authorization'].split('Credential=')[1].split('/')[2]
+
+
+def test_async_engine_reuses_credentials_and_prunes_idle_regions():
+    account = Account({'Id': '444455556666', 'isMain': False})
+    now = datetime.now(tz=timezone.utc)
+    expiration = (now + timedelta(hours=1)).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+    # Resources were found recently in eu-west-1, but not in us-east-1
+    activity = RegionActivity(last_full_scan=now - timedelta(1))
+    activity.update('eu-west-1', now - timedelta(1), True)
+    activity.update('us-east-1', now - timedelta(1), False)
+    account_manager.region_index.put(account.id, activity)
+
+    operations = {
+        'AssumeRole': lambda params: (200, _ASSUME_ROLE_RESPONSE.format(expiration)),
+        'DescribeRegions': lambda params: (200, _DESCRIBE_REGIONS_RESPONSE),
+        'LookupEvents': lambda params: (200, json.dumps({'Events': []}))
+    }
+
+    async def run():
+        async with AWSStub(operations) as stub:
+            engine = aio_helpers.AsyncFetchEngine(2, stub.url)
+
+            try:
+                for _ in range(2):
+                    await account_manager._fetch_account_resources_async(account, TimeWindow(now - timedelta(1), now),
+                                                                         engine)
+            finally:
+                await engine.close()
+
+        return stub
+
+    stub = asyncio.run(run())
+
+    # The role is assumed once and its credentials are cached, like with the threaded engine
+    assert [operation for operation, _, _ in stub.requests].count('AssumeRole') == 1
+
+    # The idle region is only probed, with a single request that looks for write events
+    probes = [params for operation, headers, params in stub.requests
+              if operation == 'LookupEvents' and _get_region(headers) == 'us-east-1']
+
+    assert len(probes) == 2
+    assert all([probe['MaxResults'] == 1 for probe in probes])
+    assert all([probe['LookupAttributes'][0]['AttributeKey'] == 'ReadOnly' for probe in probes])
+
+    # Both regions were checked, and no resources were found in them
+    activity = account_manager.region_index.get(account.id)
+
+    assert activity.last_checked('us-east-1') > now - timedelta(1)
+    assert not activity.is_active('eu-west-1', now)
+
+
+@pytest.fixture
+def region_fetch(monkeypatch):
+    """
+    Stubs the requests of the threaded engine: the enabled regions, the probes, which find write events only in
+    us-east-1, and the managers, whose resources are set by the tests by region and manager
+    """
+
+    probes = []
+    fetched = []
+    resources = {}
+
+    def has_events(attribute_key, attribute_value, region, credentials=None, account_id=None, **kwargs):
+        probes.append((region, attribute_key, attribute_value, kwargs['StartTime']))
+        return region == 'us-east-1'
+
+    def fetch_resources(manager):
+        fetched.append((manager.region, type(manager), manager.resource_names))
+        return resources.get((manager.region, type(manager)), {})
+
+    monkeypatch.setattr(ec2_helpers, 'describe_regions',
+                        lambda account_id, credentials=None: ['eu-west-1', 'us-east-1', 'ap-south-1'])
+    monkeypatch.setattr(cloudtrail_helpers, 'has_events', has_events)
+
+    for manager_class in (InstanceManager, LaunchTemplateManager, ASGManager):
+        monkeypatch.setattr(manager_class, 'fetch_resources', fetch_resources)
+
+    # Resources are checked by the tests, without building the columns of the account
+    monkeypatch.setattr(Account, 'set_resources', lambda account, instances, lt, asg: setattr(
+        account, 'resources', (instances, lt, asg)
+    ))
+
+    return probes, fetched, resources
+
+
+def _fetch_account(account: Account) -> Account:
+    now = datetime.now(tz=timezone.utc)
+    scheduler = WorkStealingScheduler(4)
+    account_manager.AccountResourcesFetcher(account, TimeWindow(now - timedelta(1), now), scheduler).schedule()
+
+    assert scheduler.run() == []
+
+    return account
+
+
+def test_idle_regions_are_probed_before_fetching_their_resources(region_fetch):
+    probes, fetched, resources = region_fetch
+    account = Account({'Id': '000011112222', 'isMain': True})
+    now = datetime.now(tz=timezone.utc)
+
+    # Resources were found recently in eu-west-1, us-east-1 was checked yesterday, and ap-south-1 was never checked
+    activity = RegionActivity(last_full_scan=now - timedelta(1))
+    activity.update('eu-west-1', now - timedelta(1), True)
+    activity.update('us-east-1', now - timedelta(1), False)
+    account_manager.region_index.put(account.id, activity)
+
+    resources[('us-east-1', InstanceManager)] = {'i-0': SimpleNamespace(asg_name=None, lt=None)}
+
+    _fetch_account(account)
+
+    # Idle regions are probed for write events since they were last checked, or during the lookup period
+    assert sorted([probe[:3] for probe in probes]) == [
+        ('ap-south-1', cloudtrail_helpers.LOOKUP_ATTRIBUTE_READ_ONLY, 'false'),
+        ('us-east-1', cloudtrail_helpers.LOOKUP_ATTRIBUTE_READ_ONLY, 'false')
+    ]
+
+    start_times = {region: start_time for region, _, _, start_time in probes}
+
+    assert start_times['us-east-1'] == now - timedelta(1) - timedelta(minutes=MAX_CT_EVENT_DELIVERY_MINUTES)
+    assert now - timedelta(MAX_CT_RELATIVE_DAYS_SEARCH) <= start_times['ap-south-1'] < now - timedelta(89)
+
+    # Resources are only fetched in the active region and the idle region that had write events
+    assert sorted({region for region, _, _ in fetched}) == ['eu-west-1', 'us-east-1']
+    assert len(fetched) == 6
+    assert account.resources[0] == resources[('us-east-1', InstanceManager)]
+
+    # The region with resources becomes active, and both idle regions were checked
+    activity = account_manager.region_index.get(account.id)
+
+    assert activity.is_active('us-east-1', now)
+    assert not activity.is_active('ap-south-1', now - timedelta(1))
+    assert activity.last_checked('ap-south-1') >= now
+
+
+def test_full_scans_fetch_all_the_regions_without_probing_them(region_fetch):
+    probes, fetched, _ = region_fetch
+    account = Account({'Id': '000011113333', 'isMain': True})
+    now = datetime.now(tz=timezone.utc)
+
+    activity = RegionActivity(last_full_scan=now - timedelta(30))
+    activity.update('us-east-1', now - timedelta(1), False)
+    account_manager.region_index.put(account.id, activity)
+
+    _fetch_account(account)
+
+    assert probes == []
+    assert sorted({region for region, _, _ in fetched}) == ['ap-south-1', 'eu-west-1', 'us-east-1']
+    assert account_manager.region_index.get(account.id).last_full_scan >= now
+
+
+def test_only_the_asgs_and_lts_referenced_by_instances_are_fetched(region_fetch, monkeypatch):
+    _, fetched, resources = region_fetch
+    monkeypatch.setenv('FETCH_PLANNING', 'dependencies')
+    monkeypatch.setenv('PRUNE_IDLE_REGIONS', 'false')
+
+    resources[('eu-west-1', InstanceManager)] = {
+        'i-0': SimpleNamespace(asg_name='asg-a', lt=SimpleNamespace(id='lt-instance')),
+        'i-1': SimpleNamespace(asg_name='asg-a', lt=None),
+        'i-2': SimpleNamespace(asg_name=None, lt=SimpleNamespace(id='lt-standalone'))
+    }
+    resources[('eu-west-1', ASGManager)] = {'asg-a': SimpleNamespace(lt=SimpleNamespace(id='lt-asg'))}
+    resources[('eu-west-1', LaunchTemplateManager)] = {'lt-asg': SimpleNamespace()}
+
+    account = _fetch_account(Account({'Id': '000011114444', 'isMain': True}))
+    names = {(region, manager_class): resource_names for region, manager_class, resource_names in fetched}
+
+    # ASGs are fetched once the instances of the region have been fetched, and LTs once its ASGs have been fetched
+    assert names[('eu-west-1', InstanceManager)] is None
+    assert names[('eu-west-1', ASGManager)] == {'asg-a'}
+    assert names[('eu-west-1', LaunchTemplateManager)] == {'lt-instance', 'lt-standalone', 'lt-asg'}
+
+    # Regions without instances don't reference any ASG nor LT
+    assert names[('us-east-1', ASGManager)] == set()
+    assert names[('us-east-1', LaunchTemplateManager)] == set()
+    assert len(fetched) == 9
+
+    instances, lt, asg = account.resources
+
+    assert set(instances) == {'i-0', 'i-1', 'i-2'}
+    assert set(asg) == {'asg-a'}
+    assert set(lt) == {'lt-asg'}
+
+
+def test_metric_data_results_are_stored_by_account_and_metric_across_pages(monkeypatch):
+    account_ids = ['000011110000', '000011110001', '000011110002']
+    metric_names = sorted(ALL_CW_METRICS)
+    first_day = datetime(2024, 3, 1, tzinfo=timezone.utc)
+    requests = []
+
+    def value(account_id: str, metric_name: str, day: int) -> float:
+        return account_ids.index(account_id) * 100 + metric_names.index(metric_name) * 10 + day
+
+    def get_metric_data(start_time, end_time, queries: [dict], next_token: str = None) -> dict:
+        # Every page has a data point per query and day, from the most recent day, like ScanBy TimestampDescending.
+        # The last page repeats an earlier data point of the first day, which mustn't replace the latest one
+        page = int(next_token or 0)
+        requests.append(([query['Id'] for query in queries], page))
+        results = []
+
+        for query in queries:
+            metric = query['MetricStat']['Metric']
+            account_id = metric['Dimensions'][0]['Value']
+            day = 2 - page
+            timestamps = [first_day + timedelta(days=day, hours=12)]
+            values = [value(account_id, metric['MetricName'], day)]
+
+            if day == 0:
+                timestamps.append(first_day + timedelta(hours=1))
+                values.append(-1)
+
+            results.append({'Id': query['Id'], 'Timestamps': timestamps, 'Values': values})
+
+        return {'MetricDataResults': results, **({'NextToken': str(page + 1)} if page < 2 else {})}
+
+    stored = []
+    monkeypatch.setattr(cloudwatch_helpers, 'MAX_QUERIES_PER_REQUEST', 4)
+    monkeypatch.setattr(cloudwatch_helpers, 'get_metric_data', get_metric_data)
+    monkeypatch.setattr(account_manager, '_weight_scores', lambda metrics: stored.append(metrics) or {})
+
+    account_manager.fetch_scores(first_day, first_day + timedelta(days=2), account_ids)
+    metrics = stored[0]
+
+    # The queries are split into batches of 4, whose 3 pages are followed one after the other
+    queries = len(account_ids) * len(metric_names)
+
+    assert len(requests) == 3 * -(-queries // 4)
+    assert sorted([query_id for query_ids, page in requests if page == 0 for query_id in query_ids]) == \
+        sorted([account_manager.MetricValues.query_id(i, j)
+                for i in range(len(account_ids)) for j in range(len(metric_names))])
+
+    assert metrics.account_ids == account_ids
+    assert metrics.metric_names == metric_names
+    assert metrics.values == [
+        [[value(account_id, metric_name, day) for day in range(3)] for metric_name in metric_names]
+        for account_id in account_ids
+    ]
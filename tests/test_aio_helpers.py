@@ -0,0 +1,333 @@
+import asyncio
+import json
+
+from datetime import datetime, timedelta, timezone
+from urllib.parse import parse_qs
+
+import pytest
+
+from botocore.exceptions import ClientError
+from assets.lambda_layer.python.helpers import aio_helpers
+
+
+class StubServer:
+    """
+    HTTP server that answers every request with the response built by a handler from its head and body, which can also
+    close the connection or never answer
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.connections = 0
+        self.open_connections = 0
+        self.max_open_connections = 0
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        self.open_connections += 1
+        self.max_open_connections = max(self.max_open_connections, self.open_connections)
+
+        try:
+            while True:
+                head = await reader.readuntil(b'\r\n\r\n')
+                length = [int(line.split(b':')[1]) for line in head.split(b'\r\n')
+                          if line.lower().startswith(b'content-length')]
+                body = await reader.readexactly(length[0] if length else 0)
+
+                if not await self.handler(writer, head, body):
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.open_connections -= 1
+            writer.close()
+
+    async def __aenter__(self):
+        self._server = await asyncio.start_server(self._serve, '127.0.0.1', 0)
+        self.url = 'http://127.0.0.1:{}/'.format(self._server.sockets[0].getsockname()[1])
+
+        return self
+
+    async def __aexit__(self, *args):
+        self._server.close()
+
+
+def _response(body: bytes, headers: str = None, status: int = 200) -> bytes:
+    headers = f'Content-Length: {len(body)}\r\n' if headers is None else headers
+
+    return f'HTTP/1.1 {status} Stub\r\n{headers}\r\n'.encode('latin-1') + body
+
+
+def test_reuses_connections():
+    async def handler(writer, *_):
+        writer.write(_response(b'ok'))
+        return True
+
+    async def run():
+        pool = aio_helpers.HTTPConnectionPool()
+
+        async with StubServer(handler) as server:
+            responses = [await pool.request('GET', server.url, {}, b'') for _ in range(3)]
+            await pool.close()
+
+        return server, responses
+
+    server, responses = asyncio.run(run())
+
+    assert responses == [(200, {'content-length': '2'}, b'ok')] * 3
+    assert server.connections == 1
+
+
+def test_retries_idle_connections_closed_by_the_server():
+    async def handler(writer, *_):
+        # Answer and close the connection without telling the client, as servers do with idle connections
+        writer.write(_response(b'ok'))
+        await writer.drain()
+        return False
+
+    async def run():
+        pool = aio_helpers.HTTPConnectionPool()
+
+        async with StubServer(handler) as server:
+            first = await pool.request('GET', server.url, {}, b'')
+            await asyncio.sleep(0.1)
+            second = await pool.request('POST', server.url, {}, b'body')
+            await pool.close()
+
+        return server, first, second
+
+    server, first, second = asyncio.run(run())
+
+    assert first[2] == second[2] == b'ok'
+    assert server.connections == 2
+
+
+def test_reads_bodies_without_length_until_the_connection_is_closed():
+    async def handler(writer, *_):
+        writer.write(_response(b'x' * 100000, headers=''))
+        await writer.drain()
+        return False
+
+    async def run():
+        pool = aio_helpers.HTTPConnectionPool()
+
+        async with StubServer(handler) as server:
+            response = await pool.request('GET', server.url, {}, b'')
+            await pool.close()
+
+        return response
+
+    assert asyncio.run(run())[2] == b'x' * 100000
+
+
+def test_times_out_reading_responses():
+    async def handler(writer, *_):
+        await asyncio.sleep(10)
+        return False
+
+    async def run():
+        pool = aio_helpers.HTTPConnectionPool(read_timeout=0.2)
+
+        async with StubServer(handler) as server:
+            try:
+                await pool.request('GET', server.url, {}, b'')
+            finally:
+                await pool.close()
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(run())
+
+
+def test_limits_open_connections():
+    async def handler(writer, *_):
+        await asyncio.sleep(0.05)
+        writer.write(_response(b'ok'))
+        return True
+
+    async def run():
+        pool = aio_helpers.HTTPConnectionPool(max_connections=2)
+
+        async with StubServer(handler) as server:
+            responses = await asyncio.gather(*[pool.request('GET', server.url, {}, b'') for _ in range(10)])
+            await pool.close()
+
+        return server, responses
+
+    server, responses = asyncio.run(run())
+
+    assert [body for _, _, body in responses] == [b'ok'] * 10
+    assert server.max_open_connections == 2
+
+
+class AWSStub(StubServer):
+    """
+    Stub of the AWS endpoints that records the requests and answers them with the responses returned by a function of
+    every operation, which receives the parameters of the request and returns the status and body of the response
+    """
+
+    def __init__(self, operations: dict):
+        super().__init__(self._answer)
+        self.operations = operations
+        self.requests = []
+
+    async def _answer(self, writer, head: bytes, body: bytes) -> bool:
+        lines = [line.decode('latin-1').split(': ', 1) for line in head.split(b'\r\n')[1:] if line]
+        headers = {name.lower(): value for name, value in lines}
+
+        # JSON protocols name the operation in a header, while query protocols send it in the body
+        if 'x-amz-target' in headers:
+            operation = headers['x-amz-target'].split('.')[-1]
+            params = json.loads(body)
+        else:
+            params = {key: values[0] for key, values in parse_qs(body.decode()).items()}
+            operation = params['Action']
+
+        self.requests.append((operation, headers, params))
+
+        status, response_body = self.operations[operation](params)
+        writer.write(_response(response_body.encode(), status=status))
+
+        return True
+
+
+def _run_engine(operations: dict, coroutine):
+    """
+    Runs a coroutine function with an engine that sends its requests to a stub
+
+    :return: tuple with the result of the coroutine and the stub
+    """
+
+    async def run():
+        async with AWSStub(operations) as stub:
+            engine = aio_helpers.AsyncFetchEngine(2, stub.url)
+
+            try:
+                return await coroutine(engine), stub
+            finally:
+                await engine.close()
+
+    return asyncio.run(run())
+
+
+def _lookup_page(events: [dict], next_token: str = None) -> (int, str):
+    page = {'Events': [{'EventId': event_id, 'EventName': name, 'EventTime': 1710000000} for event_id, name in events]}
+
+    if next_token is not None:
+        page['NextToken'] = next_token
+
+    return 200, json.dumps(page)
+
+
+def test_signs_requests_with_sigv4_and_parses_responses():
+    credentials = {'aws_access_key_id': 'AKIDSTUB', 'aws_secret_access_key': 'secret', 'aws_session_token': 'token'}
+
+    result, stub = _run_engine(
+        {'LookupEvents': lambda params: _lookup_page([('1', 'RunInstances')])},
+        lambda engine: engine.has_events('EventName', 'RunInstances', 'eu-west-1',
+                                         datetime(2024, 3, 1, tzinfo=timezone.utc),
+                                         datetime(2024, 3, 2, tzinfo=timezone.utc), credentials, 'sigv4')
+    )
+
+    operation, headers, params = stub.requests[0]
+
+    assert result is True
+    assert headers['authorization'].startswith('AWS4-HMAC-SHA256 Credential=AKIDSTUB/')
+    assert '/eu-west-1/cloudtrail/aws4_request' in headers['authorization']
+    assert headers['x-amz-security-token'] == 'token'
+    assert params == {
+        'LookupAttributes': [{'AttributeKey': 'EventName', 'AttributeValue': 'RunInstances'}],
+        'StartTime': 1709251200, 'EndTime': 1709337600, 'MaxResults': 1
+    }
+
+
+def test_retries_throttled_requests():
+    responses = [
+        (400, json.dumps({'__type': 'ThrottlingException', 'message': 'Rate exceeded'})),
+        _lookup_page([])
+    ]
+
+    result, stub = _run_engine(
+        {'LookupEvents': lambda params: responses.pop(0)},
+        lambda engine: engine.has_events('EventName', 'RunInstances', 'eu-west-1', datetime.now(tz=timezone.utc),
+                                         datetime.now(tz=timezone.utc), account_id='throttled')
+    )
+
+    assert result is False
+    assert len(stub.requests) == 2
+
+
+def test_raises_client_errors_that_are_not_retried():
+    async def has_events(engine):
+        return await engine.has_events('EventName', 'RunInstances', 'eu-west-1', datetime.now(tz=timezone.utc),
+                                       datetime.now(tz=timezone.utc), account_id='denied')
+
+    error = json.dumps({'__type': 'AccessDeniedException', 'message': 'Denied'})
+
+    with pytest.raises(ClientError) as e:
+        _run_engine({'LookupEvents': lambda params: (400, error)}, has_events)
+
+    assert e.value.response['Error']['Code'] == 'AccessDeniedException'
+
+
+def test_assumes_roles():
+    response = """
+        <AssumeRoleResponse xmlns="https://sts.amazonaws.com/doc/2011-06-15/">
+          <AssumeRoleResult>
+            <Credentials>
+              <AccessKeyId>AKIDROLE</AccessKeyId>
+              <SecretAccessKey>secret</SecretAccessKey>
+              <SessionToken>token</SessionToken>
+              <Expiration>2024-03-01T12:00:00Z</Expiration>
+            </Credentials>
+          </AssumeRoleResult>
+        </AssumeRoleResponse>
+    """
+
+    (credentials, expiration), stub = _run_engine(
+        {'AssumeRole': lambda params: (200, response)},
+        lambda engine: engine.assume_role('arn:aws:iam::444455556666:role/OrgRole')
+    )
+
+    assert credentials == {
+        'aws_access_key_id': 'AKIDROLE', 'aws_secret_access_key': 'secret', 'aws_session_token': 'token'
+    }
+    assert expiration == datetime(2024, 3, 1, 12, tzinfo=timezone.utc)
+    assert stub.requests[0][2]['RoleArn'] == 'arn:aws:iam::444455556666:role/OrgRole'
+
+
+def test_describes_regions():
+    response = """
+        <DescribeRegionsResponse xmlns="http://ec2.amazonaws.com/doc/2016-11-15/">
+          <regionInfo>
+            <item><regionName>eu-west-1</regionName><regionEndpoint>ec2.eu-west-1.amazonaws.com</regionEndpoint></item>
+            <item><regionName>us-east-1</regionName><regionEndpoint>ec2.us-east-1.amazonaws.com</regionEndpoint></item>
+          </regionInfo>
+        </DescribeRegionsResponse>
+    """
+
+    regions, stub = _run_engine({'DescribeRegions': lambda params: (200, response)},
+                                lambda engine: engine.describe_regions())
+
+    assert regions == ['eu-west-1', 'us-east-1']
+    assert stub.requests[0][2]['AllRegions'] == 'false'
+
+
+def test_looks_up_events_across_pages():
+    pages = {
+        None: _lookup_page([('3', 'RunInstances'), ('2', 'CreateTags')], next_token='page-2'),
+        'page-2': _lookup_page([('1', 'TerminateInstances')], next_token='page-3'),
+        'page-3': _lookup_page([])
+    }
+
+    events, stub = _run_engine(
+        {'LookupEvents': lambda params: pages[params.get('NextToken')]},
+        lambda engine: engine.lookup_events('EventSource', 'ec2.amazonaws.com', 'eu-west-1',
+                                            {'RunInstances', 'TerminateInstances'},
+                                            datetime.now(tz=timezone.utc) - timedelta(1),
+                                            datetime.now(tz=timezone.utc), account_id='pages')
+    )
+
+    # Events of other names are filtered out, and pages keep the order of CloudTrail
+    assert [event['EventId'] for event in events] == ['3', '1']
+    assert events[0]['EventTime'] == datetime.fromtimestamp(1710000000, tz=timezone.utc)
+    assert [params.get('NextToken') for _, _, params in stub.requests] == [None, 'page-2', 'page-3']
@@ -0,0 +1,81 @@
+import json
+
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from assets.lambda_layer.python.helpers.date_helpers import TimeWindow
+from assets.lambda_layer.python.resource_managers.asg_manager import ASGManager
+from assets.func_calculate_daily_metrics.scores import policy_score
+
+def _day(day: int) -> TimeWindow:
+    return TimeWindow(datetime(2024, 3, day, tzinfo=timezone.utc),
+                      datetime(2024, 3, day, 23, 59, 59, tzinfo=timezone.utc))
+
+
+def _event(name: str, hour: int, asg_name: str, day: int = 1, **params) -> dict:
+    # Events as returned by LookupEvents, with the raw JSON payload
+    return {
+        'EventId': f'{name}-{asg_name}-{day}-{hour}',
+        'EventName': name,
+        'EventTime': datetime(2024, 3, day, hour, tzinfo=timezone.utc),
+        'Resources': [{'ResourceType': 'AWS::AutoScaling::AutoScalingGroup', 'ResourceName': asg_name}],
+        'CloudTrailEvent': json.dumps({
+            'eventName': name,
+            'requestParameters': dict(params, autoScalingGroupName=asg_name)
+        })
+    }
+
+
+def _fetch(events: [dict], tw: TimeWindow = None) -> dict:
+    manager = ASGManager(_day(1) if tw is None else tw, 'eu-west-1')
+
+    # Events already looked up by event source, so that nothing is requested
+    manager.source_events = events
+
+    return manager.fetch_resources()
+
+
+def test_asgs_get_their_scaling_policy():
+    asgs = _fetch([
+        _event('CreateAutoScalingGroup', 1, 'asg-a'),
+        _event('CreateAutoScalingGroup', 1, 'asg-b'),
+        _event('CreateAutoScalingGroup', 1, 'asg-c'),
+        _event('PutScalingPolicy', 2, 'asg-a', policyType=policy_score.SP_TYPE_TARGET_TRACKING),
+        _event('PutScalingPolicy', 2, 'asg-b', policyType=policy_score.SP_TYPE_SIMPLE),
+        _event('DeletePolicy', 3, 'asg-b'),
+        # Policies of ASGs that weren't fetched are ignored
+        _event('PutScalingPolicy', 2, 'asg-unknown', policyType=policy_score.SP_TYPE_STEP)
+    ])
+
+    assert {name: asg.sp for name, asg in asgs.items()} == {
+        'asg-a': policy_score.SP_TYPE_TARGET_TRACKING,
+        'asg-b': None,
+        'asg-c': None
+    }
+
+
+def test_scaling_policy_score_reads_the_policies():
+    asgs = _fetch([
+        _event('CreateAutoScalingGroup', 1, 'asg-a'),
+        _event('PutScalingPolicy', 2, 'asg-a', policyType=policy_score.SP_TYPE_PREDICTIVE)
+    ])
+    instances = {'i-0': SimpleNamespace(asg_name='asg-a')}
+
+    assert policy_score.calculate(instances, asgs) == 10
+
+
+def test_backfilled_days_get_the_scaling_policy_of_the_day():
+    # Events of a backfill of 4 days
+    asgs = _fetch([
+        _event('CreateAutoScalingGroup', 1, 'asg-a', day=1),
+        _event('PutScalingPolicy', 12, 'asg-a', day=2, policyType=policy_score.SP_TYPE_SIMPLE),
+        _event('PutScalingPolicy', 12, 'asg-a', day=3, policyType=policy_score.SP_TYPE_PREDICTIVE),
+        _event('DeletePolicy', 12, 'asg-a', day=4)
+    ], TimeWindow(_day(1).start_time, _day(4).end_time))
+
+    assert [asgs['asg-a'].at(_day(day)).sp for day in range(1, 5)] == [
+        None, policy_score.SP_TYPE_SIMPLE, policy_score.SP_TYPE_PREDICTIVE, None
+    ]
+
+    # The ASG keeps the latest policy
+    assert asgs['asg-a'].sp is None
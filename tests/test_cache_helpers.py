@@ -0,0 +1,120 @@
+import gzip
+import json
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from assets.lambda_layer.python.helpers import cache_helpers, cloudtrail_helpers, s3_helpers
+from assets.lambda_layer.python.helpers.date_helpers import TimeWindow
+from assets.lambda_layer.python.resource_managers import resource_manager
+from assets.lambda_layer.python.resource_managers.instance_manager import InstanceManager
+
+
+@pytest.fixture
+def bucket(monkeypatch):
+    """
+    Objects of a bucket, kept in memory instead of S3
+    """
+
+    objects = {}
+    uploads = []
+
+    def upload_file_bytes(bucket_name: str, key: str, contents: bytes) -> None:
+        objects[key] = contents
+        uploads.append(key)
+
+    def retrieve_file_bytes(bucket_name: str, key: str) -> bytes:
+        return objects[key]
+
+    monkeypatch.setattr(s3_helpers, 'upload_file_bytes', upload_file_bytes)
+    monkeypatch.setattr(s3_helpers, 'retrieve_file_bytes', retrieve_file_bytes)
+
+    return objects, uploads
+
+
+def _raw_event(event_id: str, time: datetime, error: bool = False) -> dict:
+    payload = {'eventName': 'StopInstances', 'responseElements': {'instancesSet': {'items': []}}}
+
+    if error:
+        payload['errorCode'] = 'Client.UnauthorizedOperation'
+
+    return {
+        'EventId': event_id,
+        'EventName': 'StopInstances',
+        'EventTime': time,
+        'Resources': [],
+        'CloudTrailEvent': json.dumps(payload)
+    }
+
+
+def test_keeps_the_most_recently_used_entries_in_memory(bucket):
+    cache = cache_helpers.TieredCache(cache_helpers.RegionActivity, 'cache/regions', 'bucket', max_entries=2)
+
+    for key in ('a', 'b'):
+        cache.put(key, cache_helpers.RegionActivity())
+
+    cache.get('a')
+    cache.put('c', cache_helpers.RegionActivity())
+
+    # The least recently used entry is only discarded from memory
+    assert list(cache._entries) == ['a', 'c']
+    assert cache.get('b') is not None
+
+
+def test_entries_can_be_kept_only_in_memory(bucket):
+    _, uploads = bucket
+    cache = cache_helpers.TieredCache(cache_helpers.RegionActivity, 'cache/regions', 'bucket')
+
+    cache.put('a', cache_helpers.RegionActivity(), persist=False)
+    cache.put('b', cache_helpers.RegionActivity())
+
+    assert cache.get('a') is not None
+    assert uploads == ['cache/regions/b.json']
+
+
+def test_persists_compacted_events_only():
+    event = cloudtrail_helpers.compact_event(_raw_event('1', datetime(2024, 3, 1, tzinfo=timezone.utc)),
+                                             InstanceManager.decoder)
+    entry = cache_helpers.CachedEvents([event], datetime(2024, 3, 2, tzinfo=timezone.utc))
+
+    body = json.loads(gzip.decompress(entry.serialize()))
+
+    assert set(body['events'][0]) == {'EventId', 'EventName', 'EventTime', 'Resources', 'Payload'}
+    assert cache_helpers.CachedEvents.deserialize(entry.serialize()).events == [event]
+
+
+def test_ignores_entries_persisted_with_raw_payloads():
+    contents = gzip.compress(json.dumps({
+        'highWaterMark': '2024-03-02T00:00:00+00:00',
+        'events': [{**_raw_event('1', datetime(2024, 3, 1, tzinfo=timezone.utc)), 'EventTime': '2024-03-01T00:00:00'}]
+    }).encode('utf-8'))
+
+    assert cache_helpers.CachedEvents.deserialize(contents) is None
+
+
+def test_uploads_entries_only_when_the_high_water_mark_moves(bucket, monkeypatch):
+    _, uploads = bucket
+    monkeypatch.setattr(resource_manager, 'event_cache', cache_helpers.EventCache('bucket'))
+
+    now = datetime.now(tz=timezone.utc)
+    manager = InstanceManager(TimeWindow(now - timedelta(1), now - timedelta(hours=1)), 'eu-west-1',
+                              account_id='111122223333')
+    entry = cache_helpers.CachedEvents([], now - timedelta(30))
+
+    def update(entry: cache_helpers.CachedEvents, *events: dict) -> cache_helpers.CachedEvents:
+        return manager._update_cache_entry('key', entry, manager._compact_events(list(events)), now)
+
+    entry = update(entry, _raw_event('1', now - timedelta(2)), _raw_event('2', now - timedelta(2), error=True))
+
+    # Failed events are discarded and the rest are cached without their raw payloads
+    assert [event['EventId'] for event in entry.events] == ['1']
+    assert 'CloudTrailEvent' not in entry.events[0]
+    assert entry.high_water_mark == manager.tw.end_time
+    assert len(uploads) == 1
+
+    # Events past the high-water mark are fetched again by the next execution, so they're not uploaded
+    entry = update(entry, _raw_event('3', now - timedelta(minutes=30)))
+
+    assert [event['EventId'] for event in entry.events] == ['1', '3']
+    assert len(uploads) == 1
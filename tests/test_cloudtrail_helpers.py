@@ -0,0 +1,212 @@
+import threading
+
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import boto3
+import pytest
+
+from hypothesis import given, strategies as st
+from assets.lambda_layer.python.helpers import cloudtrail_helpers
+
+
+class Clock:
+    """
+    Monotonic clock that only moves when it's told to, or when a caller sleeps
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cloudtrail_helpers, 'time', clock)
+
+    return clock
+
+
+def test_bursts_up_to_the_capacity_and_then_reserves_tokens_in_order(clock):
+    bucket = cloudtrail_helpers.TokenBucket(2, 3)
+
+    # Callers that find the bucket empty wait for the tokens reserved before theirs
+    assert [bucket.reserve() for _ in range(6)] == [0.0, 0.0, 0.0, 0.5, 1.0, 1.5]
+
+    clock.now += 1
+
+    assert bucket.reserve() == 1.0
+    assert bucket.stats() == {'requests': 7, 'throttles': 0, 'waitTime': 4.0}
+
+
+def test_refills_at_the_rate_up_to_the_capacity(clock):
+    bucket = cloudtrail_helpers.TokenBucket(2)
+
+    for _ in range(2):
+        bucket.reserve()
+
+    clock.now += 0.25
+
+    assert bucket.reserve() == 0.25
+
+    # Idle time doesn't accumulate more tokens than the capacity
+    clock.now += 100
+
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.5]
+
+
+def test_acquire_sleeps_until_the_token_is_available(clock):
+    bucket = cloudtrail_helpers.TokenBucket(4, 1)
+
+    assert [bucket.acquire() for _ in range(3)] == [0.0, 0.25, 0.25]
+    assert clock.sleeps == [0.25, 0.25]
+
+
+def test_throttled_requests_empty_the_bucket(clock):
+    bucket = cloudtrail_helpers.TokenBucket(2)
+
+    bucket.throttled()
+
+    assert bucket.reserve() == 0.5
+
+    # The debt of the tokens already reserved is kept
+    bucket.throttled()
+
+    assert bucket.reserve() == 1.0
+    assert bucket.stats()['throttles'] == 2
+
+
+def test_rate_limiters_are_shared_by_account_and_region(clock):
+    limiter = cloudtrail_helpers.get_rate_limiter('000000000001', 'eu-west-1')
+    limiters = [cloudtrail_helpers.get_rate_limiter('000000000001', 'eu-west-1') for _ in range(8)]
+
+    assert all([other is limiter for other in limiters])
+    assert limiter.rate == cloudtrail_helpers.LOOKUP_EVENTS_TPS
+
+    # Emptying the bucket of an account and region doesn't slow down the requests of other accounts or regions
+    for _ in range(cloudtrail_helpers.LOOKUP_EVENTS_TPS):
+        limiter.reserve()
+
+    assert limiter.reserve() > 0
+    assert cloudtrail_helpers.get_rate_limiter('000000000001', 'us-east-1').reserve() == 0
+    assert cloudtrail_helpers.get_rate_limiter('000000000002', 'eu-west-1').reserve() == 0
+
+    stats = cloudtrail_helpers.get_rate_limiters_stats()
+
+    assert stats['000000000001/eu-west-1']['requests'] == cloudtrail_helpers.LOOKUP_EVENTS_TPS + 1
+    assert stats['000000000001/us-east-1']['requests'] == 1
+
+
+def test_rate_limiters_are_created_once_by_concurrent_callers():
+    limiters = []
+
+    def get() -> None:
+        limiters.append(cloudtrail_helpers.get_rate_limiter('000000000003', 'eu-west-1'))
+
+    threads = [threading.Thread(target=get) for _ in range(16)]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    assert len({id(limiter) for limiter in limiters}) == 1
+
+
+def test_every_attempt_of_a_client_takes_a_token(clock):
+    client = boto3.client('cloudtrail', region_name='eu-west-1')
+    bucket = cloudtrail_helpers.TokenBucket(2)
+    cloudtrail_helpers._limit_rate(client, bucket)
+
+    # Hooks of a request that is throttled and retried
+    for status_code, code in [(400, 'ThrottlingException'), (200, None)]:
+        parsed = {'ResponseMetadata': {'HTTPStatusCode': status_code}}
+
+        if code is not None:
+            parsed['Error'] = {'Code': code}
+
+        client.meta.events.emit('before-send.cloudtrail.LookupEvents', request=None)
+        client.meta.events.emit('needs-retry.cloudtrail.LookupEvents',
+                                response=(SimpleNamespace(status_code=status_code, headers={}), parsed),
+                                attempts=1, caught_exception=None, request_dict={'context': {}}, operation=None)
+
+    assert bucket.stats() == {'requests': 2, 'throttles': 1, 'waitTime': 0.5}
+    assert clock.sleeps == [0.5]
+
+    # Other operations aren't rate limited
+    client.meta.events.emit('before-send.cloudtrail.ListTrails', request=None)
+
+    assert bucket.requests == 2
+
+
+def _event(event_id: str, minute: int) -> dict:
+    return {'EventId': event_id, 'EventTime': datetime(2024, 3, 1, 0, minute, tzinfo=timezone.utc)}
+
+
+@pytest.mark.parametrize('shards', [0, 1, 3, 7])
+def test_splits_time_ranges_into_consecutive_ranges_of_the_same_duration(shards):
+    start_time = datetime(2024, 3, 1, tzinfo=timezone.utc)
+    end_time = datetime(2024, 3, 8, 12, tzinfo=timezone.utc)
+    ranges = cloudtrail_helpers.split_time_range(start_time, end_time, shards)
+
+    assert len(ranges) == max(1, shards)
+    assert ranges[0][0] == start_time
+    assert ranges[-1][1] == end_time
+    assert all([previous[1] == current[0] for previous, current in zip(ranges, ranges[1:])])
+    assert len({current[1] - current[0] for current in ranges[:-1]}) <= 1
+
+
+def test_merges_sorted_streams_returning_the_events_at_shard_boundaries_once():
+    older = [_event('a', 0), _event('b', 10), _event('c', 20)]
+    newer = [_event('c', 20), _event('d', 20), _event('e', 30)]
+
+    assert [event['EventId'] for event in cloudtrail_helpers.merge_events(older, newer)] == ['a', 'b', 'c', 'd', 'e']
+
+
+def test_merges_events_with_the_same_id_at_different_times():
+    # Ids are only compared among the events of the same instant, so distinct events that reuse an id are kept
+    first = [_event('a', 0), _event('b', 10)]
+    second = [_event('a', 5), _event('b', 10)]
+
+    assert [(event['EventId'], event['EventTime'].minute)
+            for event in cloudtrail_helpers.merge_events(first, second)] == [('a', 0), ('a', 5), ('b', 10)]
+
+
+@given(st.lists(st.lists(st.tuples(st.sampled_from('abcdef'), st.integers(0, 5)), max_size=10), max_size=4))
+def test_merged_events_are_sorted_and_unique_by_id_and_time(streams):
+    streams = [sorted([_event(*event) for event in stream], key=lambda e: e['EventTime']) for stream in streams]
+    merged = [(event['EventId'], event['EventTime']) for event in cloudtrail_helpers.merge_events(*streams)]
+
+    assert merged == sorted(merged, key=lambda event: event[1])
+    assert sorted(merged) == sorted({(event['EventId'], event['EventTime']) for stream in streams for event in stream})
+
+
+def test_merged_events_are_consumed_lazily():
+    consumed = []
+
+    def stream():
+        for minute in range(10):
+            consumed.append(minute)
+            yield _event(str(minute), minute)
+
+    merged = cloudtrail_helpers.merge_events(stream())
+    next(merged)
+
+    assert consumed == [0]
+
+
+def test_chronological_traverses_the_events_in_ascending_order():
+    events = [_event('c', 20), _event('b', 10), _event('a', 0)]
+
+    assert list(cloudtrail_helpers.chronological(events)) == events[::-1]
+    assert list(cloudtrail_helpers.chronological(events[::-1])) == events[::-1]
+    assert list(cloudtrail_helpers.chronological([])) == []
@@ -0,0 +1,142 @@
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+
+import botocore.session
+import pytest
+
+from botocore.exceptions import ClientError
+from botocore.serialize import create_serializer
+from assets.lambda_layer.python.helpers import cloudwatch_helpers
+
+NAMESPACE = 'FlexibilityScore'
+
+
+def _datum(i: int, dimension_size: int = 12) -> dict:
+    return {
+        'MetricName': 'vcpuh',
+        'Value': i * 1.5,
+        'Unit': 'None',
+        'Timestamp': datetime(2024, 3, 2, i % 24, tzinfo=timezone.utc),
+        'Dimensions': [
+            {'Name': 'accountId', 'Value': str(i).zfill(dimension_size)},
+            {'Name': 'resolution', 'Value': 'hourly & daily'}
+        ]
+    }
+
+
+def _request_size(batch: [dict]) -> int:
+    # Size of the body of the PutMetricData request with the query protocol, the largest one
+    service_model = botocore.session.get_session().get_service_model('cloudwatch')
+    request = create_serializer('query').serialize_to_request({'Namespace': NAMESPACE, 'MetricData': batch},
+                                                               service_model.operation_model('PutMetricData'))
+
+    return len(urlencode(request['body']))
+
+
+def _client_error(code: str) -> ClientError:
+    return ClientError({'Error': {'Code': code, 'Message': code}}, 'PutMetricData')
+
+
+def test_encoded_size_is_an_upper_bound_of_the_request_size():
+    batch = [_datum(i) for i in range(cloudwatch_helpers.MAX_METRIC_DATA_PER_REQUEST)]
+    size = cloudwatch_helpers._REQUEST_OVERHEAD_BYTES + sum(cloudwatch_helpers.encoded_size(datum) for datum in batch)
+
+    # The positions of the last data take 4 digits, as encoded_size assumes
+    assert _request_size(batch) <= size <= _request_size(batch) * 1.1
+
+
+def test_splits_batches_of_1000_data():
+    batches = cloudwatch_helpers.split_metric_data([_datum(i) for i in range(2500)])
+
+    assert [len(batch) for batch in batches] == [1000, 1000, 500]
+    assert [datum for batch in batches for datum in batch] == [_datum(i) for i in range(2500)]
+
+
+def test_splits_batches_of_1_mb():
+    # Data with long dimension values, of which less than 1000 fit in a request
+    data = [_datum(i, dimension_size=1000) for i in range(1500)]
+    batches = cloudwatch_helpers.split_metric_data(data)
+
+    assert len(batches) > 2
+    assert [datum for batch in batches for datum in batch] == data
+
+    for batch, following in zip(batches, batches[1:] + [[]]):
+        size = cloudwatch_helpers._REQUEST_OVERHEAD_BYTES + sum(map(cloudwatch_helpers.encoded_size, batch))
+
+        # Batches are as large as possible without exceeding the limit
+        assert _request_size(batch) <= size <= cloudwatch_helpers.MAX_REQUEST_BYTES
+        assert not following or size + cloudwatch_helpers.encoded_size(following[0]) > \
+            cloudwatch_helpers.MAX_REQUEST_BYTES
+
+
+@pytest.mark.parametrize('extra_bytes, expected', [(0, [3, 3, 1]), (-1, [2, 2, 2, 1])])
+def test_splits_at_the_exact_size_limit(extra_bytes, expected):
+    data = [_datum(i) for i in range(7)]
+    datum_size = cloudwatch_helpers.encoded_size(data[0])
+    max_bytes = cloudwatch_helpers._REQUEST_OVERHEAD_BYTES + 3 * datum_size + extra_bytes
+
+    assert [len(batch) for batch in cloudwatch_helpers.split_metric_data(data, max_bytes=max_bytes)] == expected
+
+
+def test_data_larger_than_the_limit_are_sent_alone():
+    data = [_datum(i) for i in range(3)]
+
+    assert cloudwatch_helpers.split_metric_data(data, max_bytes=10) == [[datum] for datum in data]
+
+
+@pytest.fixture
+def put_requests(monkeypatch):
+    """
+    Responses of the PutMetricData requests, which are exceptions to raise or None for successful requests
+    """
+
+    responses = []
+    sent = []
+
+    def put_metric_data(namespace: str, data: [dict]) -> dict:
+        sent.append(data)
+        response = responses.pop(0) if responses else None
+
+        if response is not None:
+            raise response
+
+        return {}
+
+    monkeypatch.setattr(cloudwatch_helpers, 'put_metric_data', put_metric_data)
+    monkeypatch.setattr(cloudwatch_helpers.time, 'sleep', lambda seconds: None)
+
+    return responses, sent
+
+
+def test_retries_throttled_requests(put_requests):
+    responses, sent = put_requests
+    responses += [_client_error('Throttling'), _client_error('InternalFailure')]
+
+    result = cloudwatch_helpers._put_batch(NAMESPACE, [_datum(0)])
+
+    assert result['metrics'] == 1
+    assert result['attempts'] == 3
+    assert len(sent) == 3
+
+
+def test_gives_up_after_the_maximum_attempts(put_requests):
+    responses, sent = put_requests
+    responses += [_client_error('Throttling')] * cloudwatch_helpers._MAX_ATTEMPTS
+
+    with pytest.raises(ClientError):
+        cloudwatch_helpers._put_batch(NAMESPACE, [_datum(0)])
+
+    assert len(sent) == cloudwatch_helpers._MAX_ATTEMPTS
+
+
+def test_client_errors_are_not_retried(put_requests):
+    responses, sent = put_requests
+    responses.append(_client_error('InvalidParameterValue'))
+
+    results = cloudwatch_helpers.put_metric_data_in_batches(NAMESPACE, [_datum(i) for i in range(1500)], 1)
+
+    # The failed batch is reported along with the rest
+    assert len(sent) == 2
+    assert isinstance(results[0]['error'], ClientError)
+    assert results[0]['metrics'] == 1000
+    assert results[1] == {'metrics': 500, 'attempts': 1, 'latency': results[1]['latency']}
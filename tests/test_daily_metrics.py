@@ -0,0 +1,105 @@
+import os
+import sys
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from assets.lambda_layer.python.constants import CW_DIMENSION_NAME_RESOLUTION, CW_DIMENSION_VALUE_HOURLY, \
+    CW_METRIC_NAME_VCPU_H
+from assets.lambda_layer.python.helpers import cloudwatch_helpers, s3_helpers
+from assets.lambda_layer.python.resources.interval_index import IntervalIndex
+
+# The handler imports its modules as the function does, from its own folder
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'assets', 'func_calculate_daily_metrics'))
+
+import index
+
+ACCOUNT_ID = '444455556666'
+
+
+class _Account:
+    """
+    Account without Instances, evaluated in the same way in any time window
+    """
+
+    interval_index = IntervalIndex({})
+
+    def at(self, tw):
+        return self
+
+
+@pytest.fixture
+def function(monkeypatch):
+    """
+    Runs the function with the metrics and the files that it publishes kept in memory
+    """
+
+    objects = {}
+    published = []
+
+    def put_metric_data_in_batches(namespace: str, data: [dict], max_workers: int) -> [dict]:
+        published.append(data)
+        return [{}]
+
+    monkeypatch.setenv('BUCKET', 'bucket')
+    monkeypatch.setattr(s3_helpers, 'upload_file_contents',
+                        lambda bucket, key, contents: objects.update({key: contents}))
+    monkeypatch.setattr(s3_helpers, 'prefix_exists',
+                        lambda bucket, prefix: any([key.startswith(prefix) for key in objects]))
+    monkeypatch.setattr(cloudwatch_helpers, 'put_metric_data_in_batches', put_metric_data_in_batches)
+
+    monkeypatch.setattr(index.account_manager, 'accounts', {ACCOUNT_ID: _Account()})
+    monkeypatch.setattr(index.account_manager, 'fetch_resources', lambda tw: {})
+    monkeypatch.setattr(index, 'calculate_daily_metrics', lambda tw, excluded_account_ids=(), accounts=None: {
+        ACCOUNT_ID: {CW_METRIC_NAME_VCPU_H: 0}
+    })
+
+    return objects, published
+
+
+def _hourly(data: [dict]) -> [dict]:
+    resolution = {'Name': CW_DIMENSION_NAME_RESOLUTION, 'Value': CW_DIMENSION_VALUE_HOURLY}
+
+    return [datum for datum in data if resolution in datum['Dimensions']]
+
+
+def test_hourly_metrics_are_published_by_the_first_run_of_the_day(function):
+    objects, published = function
+
+    for _ in range(3):
+        index.handler({}, None)
+
+    # Every run publishes the daily metrics, but only the first one publishes the 24 hours of every metric
+    assert [len(_hourly(data)) for data in published] == [24 * 3, 0, 0]
+    assert [len(data) - len(_hourly(data)) for data in published] == [1, 1, 1]
+    assert len([key for key in objects if key.endswith('/hourly.json')]) == 1
+
+
+def test_invalid_settings_fail_before_fetching_resources(function, monkeypatch):
+    objects, published = function
+    fetched = []
+    monkeypatch.setenv('SCORE_PROCESSES', 'four')
+    monkeypatch.setattr(index.account_manager, 'fetch_resources', lambda tw: fetched.append(tw) or {})
+
+    with pytest.raises(index.InvalidSetting, match='SCORE_PROCESSES'):
+        index.handler({}, None)
+
+    assert fetched == []
+    assert published == []
+
+
+def test_backfills_publish_the_hourly_metrics_of_the_days_without_them(function):
+    objects, published = function
+    yesterday = datetime.now() - timedelta(1)
+
+    index.handler({}, None)
+    index.backfill(yesterday - timedelta(2), yesterday, only_missing=False)
+
+    # The hourly metrics of the day published by the handler aren't published again
+    hours = sorted({datum['Timestamp'] for datum in _hourly(published[1])})
+
+    assert len(hours) == 48
+    assert hours[0].date() == (yesterday - timedelta(2)).date()
+    assert hours[-1].date() == (yesterday - timedelta(1)).date()
+    assert len([key for key in objects if key.endswith('/hourly.json')]) == 3
@@ -0,0 +1,120 @@
+import glob
+import gzip
+import json
+import os
+
+import pytest
+
+from hypothesis import HealthCheck, given, settings, strategies as st
+from assets.lambda_layer.python.helpers import decoder_helpers
+from assets.lambda_layer.python.resource_managers.instance_manager import InstanceManager
+from assets.lambda_layer.python.resource_managers.launch_template_manager import LaunchTemplateManager
+from assets.lambda_layer.python.resource_managers.asg_manager import ASGManager
+
+FIXTURE_FILES = os.path.join(os.path.dirname(__file__), 'fixtures', 'trail_logs', '**', '*.json.gz')
+
+# Payloads of real CloudTrail events, as returned by LookupEvents
+RECORDS = [
+    json.dumps(record)
+    for path in sorted(glob.glob(FIXTURE_FILES, recursive=True))
+    for record in json.loads(gzip.decompress(open(path, 'rb').read()))['Records']
+]
+
+# Failed events are discarded before decoding them
+VALID_RECORDS = [raw for raw in RECORDS if 'errorCode' not in json.loads(raw)]
+
+FIELDS = ('requestParameters', 'responseElements', 'serviceEventDetails', 'eventName')
+
+json_values = st.recursive(
+    st.none() | st.booleans() | st.integers() | st.floats(allow_nan=False) | st.text(),
+    lambda children: st.lists(children) | st.dictionaries(st.sampled_from(FIELDS) | st.text(), children),
+    max_leaves=20
+)
+
+
+@pytest.fixture(params=['fast', 'json'])
+def backend(request, monkeypatch):
+    if request.param == 'json':
+        monkeypatch.setattr(decoder_helpers, '_fast_json', None)
+
+    return request.param
+
+
+def _expected_fields(raw: str, fields: tuple) -> dict:
+    payload = json.loads(raw)
+
+    return {field: payload[field] for field in fields if field in payload}
+
+
+@pytest.mark.parametrize('raw', RECORDS)
+def test_decodes_the_fields_of_real_events(raw):
+    for fields in [FIELDS, ('responseElements',), ('eventName', 'requestParameters'), ('missing',)]:
+        assert decoder_helpers.decode_fields(raw, fields) == _expected_fields(raw, fields)
+
+
+@pytest.mark.parametrize('raw', [
+    # Keys with the same name in nested objects, before and after the top-level one
+    '{"requestParameters": {"responseElements": 1}, "responseElements": {"instancesSet": []}}',
+    '{"responseElements": null, "additionalEventData": {"responseElements": {"a": 1}}}',
+    # Only nested keys with the same name
+    '{"requestParameters": [{"responseElements": 1}], "eventName": "RunInstances"}',
+    # Keys inside strings, with escaped quotes and brackets
+    '{"userAgent": "\\"responseElements\\": {[", "responseElements": "}"}',
+    '{"errorMessage": "\\\\", "responseElements" : { "a" : "\\u00e9" } , "eventName":"x"}',
+    # Whitespace between the members
+    '{\n  "eventName" :\t"RunInstances",\n  "responseElements"\n:\n[1, 2]\n}',
+    '{}'
+])
+def test_decodes_only_top_level_fields(raw):
+    assert decoder_helpers.decode_fields(raw, FIELDS) == _expected_fields(raw, FIELDS)
+
+
+@settings(suppress_health_check=[HealthCheck.too_slow])
+@given(st.dictionaries(st.sampled_from(FIELDS) | st.text(), json_values), st.booleans())
+def test_decodes_the_same_fields_as_json_loads(payload, indent):
+    raw = json.dumps(payload, indent=2 if indent else None)
+
+    assert decoder_helpers.decode_fields(raw, FIELDS) == _expected_fields(raw, FIELDS)
+
+
+@pytest.mark.parametrize('raw', VALID_RECORDS)
+def test_decoders_extract_the_same_payload_as_json_loads(raw, backend):
+    decoder = InstanceManager.decoder | LaunchTemplateManager.decoder | ASGManager.decoder
+    event_name = json.loads(raw)['eventName']
+
+    assert decoder.decode(event_name, raw) == decoder.extract(event_name, json.loads(raw))
+
+
+def test_combined_decoders_keep_the_extractors_of_both(backend):
+    first = decoder_helpers.PayloadDecoder({'A': (('a',), lambda payload: {'a': payload['a']})})
+    second = decoder_helpers.PayloadDecoder({'B': (('b',), lambda payload: {'b': payload['b']['c']})})
+    decoder = first | second
+    raw = '{"a": 1, "b": {"c": 2, "d": 3}, "e": 4}'
+
+    assert set(decoder.extractors) == {'A', 'B'}
+    assert decoder.decode('A', raw) == {'a': 1}
+    assert decoder.decode('B', raw) == {'b': 2}
+
+    # Payloads of events without extractor are kept whole
+    assert decoder.decode('C', raw) == json.loads(raw)
+    assert decoder.extract('C', {'e': 4}) == {'e': 4}
+
+
+def test_extracting_an_extracted_payload_returns_the_same_payload():
+    for raw in VALID_RECORDS:
+        event_name = json.loads(raw)['eventName']
+        extracted = InstanceManager.decoder.extract(event_name, json.loads(raw))
+
+        assert InstanceManager.decoder.extract(event_name, extracted) == extracted
+
+
+@pytest.mark.parametrize('raw, expected', [
+    ('{"eventName": "RunInstances", "errorCode": "Client.UnauthorizedOperation"}', True),
+    ('{"eventName": "RunInstances", "responseElements": {}}', False),
+    # Error codes in nested objects or strings don't belong to the event
+    ('{"eventName": "RunInstances", "responseElements": {"errorCode": "x"}}', False),
+    ('{"eventName": "RunInstances", "errorMessage": "\\"errorCode\\": 1"}', False),
+    ('{"eventName": "RunInstances", "requestParameters": {"errorCode": 1}, "errorCode": "x"}', True)
+])
+def test_detects_failed_events(raw, expected):
+    assert decoder_helpers.has_error_code(raw) is expected
@@ -0,0 +1,63 @@
+import pytest
+
+from assets.lambda_layer.python.helpers import env_helpers
+from assets.lambda_layer.python.helpers.env_helpers import InvalidSetting
+
+
+@pytest.fixture(autouse=True)
+def clean_environment(monkeypatch):
+    for name in env_helpers.SETTINGS:
+        monkeypatch.delenv(name, raising=False)
+
+
+def test_settings_default_to_their_documented_values():
+    assert env_helpers.get('FETCH_WORKERS') == 16
+    assert env_helpers.get('PRUNE_IDLE_REGIONS') is True
+    assert env_helpers.get('STREAM_EVENTS') is False
+    assert env_helpers.get('FETCH_STRATEGY') == 'resource_type'
+
+    # All the defaults are valid
+    env_helpers.validate()
+
+
+@pytest.mark.parametrize('name, value, expected', [
+    ('SCORE_PROCESSES', '4', 4),
+    ('MAX_LOOKUP_SHARDS', '0', 0),
+    ('PIPELINE_EVENTS', 'TRUE', True),
+    ('PRUNE_IDLE_REGIONS', 'False', False),
+    ('FETCH_ENGINE', 'AsyncIO', 'asyncio'),
+    # Empty variables, e.g. left blank in the function configuration, take the default value
+    ('PUBLISH_WORKERS', '', 4)
+])
+def test_values_are_parsed_by_type(monkeypatch, name, value, expected):
+    monkeypatch.setenv(name, value)
+
+    assert env_helpers.get(name) == expected
+
+
+@pytest.mark.parametrize('name, value', [
+    ('SCORE_PROCESSES', 'four'),
+    ('SCORE_PROCESSES', '0'),
+    ('MAX_LOOKUP_SHARDS', '-1'),
+    ('FETCH_WORKERS', '1.5'),
+    ('STREAM_EVENTS', 'yes'),
+    ('FETCH_STRATEGY', 'trail-logs')
+])
+def test_invalid_values_are_rejected(monkeypatch, name, value):
+    monkeypatch.setenv(name, value)
+
+    with pytest.raises(InvalidSetting, match=name):
+        env_helpers.get(name)
+
+
+def test_validate_reports_all_the_invalid_settings(monkeypatch):
+    monkeypatch.setenv('SCORE_PROCESSES', 'four')
+    monkeypatch.setenv('FETCH_ENGINE', 'processes')
+    monkeypatch.setenv('FETCH_WORKERS', '8')
+
+    with pytest.raises(InvalidSetting) as error:
+        env_helpers.validate()
+
+    assert 'SCORE_PROCESSES' in str(error.value)
+    assert 'FETCH_ENGINE' in str(error.value)
+    assert 'FETCH_WORKERS' not in str(error.value)
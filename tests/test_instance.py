@@ -0,0 +1,140 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from assets.lambda_layer.python.constants import EVENT_CODE_PENDING, EVENT_CODE_RUNNING
+from assets.lambda_layer.python.helpers.date_helpers import TimeWindow
+from assets.lambda_layer.python.resources.instance import Instance
+from tests.test_interval_index import DAY, EVENT_CODE_SHUTTING_DOWN, EVENT_CODE_STOPPED, EVENT_CODE_STOPPING
+
+# Instances are m5.large, which count 8 vCPU hours per hour running
+VCPU_H_PER_HOUR = 8
+NEXT_DAY = TimeWindow(DAY.start_time + timedelta(1), DAY.end_time + timedelta(1))
+
+_STATES = {
+    'StopInstances': (EVENT_CODE_RUNNING, EVENT_CODE_STOPPING),
+    'StartInstances': (EVENT_CODE_STOPPED, EVENT_CODE_PENDING),
+    'TerminateInstances': (EVENT_CODE_RUNNING, EVENT_CODE_SHUTTING_DOWN)
+}
+
+
+def _instance(launched_at: datetime, *events: (str, datetime)) -> Instance:
+    """
+    Builds an Instance launched at a time, followed by Stop, Start and Terminate events at other times
+    """
+
+    instance = Instance({'EventName': 'RunInstances', 'EventTime': launched_at},
+                        {'instanceId': 'i-0', 'instanceType': 'm5.large'}, DAY)
+
+    for name, time in events:
+        previous, current = _STATES[name]
+        instance.hydrate({'EventName': name, 'EventTime': time},
+                         {'previousState': {'code': previous}, 'currentState': {'code': current}})
+
+    return instance
+
+
+def _windows(instance: Instance) -> [tuple]:
+    return [(window.start_time, window.end_time) for window in instance.running_windows]
+
+
+def _hours(hours: float) -> datetime:
+    return DAY.start_time + timedelta(hours=hours)
+
+
+def test_instances_without_events_in_the_time_window_run_during_all_or_none_of_it():
+    running = _instance(_hours(-12))
+    stopped = _instance(_hours(-12), ('StopInstances', _hours(-6)))
+    started = _instance(_hours(-12), ('StopInstances', _hours(-6)), ('StartInstances', _hours(-1)))
+
+    assert running._find_running_windows(DAY) == [(None, None)]
+    assert _windows(running) == [(DAY.start_time, None)]
+    assert running.vcpu_h == 24 * VCPU_H_PER_HOUR
+
+    assert stopped._find_running_windows(DAY) == []
+    assert stopped.vcpu_h == 0
+
+    # The state is given by the last event before the time window
+    assert started._find_running_windows(DAY) == [(None, None)]
+
+
+@pytest.mark.parametrize('seconds, windows', [
+    # Events at the start of the time window are in it
+    (0, [(0, None)]),
+    # Events at the end of the time window are in it, and events one second later are not
+    (86399, [(0, None)]),
+    (86400, []),
+])
+def test_events_at_the_boundaries_of_the_time_window(seconds, windows):
+    launched_at = DAY.start_time + timedelta(seconds=seconds)
+    instance = _instance(launched_at)
+
+    assert instance._find_running_windows(DAY) == windows
+
+    if windows:
+        assert _windows(instance) == [(launched_at, None)]
+
+        # The last second of the time window is counted
+        assert instance.vcpu_h == (86400 - seconds) * 4 // 3600 * 2
+
+
+def test_stops_at_the_boundaries_of_the_time_window():
+    stopped_at_start = _instance(_hours(-12), ('StopInstances', DAY.start_time))
+    stopped_at_end = _instance(_hours(-12), ('StopInstances', DAY.end_time))
+    stopped_next_day = _instance(_hours(-12), ('StopInstances', NEXT_DAY.start_time))
+
+    # An Instance stopped at the start of the time window didn't run during it
+    assert stopped_at_start._find_running_windows(DAY) == [(None, 1)]
+    assert stopped_at_start.vcpu_h == 0
+
+    assert stopped_at_end._find_running_windows(DAY) == [(None, 1)]
+    assert _windows(stopped_at_end) == [(DAY.start_time, DAY.end_time)]
+    assert stopped_next_day._find_running_windows(DAY) == [(None, None)]
+
+
+def test_running_windows_between_events_in_the_time_window():
+    instance = _instance(_hours(-12), ('StopInstances', _hours(2)), ('StartInstances', _hours(5)),
+                         ('StopInstances', _hours(7)), ('StartInstances', _hours(20)))
+
+    assert instance._find_running_windows(DAY) == [(None, 1), (2, 3), (4, None)]
+    assert _windows(instance) == [(DAY.start_time, _hours(2)), (_hours(5), _hours(7)), (_hours(20), None)]
+    assert instance.vcpu_h == int((2 + 2 + 4) * 3600 + 1) * 4 // 3600 * 2
+
+
+def test_at_returns_none_for_instances_outside_the_time_window():
+    assert _instance(NEXT_DAY.start_time).at(DAY) is None
+    assert _instance(_hours(-12), ('TerminateInstances', _hours(-1))).at(DAY) is None
+
+    # Instances launched at the end of the time window, or terminated at its start, are evaluated in it
+    assert _instance(DAY.end_time).at(DAY) is not None
+    assert _instance(_hours(-12), ('TerminateInstances', DAY.start_time)).at(DAY).vcpu_h == 0
+
+
+def test_at_clips_the_running_windows_to_the_time_window():
+    instance = _instance(_hours(-12), ('StopInstances', _hours(6)), ('StartInstances', _hours(18)),
+                         ('TerminateInstances', _hours(30)))
+    previous_day = TimeWindow(DAY.start_time - timedelta(1), DAY.end_time - timedelta(1))
+
+    assert _windows(instance.at(previous_day)) == [(_hours(-12), None)]
+    assert instance.at(previous_day).vcpu_h == int(12 * 3600 + 1) * 4 // 3600 * 2
+
+    assert _windows(instance.at(NEXT_DAY)) == [(NEXT_DAY.start_time, _hours(30))]
+    assert instance.at(NEXT_DAY).vcpu_h == 6 * VCPU_H_PER_HOUR
+
+
+def test_at_shares_the_lifecycle_events_and_keeps_the_results_of_the_original():
+    instance = _instance(_hours(-12), ('StopInstances', _hours(6)))
+    windows = _windows(instance)
+    vcpu_h = instance.vcpu_h
+
+    evaluated = instance.at(NEXT_DAY)
+
+    assert evaluated is not instance
+    assert evaluated._event_times is instance._event_times
+    assert _windows(evaluated) == []
+    assert evaluated.vcpu_h == 0
+
+    # Results calculated for the time window of the original Instance aren't replaced, nor recalculated
+    assert instance.running_windows is not evaluated.running_windows
+    assert _windows(instance) == windows == [(DAY.start_time, _hours(6))]
+    assert instance.vcpu_h == vcpu_h == 6 * VCPU_H_PER_HOUR
@@ -0,0 +1,52 @@
+from types import SimpleNamespace
+
+import pytest
+
+from hypothesis import HealthCheck, given, settings, strategies as st
+from assets.lambda_layer.python.resources import instance_table
+from assets.lambda_layer.python.resources.instance import NORMALIZATION_TABLE
+from assets.func_calculate_daily_metrics.scores import launch_template_score, policy_score
+
+SCALING_POLICY_TYPES = [None, policy_score.SP_TYPE_PREDICTIVE, policy_score.SP_TYPE_TARGET_TRACKING,
+                        policy_score.SP_TYPE_SIMPLE, policy_score.SP_TYPE_STEP, 'UnknownScaling']
+
+
+def _instance(asg_name, lt, running_time, size):
+    # vCPU hours are calculated as Instance does, which are floats for the sizes with less than a vCPU
+    return SimpleNamespace(asg_name=asg_name, lt=lt, attrs=SimpleNamespace(size=size),
+                           vcpu_h=running_time * NORMALIZATION_TABLE[size] // 3600 * 2)
+
+
+instances_strategy = st.lists(st.builds(
+    _instance,
+    st.one_of(st.none(), st.sampled_from(['asg-a', 'asg-b', 'asg-c', 'asg-without-data'])),
+    st.one_of(st.none(), st.just(SimpleNamespace(id='lt-0123', version=1))),
+    st.integers(0, 86400 * 31),
+    st.sampled_from(list(NORMALIZATION_TABLE))
+), max_size=50).map(lambda instances: dict(enumerate(instances)))
+
+asg_strategy = st.dictionaries(st.sampled_from(['asg-a', 'asg-b', 'asg-c']),
+                               st.sampled_from(SCALING_POLICY_TYPES).map(lambda sp: SimpleNamespace(sp=sp)))
+
+
+# The fixture only selects the implementation of the columns, which doesn't change between examples
+@settings(suppress_health_check=[HealthCheck.function_scoped_fixture])
+@given(instances=instances_strategy, asg_data=asg_strategy)
+def test_aggregates_match_instance_loops(numpy_backend, instances, asg_data):
+    table = instance_table.InstanceTable(instances, asg_data)
+
+    assert len(table) == len(instances)
+    assert table.total_vcpu_h() == sum(instance.vcpu_h for instance in instances.values())
+    assert launch_template_score.calculate(instances, table) == launch_template_score.calculate(instances)
+    assert policy_score.calculate(instances, asg_data, table) == policy_score.calculate(instances, asg_data)
+
+
+@pytest.mark.parametrize('size', ['nano', 'micro'])
+def test_fractional_vcpu_h(numpy_backend, size):
+    instances = {0: _instance('asg-a', None, 3 * 3600, size), 1: _instance(None, None, 5 * 3600, size)}
+    table = instance_table.InstanceTable(instances, {})
+
+    assert table.total_vcpu_h() == sum(instance.vcpu_h for instance in instances.values())
+    assert table.lc_vcpu_h() == instances[0].vcpu_h
+    assert table.lt_vcpu_h() == 0
+    assert table.count_by_policy_type() == {}
@@ -0,0 +1,138 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from hypothesis import HealthCheck, given, settings, strategies as st
+from assets.lambda_layer.python.constants import EVENT_CODE_PENDING, EVENT_CODE_RUNNING
+from assets.lambda_layer.python.helpers.date_helpers import TimeWindow
+from assets.lambda_layer.python.resources import interval_index
+from assets.lambda_layer.python.resources.instance import Instance, NORMALIZATION_TABLE
+from assets.func_calculate_daily_metrics.scores import scaling_score
+
+EVENT_CODE_STOPPING = 64
+EVENT_CODE_STOPPED = 80
+EVENT_CODE_SHUTTING_DOWN = 32
+
+# Events happen every 15 minutes at most, so that many of them are tied with each other and with the hours of the day
+STEP = 900
+BASE_TIME = datetime(2024, 3, 1, tzinfo=timezone.utc)
+DAY = TimeWindow(datetime(2024, 3, 2, tzinfo=timezone.utc), datetime(2024, 3, 2, 23, 59, 59, tzinfo=timezone.utc))
+
+
+def _time(steps: int) -> datetime:
+    return BASE_TIME + timedelta(seconds=steps * STEP)
+
+
+def _instance(instance_id: str, launched_at: int, gaps: [int], terminated: bool, size: str) -> Instance:
+    """
+    Builds an Instance launched at a time and then stopped and started again after every gap, which can be terminated
+    after the last gap
+    """
+
+    instance = Instance({'EventName': 'RunInstances', 'EventTime': _time(launched_at)},
+                        {'instanceId': instance_id, 'instanceType': f'm5.{size}'}, DAY)
+    time = launched_at
+    running = True
+
+    for gap in gaps:
+        time += gap
+        name, previous, current = ('StopInstances', EVENT_CODE_RUNNING, EVENT_CODE_STOPPING) if running else \
+            ('StartInstances', EVENT_CODE_STOPPED, EVENT_CODE_PENDING)
+        instance.hydrate({'EventName': name, 'EventTime': _time(time)},
+                         {'previousState': {'code': previous}, 'currentState': {'code': current}})
+        running = not running
+
+    if terminated:
+        instance.hydrate({'EventName': 'TerminateInstances', 'EventTime': _time(time + 1)}, {
+            'previousState': {'code': EVENT_CODE_RUNNING if running else EVENT_CODE_STOPPED},
+            'currentState': {'code': EVENT_CODE_SHUTTING_DOWN}
+        })
+
+    return instance
+
+
+# Instances are launched and terminated during the day before, the day itself and the day after
+instances_strategy = st.lists(st.tuples(
+    st.integers(0, 3 * 96),
+    st.lists(st.integers(0, 40), max_size=8),
+    st.booleans(),
+    st.sampled_from(list(NORMALIZATION_TABLE))
+), max_size=10).map(lambda instances: {
+    f'i-{i}': _instance(f'i-{i}', *instance) for i, instance in enumerate(instances)
+})
+
+
+def _at(instances: dict, tw: TimeWindow) -> dict:
+    evaluated = {instance_id: instance.at(tw) for instance_id, instance in instances.items()}
+
+    return {instance_id: instance for instance_id, instance in evaluated.items() if instance is not None}
+
+
+def _concurrency_at(instances: dict, time: datetime) -> int:
+    # Running Instances once all the start and end times at a time are counted
+    return sum(1 for instance in instances.values() for window in instance.running_windows
+               if window.start_time <= time and (window.end_time is None or window.end_time > time))
+
+
+# The fixture only selects the implementation of the index, which doesn't change between examples
+@settings(suppress_health_check=[HealthCheck.function_scoped_fixture], max_examples=300)
+@given(instances=instances_strategy)
+def test_daily_metrics_match_instances(numpy_backend, instances):
+    index = interval_index.IntervalIndex(instances)
+    day_instances = _at(instances, DAY)
+
+    assert index.vcpu_h(DAY) == sum(instance.vcpu_h for instance in day_instances.values())
+    assert index.concurrency(DAY) == scaling_score._sweep(day_instances)
+
+
+@settings(suppress_health_check=[HealthCheck.function_scoped_fixture], max_examples=300)
+@given(instances=instances_strategy)
+def test_hourly_buckets_match_instances(numpy_backend, instances):
+    index = interval_index.IntervalIndex(instances)
+    day_instances = _at(instances, DAY)
+    buckets = index.buckets(DAY)
+
+    assert [start for start, _, _, _ in buckets] == [DAY.start_time + timedelta(hours=hour) for hour in range(24)]
+
+    for start, min_i, max_i, vcpu_h in buckets:
+        hour = TimeWindow(start, start + timedelta(seconds=3599))
+
+        # Concurrency at the start of the hour, and after every start or end time during the hour
+        times = [start] + [time for instance in day_instances.values() for window in instance.running_windows
+                           for time in (window.start_time, window.end_time)
+                           if time is not None and hour.start_time <= time <= hour.end_time]
+        levels = [_concurrency_at(day_instances, time) for time in times]
+
+        assert (min_i, max_i) == (min(levels), max(levels))
+
+        # vCPU hours aren't rounded down by Instance within the buckets
+        running_times = {instance_id: sum((hour.end_time + timedelta(seconds=1) if w.end_time is None else w.end_time)
+                                          .timestamp() - w.start_time.timestamp()
+                                          for w in instance.running_windows_for(hour))
+                         for instance_id, instance in day_instances.items()}
+
+        assert vcpu_h == pytest.approx(sum(running_time * NORMALIZATION_TABLE[instances[i].attrs.size] * 2 / 3600
+                                           for i, running_time in running_times.items()))
+
+    # A day of buckets adds up to at least the daily vCPU hours, which are rounded down by Instance
+    assert sum(vcpu_h for _, _, _, vcpu_h in buckets) >= index.vcpu_h(DAY) - 1e-6
+
+
+# Periods that divide the day, that leave a shorter last bucket, and a single bucket
+@pytest.mark.skipif(interval_index.np is None, reason='NumPy is not installed')
+@settings(max_examples=300)
+@given(instances=instances_strategy, period=st.sampled_from([900, 3600, 5000, 86400]))
+def test_vectorized_sweep_matches_python_sweep(instances, period):
+    index = interval_index.IntervalIndex(instances)
+    start, end = int(DAY.start_time.timestamp()), int(DAY.end_time.timestamp())
+    starts, ends, owners = index._find(start, end)
+    edges = [min(k * period, end + 1 - start) for k in range(-(-(end + 1 - start) // period) + 1)]
+
+    if len(starts) == 0:
+        return
+
+    min_i, max_i, vcpu_h = index._sweep_buckets(starts.tolist(), ends.tolist(), owners.tolist(), start, end, period,
+                                                edges)
+
+    assert index._sweep_buckets_vectorized(starts, ends, owners, start, end, period, edges) == \
+        (min_i, max_i, pytest.approx(vcpu_h))
@@ -0,0 +1,30 @@
+from types import SimpleNamespace
+
+from assets.func_calculate_daily_metrics.scores import launch_template_score
+
+LT = SimpleNamespace(id='lt-0123', version=1)
+
+
+def _instance(asg_name, lt, vcpu_h):
+    return SimpleNamespace(asg_name=asg_name, lt=lt, vcpu_h=vcpu_h)
+
+
+def test_ratio_of_launch_template_to_launch_configuration_vcpu_hours():
+    instances = {
+        'i-lt': _instance('asg-lt', LT, 30),
+        'i-lc': _instance('asg-lc', None, 10),
+        # Instances outside ASGs count for neither
+        'i-standalone': _instance(None, None, 60),
+        'i-standalone-lt': _instance(None, LT, 60)
+    }
+
+    assert launch_template_score.calculate(instances) == 7.5
+
+
+def test_only_launch_configurations():
+    assert launch_template_score.calculate({'i-lc': _instance('asg-lc', None, 10)}) == 0
+
+
+def test_no_instances_in_asgs():
+    assert launch_template_score.calculate({}) == 0
+    assert launch_template_score.calculate({'i-standalone': _instance(None, None, 10)}) == 0
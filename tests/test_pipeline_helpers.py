@@ -0,0 +1,102 @@
+import threading
+import time
+
+import pytest
+
+from assets.lambda_layer.python.helpers import pipeline_helpers
+
+
+def _double(batch: list) -> list:
+    return [item * 2 for item in batch]
+
+
+def test_processes_all_the_items_in_order():
+    results, counters = pipeline_helpers.run(range(1000), _double, 2, 3, batch_size=7)
+
+    assert results == [item * 2 for item in range(1000)]
+    assert counters.producer.items == counters.consumer.items == 1000
+
+
+def test_every_run_returns_its_own_counters():
+    _, first = pipeline_helpers.run(range(100), _double, 2, 2)
+    _, second = pipeline_helpers.run(range(30), _double, 2, 2)
+
+    assert (first.producer.items, second.producer.items) == (100, 30)
+
+    # Counters of several runs are only added up explicitly, e.g. by account
+    total = pipeline_helpers.PipelineCounters()
+    total.merge(first)
+    total.merge(second)
+
+    assert total.producer.items == total.consumer.items == 130
+    assert total.producer.stats()['items'] == 130
+
+
+def test_consuming_the_items_blocks_when_the_queue_is_full():
+    consumed = []
+    release = threading.Event()
+
+    def items():
+        for item in range(1000):
+            consumed.append(item)
+            yield item
+
+    def process(batch: list) -> list:
+        release.wait(5)
+        return batch
+
+    result = []
+    thread = threading.Thread(target=lambda: result.append(pipeline_helpers.run(items(), process, 2, 1, batch_size=10)))
+    thread.start()
+
+    # The worker holds a batch, the queue holds 2 more, and the producer waits to put a 4th one
+    deadline = time.monotonic() + 5
+
+    while len(consumed) < 40 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    time.sleep(0.2)
+
+    assert len(consumed) == 40
+
+    release.set()
+    thread.join(5)
+
+    assert result[0][0] == list(range(1000))
+    assert result[0][1].producer.blocked_time > 0
+
+
+def test_exceptions_of_the_workers_are_raised_once_all_the_items_are_consumed():
+    consumed = []
+
+    def items():
+        for item in range(100):
+            consumed.append(item)
+            yield item
+
+    def process(batch: list) -> list:
+        if 50 in batch:
+            raise ValueError('50')
+
+        return batch
+
+    threads = threading.active_count()
+
+    with pytest.raises(ValueError, match='50'):
+        pipeline_helpers.run(items(), process, 2, 2, batch_size=10)
+
+    assert len(consumed) == 100
+    assert threading.active_count() == threads
+
+
+def test_exceptions_consuming_the_items_stop_the_workers():
+    def items():
+        yield from range(25)
+        raise ConnectionError('page')
+
+    threads = threading.active_count()
+
+    with pytest.raises(ConnectionError, match='page'):
+        pipeline_helpers.run(items(), _double, 2, 2, batch_size=10)
+
+    assert threading.active_count() == threads
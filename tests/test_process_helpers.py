@@ -0,0 +1,81 @@
+import asyncio
+import os
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from assets.lambda_layer.python.helpers import pipeline_helpers, process_helpers
+from assets.lambda_layer.python.resource_managers.scheduler import WorkStealingScheduler
+
+
+def _fail_on_three(item: int) -> int:
+    if item == 3:
+        raise ValueError('three')
+
+    return item
+
+
+def test_forks_processes_and_keeps_the_order_of_the_items():
+    results = process_helpers.map_in_processes(lambda item: (item * 2, os.getpid()), list(range(10)), 3)
+
+    assert [result for result, _ in results] == [item * 2 for item in range(10)]
+
+    # Items are distributed among the processes in round-robin
+    pids = [pid for _, pid in results]
+
+    assert os.getpid() not in pids
+    assert len(set(pids)) == 3
+    assert pids[:3] == pids[3:6]
+
+
+def test_raises_the_exceptions_of_the_function():
+    with pytest.raises(process_helpers.WorkerProcessError, match='ValueError: three'):
+        process_helpers.map_in_processes(_fail_on_three, list(range(6)), 2)
+
+
+def test_raises_when_a_process_dies_without_results():
+    with pytest.raises(process_helpers.WorkerProcessError, match='exited with code 3'):
+        process_helpers.map_in_processes(lambda item: os._exit(3) if item == 1 else item, list(range(4)), 2)
+
+
+def test_stops_waiting_for_stuck_processes():
+    start = time.monotonic()
+
+    with pytest.raises(process_helpers.WorkerProcessError, match='within 0.5 seconds'):
+        process_helpers.map_in_processes(lambda item: time.sleep(30 if item else 0), list(range(4)), 2, timeout=0.5)
+
+    # Stuck processes are terminated instead of joined
+    assert time.monotonic() - start < 10
+
+
+def test_calls_the_function_in_this_process_while_other_threads_are_alive():
+    stop = threading.Event()
+    thread = threading.Thread(target=stop.wait)
+    thread.start()
+
+    try:
+        assert not process_helpers.can_fork()
+        assert process_helpers.map_in_processes(lambda item: os.getpid(), list(range(4)), 2) == [os.getpid()] * 4
+    finally:
+        stop.set()
+        thread.join()
+
+
+def test_helpers_that_start_threads_join_them_before_returning():
+    scheduler = WorkStealingScheduler(4)
+
+    for i in range(8):
+        scheduler.submit(i, time.sleep, 0.01)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(time.sleep, [0.01] * 8))
+
+    scheduler.run()
+    pipeline_helpers.run(range(100), lambda batch: batch, 2, 4, batch_size=10)
+    asyncio.run(asyncio.to_thread(time.sleep, 0.01))
+
+    # Metrics are calculated after fetching resources with these helpers, so their processes can be forked
+    assert process_helpers.can_fork()
@@ -0,0 +1,132 @@
+import json
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from assets.lambda_layer.python.constants import EVENTS_PER_LOOKUP_SHARD
+from assets.lambda_layer.python.helpers.cache_helpers import CachedEvents
+from assets.lambda_layer.python.helpers.date_helpers import TimeWindow
+from assets.lambda_layer.python.resource_managers.instance_manager import InstanceManager
+
+NOW = datetime.now(tz=timezone.utc)
+
+
+class TimelineManager(InstanceManager):
+    """
+    Instance manager whose lookups return the events of a timeline instead of requesting them to CloudTrail
+    """
+
+    def __init__(self, timeline: [datetime], **kwargs):
+        super().__init__(TimeWindow(NOW - timedelta(1), NOW), 'eu-west-1', **kwargs)
+
+        self.timeline = timeline
+        self.requested_ranges = []
+
+    def _request_events(self, attribute_key: str, attribute_value: str, search_exp: str, start_time: datetime,
+                        end_time: datetime, shards: int = 1):
+        self.requested_ranges.append((start_time, end_time))
+
+        # CloudTrail returns the most recent events first, including the ones at both ends of the time range
+        return [{
+            'EventId': time.isoformat(),
+            'EventName': 'StopInstances',
+            'EventTime': time,
+            'CloudTrailEvent': json.dumps({'responseElements': {'instancesSet': {'items': []}}})
+        } for time in sorted(self.timeline, reverse=True) if start_time <= time <= end_time]
+
+
+def test_streams_events_from_the_oldest_slice(monkeypatch):
+    monkeypatch.setenv('MAX_LOOKUP_SHARDS', '2')
+
+    manager = TimelineManager([NOW - timedelta(days) for days in range(85, 0, -7)], stream=True)
+    events = manager._stream_events('ResourceType', 'AWS::EC2::Instance')
+
+    # Slices are only requested as events are consumed, two at a time
+    first = next(events)
+
+    assert first['EventTime'] == NOW - timedelta(85)
+    assert 'CloudTrailEvent' not in first
+    assert len(manager.requested_ranges) <= 2
+
+    assert [event['EventTime'] for event in [first, *events]] == sorted(manager.timeline)
+
+    # Consecutive slices cover the last 90 days
+    ranges = sorted(manager.requested_ranges)
+
+    assert len(ranges) == 13
+    assert all([previous[1] == current[0] for previous, current in zip(ranges, ranges[1:])])
+    assert ranges[0][0] - (NOW - timedelta(90)) < timedelta(minutes=1)
+    assert ranges[-1][1] == NOW
+
+
+def test_streamed_events_at_the_boundary_of_two_slices_are_returned_once(monkeypatch):
+    monkeypatch.setenv('MAX_LOOKUP_SHARDS', '4')
+
+    manager = TimelineManager([], stream=True)
+    list(manager._stream_events('ResourceType', 'AWS::EC2::Instance'))
+
+    # Events at the end of a slice are also returned by the following one
+    ranges = sorted(manager.requested_ranges)
+    manager.timeline = [ranges[0][1], ranges[1][1]]
+    manager.requested_ranges = []
+
+    assert [event['EventTime'] for event in manager._stream_events('ResourceType', 'AWS::EC2::Instance')] == \
+        manager.timeline
+
+
+@pytest.mark.parametrize('max_shards, days, expected', [
+    # Lookups without cached events are split by weeks, up to the maximum number of shards
+    ('4', 90, 4),
+    ('20', 90, 13),
+    ('20', 7, 1),
+    ('20', 8, 2),
+    ('20', 0.01, 1),
+    # Lookups aren't split if the maximum is 1 or less
+    ('1', 90, 1),
+    ('0', 90, 1)
+])
+def test_cold_lookups_are_split_by_days(monkeypatch, max_shards, days, expected):
+    monkeypatch.setenv('MAX_LOOKUP_SHARDS', max_shards)
+
+    assert InstanceManager._count_lookup_shards(None, NOW - timedelta(90), NOW - timedelta(days), NOW) == expected
+
+    # Entries that don't cover any time yet tell nothing about the density of events
+    entry = CachedEvents([{}] * 10000, NOW - timedelta(90))
+
+    assert InstanceManager._count_lookup_shards(entry, NOW - timedelta(90), NOW - timedelta(days), NOW) == expected
+
+
+@pytest.mark.parametrize('max_shards, cached_events, expected', [
+    # 90 days of cached events, of which the last day is fetched
+    ('8', 0, 1),
+    ('8', 90 * EVENTS_PER_LOOKUP_SHARD, 1),
+    ('8', 90 * EVENTS_PER_LOOKUP_SHARD + 90, 2),
+    ('8', 90 * EVENTS_PER_LOOKUP_SHARD * 3, 3),
+    ('8', 90 * EVENTS_PER_LOOKUP_SHARD * 100, 8),
+    ('1', 90 * EVENTS_PER_LOOKUP_SHARD * 100, 1)
+])
+def test_lookups_are_split_by_the_density_of_the_cached_events(monkeypatch, max_shards, cached_events, expected):
+    monkeypatch.setenv('MAX_LOOKUP_SHARDS', max_shards)
+
+    horizon = NOW - timedelta(91)
+    entry = CachedEvents([{}] * cached_events, NOW - timedelta(1))
+
+    assert InstanceManager._count_lookup_shards(entry, horizon, NOW - timedelta(1), NOW) == expected
+
+
+def test_pipelined_events_are_counted_by_manager(monkeypatch):
+    monkeypatch.setenv('PIPELINE_EVENTS', 'true')
+
+    manager = TimelineManager([NOW - timedelta(hours=hours) for hours in range(1, 120)])
+    other = TimelineManager([NOW - timedelta(hours=1)])
+
+    for start_time, end_time in [(NOW - timedelta(1), NOW), (NOW - timedelta(5), NOW - timedelta(1))]:
+        manager._compact_events(manager._request_events('ResourceType', 'AWS::EC2::Instance', 'Events[]', start_time,
+                                                        end_time))
+
+    other._compact_events(other._request_events('ResourceType', 'AWS::EC2::Instance', 'Events[]', NOW - timedelta(1),
+                                                NOW))
+
+    assert manager.pipeline_counters.producer.items == manager.pipeline_counters.consumer.items == 120
+    assert other.pipeline_counters.producer.items == 1
@@ -0,0 +1,51 @@
+from types import SimpleNamespace
+
+import pytest
+
+from hypothesis import HealthCheck, given, settings, strategies as st
+from assets.lambda_layer.python.resources import interval_index
+from assets.func_calculate_daily_metrics.scores import scaling_score
+
+
+def _window(start: int, duration: int, is_open: bool):
+    # Windows that last until the end of the time window don't have end time
+    return SimpleNamespace(start_time=start, end_time=None if is_open else start + duration)
+
+
+# Start times in a short range are often tied, and durations of 0 make windows that end when they start
+windows_strategy = st.builds(_window, st.integers(0, 20), st.integers(0, 5), st.booleans())
+instances_strategy = st.lists(st.lists(windows_strategy, max_size=4), max_size=12).map(
+    lambda windows: {f'i-{i}': SimpleNamespace(running_windows=w) for i, w in enumerate(windows)}
+)
+
+
+def _boundaries(instances: dict) -> (list, list):
+    windows = [window for _, instance in instances.items() for window in instance.running_windows]
+
+    return [w.start_time for w in windows], [w.end_time for w in windows if w.end_time is not None]
+
+
+# The fixture only selects the implementation of the sweep, which doesn't change between examples
+@settings(suppress_health_check=[HealthCheck.function_scoped_fixture], max_examples=500)
+@given(instances=instances_strategy)
+def test_sweep_matches_instance_sweep(numpy_backend, instances):
+    assert interval_index.sweep(*_boundaries(instances)) == scaling_score._sweep(instances)
+
+
+@pytest.mark.parametrize('windows, expected', [
+    # No running windows
+    ([], (None, 0)),
+    # Tied start times increment the minimum
+    ([(0, 0, True), (0, 0, True), (0, 0, True)], (3, 3)),
+    ([(0, 5, False), (0, 5, False), (0, 5, False)], (0, 3)),
+    # Windows that end when they start
+    ([(3, 0, False), (3, 0, False), (1, 4, True)], (1, 3)),
+    # Windows open until the end of the time window
+    ([(0, 0, True), (2, 0, True), (2, 0, True)], (2, 3)),
+    # An end time tied with a later start time
+    ([(0, 4, False), (4, 2, False), (4, 0, True)], (1, 3)),
+])
+def test_sweep_edge_cases(numpy_backend, windows, expected):
+    instances = {'i-0': SimpleNamespace(running_windows=[_window(*window) for window in windows])}
+
+    assert interval_index.sweep(*_boundaries(instances)) == scaling_score._sweep(instances) == expected
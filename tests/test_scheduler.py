@@ -0,0 +1,99 @@
+import threading
+
+from assets.lambda_layer.python.resource_managers.scheduler import WorkStealingScheduler
+
+
+def _run(scheduler: WorkStealingScheduler) -> list:
+    # Runs the scheduler in another thread, so that a test fails instead of hanging if the workers never finish
+    result = []
+    thread = threading.Thread(target=lambda: result.append(scheduler.run()))
+    thread.start()
+    thread.join(10)
+
+    assert not thread.is_alive(), 'The workers did not finish'
+
+    return result[0]
+
+
+def test_tasks_spawned_by_a_task_run_in_its_worker_from_the_most_recent():
+    scheduler = WorkStealingScheduler(1)
+    executed = []
+
+    def spawn() -> None:
+        for i in range(3):
+            scheduler.submit(i, executed.append, i)
+
+    scheduler.submit('parent', spawn)
+
+    assert _run(scheduler) == []
+    assert executed == [2, 1, 0]
+
+
+def test_idle_workers_steal_the_oldest_tasks():
+    scheduler = WorkStealingScheduler(2)
+    executed = []
+    stolen = threading.Event()
+
+    def child(i: int, parent: str) -> None:
+        executed.append((i, threading.current_thread().name != parent))
+
+        if threading.current_thread().name != parent:
+            stolen.set()
+
+    def parent() -> None:
+        name = threading.current_thread().name
+
+        for i in range(4):
+            scheduler.submit(i, child, i, name)
+
+        # The other worker is idle, and is woken up by the new tasks
+        assert stolen.wait(5)
+
+    scheduler.submit('parent', parent)
+
+    assert _run(scheduler) == []
+    assert sorted([i for i, _ in executed]) == [0, 1, 2, 3]
+    assert executed[0] == (0, True)
+
+
+def test_collects_the_errors_of_the_tasks():
+    scheduler = WorkStealingScheduler(3)
+    executed = []
+
+    def fail(i: int) -> None:
+        raise ValueError(i)
+
+    def spawn() -> None:
+        scheduler.submit(('child', 'fail'), fail, 1)
+        scheduler.submit(('child', 'ok'), executed.append, 'child')
+
+    scheduler.submit('fail', fail, 0)
+    scheduler.submit('spawn', spawn)
+
+    for i in range(10):
+        scheduler.submit(i, executed.append, i)
+
+    errors = _run(scheduler)
+
+    # Failed tasks don't stop the rest
+    assert sorted([str(error) for error in errors]) == ["('child', 'fail'): ValueError(1)", 'fail: ValueError(0)']
+    assert sorted(executed, key=str) == sorted(list(range(10)) + ['child'], key=str)
+
+
+def test_finishes_once_no_task_can_spawn_more():
+    assert _run(WorkStealingScheduler(4)) == []
+
+    # Chains of tasks that spawn a single task keep the rest of the workers idle until the last one finishes
+    scheduler = WorkStealingScheduler(4)
+    executed = []
+
+    def chain(i: int) -> None:
+        executed.append(i)
+
+        if i < 50:
+            scheduler.submit(i + 1, chain, i + 1)
+
+    scheduler.submit(0, chain, 0)
+
+    assert _run(scheduler) == []
+    assert executed == list(range(51))
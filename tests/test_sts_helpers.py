@@ -0,0 +1,154 @@
+import asyncio
+import threading
+import time
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from assets.lambda_layer.python.helpers import client_helpers, sts_helpers
+
+ROLE_A = 'arn:aws:iam::444455556666:role/OrgRole'
+ROLE_B = 'arn:aws:iam::777788889999:role/OrgRole'
+
+
+class STS:
+    """
+    Stand-in for AssumeRole, which returns new credentials with the configured lifetime every time a role is assumed
+    """
+
+    def __init__(self, lifetime: int = 3600, delay: float = 0.0):
+        self.lifetime = lifetime
+        self.delay = delay
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, role_arn: str, region: str = None) -> (dict, datetime):
+        with self._lock:
+            self.calls.append((role_arn, region))
+            number = len(self.calls)
+
+        time.sleep(self.delay)
+
+        credentials = {
+            'aws_access_key_id': f'ASIA{number}',
+            'aws_secret_access_key': 'secret',
+            'aws_session_token': 'token'
+        }
+
+        return credentials, datetime.now(tz=timezone.utc) + timedelta(seconds=self.lifetime)
+
+
+@pytest.fixture
+def sts(monkeypatch):
+    sts = STS()
+    monkeypatch.setattr(sts_helpers, '_assume_role', sts)
+
+    return sts
+
+
+def test_credentials_are_reused_while_they_are_valid_for_the_refresh_margin(sts):
+    cache = sts_helpers.CredentialsCache()
+    credentials = cache.get(ROLE_A)
+
+    assert cache.get(ROLE_A) is credentials
+    assert len(sts.calls) == 1
+
+    # Credentials that expire within 15 minutes are refreshed when they're requested again, not before
+    sts.lifetime = 899
+    cache = sts_helpers.CredentialsCache()
+    credentials = cache.get(ROLE_A)
+
+    assert len(sts.calls) == 2
+    assert cache.get(ROLE_A) is not credentials
+    assert len(sts.calls) == 3
+
+
+@pytest.mark.parametrize('lifetime, refreshed', [(901, False), (899, True)])
+def test_refresh_margin(sts, lifetime, refreshed):
+    cache = sts_helpers.CredentialsCache(refresh_margin=900)
+    cache._store(ROLE_A, {'aws_access_key_id': 'ASIAOLD'}, datetime.now(tz=timezone.utc) + timedelta(seconds=lifetime))
+
+    assert (cache.get(ROLE_A)['aws_access_key_id'] != 'ASIAOLD') is refreshed
+
+
+def test_every_role_is_assumed_by_a_single_thread_at_a_time(sts):
+    sts.delay = 0.2
+    cache = sts_helpers.CredentialsCache()
+    results = []
+
+    def get(role_arn: str) -> None:
+        results.append((role_arn, cache.get(role_arn)['aws_access_key_id']))
+
+    threads = [threading.Thread(target=get, args=(role_arn,)) for role_arn in [ROLE_A, ROLE_B] * 4]
+    start = time.monotonic()
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    # Threads requesting the same role wait for its credentials, while different roles are assumed at the same time
+    assert sorted([role_arn for role_arn, _ in sts.calls]) == [ROLE_A, ROLE_B]
+    assert len({key for role_arn, key in results if role_arn == ROLE_A}) == 1
+    assert len({key for role_arn, key in results if role_arn == ROLE_B}) == 1
+    assert time.monotonic() - start < 0.4
+
+
+def test_clients_of_refreshed_credentials_are_evicted(sts):
+    sts.lifetime = 600
+    cache = sts_helpers.CredentialsCache()
+    previous = cache.get(ROLE_A)
+    client = client_helpers.get_client('cloudtrail', 'eu-west-1', previous)
+
+    assert client_helpers.get_client('cloudtrail', 'eu-west-1', previous) is client
+
+    credentials = cache.get(ROLE_A)
+
+    assert credentials is not previous
+    assert not [key for key in client_helpers._clients if key[0] == previous['aws_access_key_id']]
+    assert previous['aws_access_key_id'] not in client_helpers._sessions
+    assert client_helpers.get_client('cloudtrail', 'eu-west-1', credentials) is not client
+
+
+def test_coroutines_share_the_cached_credentials(sts):
+    cache = sts_helpers.CredentialsCache()
+    credentials = cache.get(ROLE_A)
+    assumed = []
+
+    async def assume_role(role_arn: str) -> (dict, datetime):
+        assumed.append(role_arn)
+        return sts(role_arn)
+
+    async def get() -> list:
+        return [await cache.get_async(role_arn, assume_role) for role_arn in (ROLE_A, ROLE_B, ROLE_B)]
+
+    results = asyncio.run(get())
+
+    assert results[0] is credentials
+    assert results[1] is results[2]
+    assert assumed == [ROLE_B]
+    assert cache.get(ROLE_B) is results[1]
+
+
+def test_prefetch_spreads_the_roles_across_regions_and_ignores_errors(sts, monkeypatch):
+    def assume_role(role_arn: str, region: str = None) -> (dict, datetime):
+        if role_arn == ROLE_B:
+            raise PermissionError(role_arn)
+
+        return sts(role_arn, region)
+
+    monkeypatch.setattr(sts_helpers, '_assume_role', assume_role)
+
+    roles = [f'arn:aws:iam::00000000000{i}:role/OrgRole' for i in range(4)]
+    cache = sts_helpers.CredentialsCache(regions=['eu-west-1', 'us-east-1'])
+    cache.get(roles[0])
+    cache.prefetch(roles + [ROLE_B])
+
+    # Roles with valid credentials aren't assumed again
+    assert sorted(sts.calls) == [(roles[0], None), (roles[1], 'eu-west-1'), (roles[2], 'us-east-1'),
+                                 (roles[3], 'eu-west-1')]
+
+    with pytest.raises(PermissionError):
+        cache.get(ROLE_B)
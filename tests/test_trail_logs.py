@@ -0,0 +1,84 @@
+import os
+
+from datetime import datetime, timezone
+
+import pytest
+
+from assets.lambda_layer.python.helpers import trail_log_helpers
+
+# Directory laid out like the bucket of an organization trail with the key prefix 'trails'
+FIXTURE_DIRECTORY = os.path.join(os.path.dirname(__file__), 'fixtures', 'trail_logs')
+PREFIX = 'trails'
+ORG_ID = 'o-a1b2c3d4e5'
+ACCOUNT_ID = '111122223333'
+REGION = 'eu-west-1'
+
+INSTANCE_EVENT_NAMES = {'RunInstances', 'StartInstances', 'StopInstances', 'TerminateInstances'}
+
+
+@pytest.fixture
+def source():
+    return trail_log_helpers.LocalTrailSource(FIXTURE_DIRECTORY)
+
+
+def fetch(source, event_names: set, start_time: datetime, end_time: datetime) -> [dict]:
+    return trail_log_helpers.fetch_events(source, ACCOUNT_ID, REGION, event_names, start_time, end_time, PREFIX,
+                                          ORG_ID)
+
+
+def test_build_day_prefix():
+    day = datetime(2024, 3, 1, tzinfo=timezone.utc)
+
+    assert (trail_log_helpers.build_day_prefix(ACCOUNT_ID, REGION, day, '/trails/', ORG_ID) ==
+            f'trails/AWSLogs/{ORG_ID}/{ACCOUNT_ID}/CloudTrail/{REGION}/2024/03/01/')
+    assert (trail_log_helpers.build_day_prefix(ACCOUNT_ID, REGION, day) ==
+            f'AWSLogs/{ACCOUNT_ID}/CloudTrail/{REGION}/2024/03/01/')
+
+
+def test_list_objects_returns_keys_under_the_prefix(source):
+    day = datetime(2024, 3, 1, tzinfo=timezone.utc)
+    prefix = trail_log_helpers.build_day_prefix(ACCOUNT_ID, REGION, day, PREFIX, ORG_ID)
+
+    assert sorted(source.list_objects(prefix)) == [
+        f'{prefix}{ACCOUNT_ID}_CloudTrail_{REGION}_20240301T1005Z_a.json.gz',
+        f'{prefix}{ACCOUNT_ID}_CloudTrail_{REGION}_20240301T1805Z_b.json.gz'
+    ]
+    assert source.list_objects(prefix.replace('2024/03/01', '2024/03/03')) == []
+
+
+def test_fetch_events_of_a_day(source):
+    events = fetch(source, INSTANCE_EVENT_NAMES, datetime(2024, 3, 1, tzinfo=timezone.utc),
+                   datetime(2024, 3, 1, 23, 59, 59, tzinfo=timezone.utc))
+
+    # The RunInstances record is delivered twice, the failed StopInstances and DescribeInstances are discarded, the
+    # TerminateInstances record is delivered the following day and the rest are out of the time window or account
+    assert [e['EventId'] for e in events] == ['e-run', 'e-stop', 'e-terminate']
+    assert [e['EventTime'] for e in events] == [datetime(2024, 3, 1, 10, tzinfo=timezone.utc),
+                                                datetime(2024, 3, 1, 18, tzinfo=timezone.utc),
+                                                datetime(2024, 3, 1, 23, 58, tzinfo=timezone.utc)]
+
+
+def test_fetch_events_as_returned_by_lookup_events(source):
+    events = fetch(source, {'RunInstances'}, datetime(2024, 3, 1, tzinfo=timezone.utc),
+                   datetime(2024, 3, 1, 12, tzinfo=timezone.utc))
+
+    assert len(events) == 1
+    assert events[0]['EventName'] == 'RunInstances'
+    assert events[0]['Resources'] == [{'ResourceType': 'AWS::EC2::Instance', 'ResourceName': 'i-0001'},
+                                      {'ResourceType': 'AWS::EC2::Instance', 'ResourceName': 'i-0002'}]
+    assert events[0]['Payload']['eventID'] == 'e-run'
+
+
+def test_fetch_events_filters_by_event_name(source):
+    events = fetch(source, {'CreateAutoScalingGroup'}, datetime(2024, 2, 29, tzinfo=timezone.utc),
+                   datetime(2024, 3, 2, 23, 59, 59, tzinfo=timezone.utc))
+
+    assert [e['EventId'] for e in events] == ['e-asg']
+    assert events[0]['Resources'] == [{'ResourceType': 'AWS::AutoScaling::AutoScalingGroup', 'ResourceName': 'asg-1'}]
+
+
+def test_fetch_events_spanning_several_days(source):
+    events = fetch(source, INSTANCE_EVENT_NAMES, datetime(2024, 2, 29, 12, tzinfo=timezone.utc),
+                   datetime(2024, 3, 1, 12, tzinfo=timezone.utc))
+
+    assert [e['EventId'] for e in events] == ['e-early', 'e-run']